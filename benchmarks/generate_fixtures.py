@@ -0,0 +1,144 @@
+import gzip
+import json
+import os
+import random
+
+# Synthetic pages shaped like the Yelp pages read by the extractors: no real business, review or user data
+S_FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+INT_SEARCH_PAGES = 3
+INT_RESULTS_PER_PAGE = 10
+INT_BIZ_PAGES = 4
+INT_GALLERY_PAGES = 3
+INT_IMAGES_PER_GALLERY_PAGE = 30
+L_CATEGORIES = ["Pizza", "Italien", "Bars à vin", "Brasseries", "Burgers", "Français", "Végétarien", "Sushi"]
+L_DAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+L_RANGES = ["11:30 AM - 2:30 PM", "7:00 PM - 11:00 PM", "12:00 PM - 12:00 AM (Next day)", "8:00 AM - 6:00 PM"]
+
+
+def get_business_id(int_index: int) -> str:
+    return f"bench-biz-{int_index:04d}"
+
+
+def wrap_json_script(dc_data: dict, s_attributes: str) -> str:
+    """
+    Embed JSON in a script tag the way Yelp does: in an HTML comment, with HTML-escaped quotes
+    :param dc_data: dict
+    :param s_attributes: str - attributes of the script tag
+    :return: str
+    """
+    s_json = json.dumps(dc_data, ensure_ascii=False).replace('"', "&quot;")
+    return f'<script type="application/json" {s_attributes}><!--{s_json}--></script>'
+
+
+def make_search_page(o_random: random.Random, int_page: int) -> str:
+    """
+    Make a search page of `INT_RESULTS_PER_PAGE` results with its pagination component
+    :param o_random: random.Random
+    :param int_page: int
+    :return: str
+    """
+    l_components = []
+    for int_result in range(INT_RESULTS_PER_PAGE):
+        int_index = int_page * INT_RESULTS_PER_PAGE + int_result
+        l_components.append({"type": "ad", "props": {"text": "Sponsored " * 20}})
+        l_components.append({
+            "bizId": get_business_id(int_index),
+            "searchResultBusiness": {
+                "businessUrl": f"/biz/bench-business-{int_index:04d}-lyon",
+                "name": f"Bench Business {int_index} &amp; Co",
+                "rating": o_random.choice([3.5, 4.0, 4.5, 5.0]),
+                "reviewCount": o_random.randint(1, 2000),
+                "priceRange": o_random.choice(["€", "€€", "€€€", None]),
+                "categories": [{"title": s_title, "url": "/search"} for s_title in o_random.sample(L_CATEGORIES, 2)],
+                "website": {"href": f"https://bench-business-{int_index}.example"},
+                "snippet": {"text": "lorem ipsum dolor sit amet " * 10},
+            },
+        })
+    l_components.append({"type": "pagination",
+                         "props": {"totalResults": INT_SEARCH_PAGES * INT_RESULTS_PER_PAGE,
+                                   "resultsPerPage": INT_RESULTS_PER_PAGE}})
+    dc_data = {"legacyProps": {"searchAppProps": {"searchPageProps": {"mainContentComponentsListProps": l_components}}}}
+    l_parts = ["<html><head>", *(f'<meta name="m{i}" content="v{i}">' for i in range(40)), "</head><body>"]
+    l_parts += [f'<div class="result"><a href="/biz/{i}">Result {i}</a><p>{"text " * 30}</p></div>' for i in range(200)]
+    l_parts += [wrap_json_script({"k": i}, f'data-x="{i}"') for i in range(15)]
+    l_parts.append(wrap_json_script(dc_data, 'data-hypernova-key="yelpfrontend__search__SearchApp"'))
+    l_parts.append("</body></html>")
+    return "".join(l_parts)
+
+
+def make_biz_page(o_random: random.Random, int_index: int, int_apollo_keys: int) -> str:
+    """
+    Make a business page with its meta tags, static map and Apollo state
+    :param o_random: random.Random
+    :param int_index: int
+    :param int_apollo_keys: int - number of unrelated entries of the Apollo state (reviews, users, photos...)
+    :return: str
+    """
+    s_business_id = get_business_id(int_index)
+    dc_apollo = {
+        f"Business:{s_business_id}": {
+            "phoneNumber": {"formatted": f"04 78 {int_index:02d} 00 00"},
+            'organizedProperties({"clientPlatform":"WWW"})': [{"properties": [
+                {"displayText": f"Property {i}", "isActive": o_random.random() < 0.5} for i in range(15)]}],
+            "operationHours": {"regularHoursMergedWithSpecialHoursForCurrentWeek": [
+                {"dayOfWeekShort": s_day, "hours": ["Closed"] if s_day == "Sun" else o_random.sample(L_RANGES, 2)}
+                for s_day in L_DAYS]},
+        },
+        f"BusinessLocation:{s_business_id}": {
+            "address": {"addressLine1": f"{int_index} rue du Banc", "addressLine2": "", "addressLine3": None,
+                        "postalCode": "69001", "city": "Lyon"},
+            "country": {"code": "FR"},
+        },
+    }
+    for int_key in range(int_apollo_keys):
+        s_typename = o_random.choice(["Review", "User", "BusinessPhoto", "Category"])
+        dc_apollo[f"{s_typename}:{int_key}"] = {"id": int_key, "text": "lorem ipsum dolor sit amet " * 5,
+                                                "url": f"https://example.invalid/{int_key}"}
+    l_parts = ["<html><head>", *(f'<meta name="m{i}" content="v{i}">' for i in range(60))]
+    l_parts.append(f'<meta name="yelp-biz-id" content="{s_business_id}">')
+    l_parts.append('<meta property="og:description" content="Specialties: Great food &amp; wine">')
+    l_parts.append("</head><body>")
+    l_parts += [f'<div><img src="https://s3-media0.fl.yelpcdn.com/bphoto/{i}/348s.jpg" alt="x"></div>'
+                for i in range(300)]
+    l_parts.append('<img src="https://maps.googleapis.com/maps/api/staticmap?size=315x150&amp;'
+                   f'center=45.76{int_index}%2C4.83{int_index}&amp;zoom=15">')
+    l_parts += [wrap_json_script({"k": i}, f'data-x="{i}"') for i in range(25)]
+    l_parts.append(wrap_json_script(dc_apollo, 'data-apollo-state="true"'))
+    l_parts.append("</body></html>")
+    return "".join(l_parts)
+
+
+def make_gallery_page(int_page: int) -> str:
+    """
+    Make a page of the photo gallery of a business with its "Page X sur N" pagination text
+    :param int_page: int - from 0
+    :return: str
+    """
+    l_items = [f'<li><div><img src="x.jpg" srcset="https://s3-media0.fl.yelpcdn.com/bphoto/p{int_page}-{i}/258s.jpg '
+               f'1x, https://s3-media0.fl.yelpcdn.com/bphoto/p{int_page}-{i}/348s.jpg 2x"></div></li>'
+               for i in range(INT_IMAGES_PER_GALLERY_PAGE)]
+    return ("<html><body>" + "".join(f'<div class="nav">{"menu " * 20}</div>' for _ in range(50))
+            + f'<div class="media-landing_gallery photos"><ul>{"".join(l_items)}</ul></div>'
+            + f"<div><span>Page {int_page + 1} sur {INT_GALLERY_PAGES}</span></div></body></html>")
+
+
+def write_fixture(s_name: str, s_html: str) -> None:
+    # A fixed modification time in the gzip header, so that the same pages give the same files
+    with gzip.GzipFile(os.path.join(S_FIXTURES_DIR, f"{s_name}.html.gz"), "wb", mtime=0) as o_file:
+        o_file.write(s_html.encode("utf-8"))
+
+
+def main() -> None:
+    o_random = random.Random(0)
+    os.makedirs(S_FIXTURES_DIR, exist_ok=True)
+    for int_page in range(INT_SEARCH_PAGES):
+        write_fixture(f"search_{int_page}", make_search_page(o_random, int_page))
+    for int_index in range(INT_BIZ_PAGES):
+        write_fixture(f"biz_{int_index}", make_biz_page(o_random, int_index, 500 + 1000 * int_index))
+    for int_page in range(INT_GALLERY_PAGES):
+        write_fixture(f"biz_photos_{int_page}", make_gallery_page(int_page))
+    print(f"Fixtures written to {S_FIXTURES_DIR}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,305 @@
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import os
+import platform
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Callable
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+from scrapling.engines.toolbelt import Response
+
+from data_processing.models import business_model
+from data_processing.models.business_model import BusinessExtractor, BusinessSearchExtractor
+from database.sql_requests import SqlRequests
+from pages.yelp import get_search_main_content, post_processing_data
+from utilities.helper import extract_json_data_from_html
+
+S_BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+S_FIXTURES_DIR = os.path.join(S_BENCHMARKS_DIR, "fixtures")
+S_BASELINE_PATH = os.path.join(S_BENCHMARKS_DIR, "baseline.json")
+S_BASE_URL = "https://www.yelp.fr"
+# Rows of the post-processing and database stages: a full search of 24 pages of 10 results
+INT_SEARCH_ROWS = 240
+# The business pages are few and slow, they are extracted several times per run for a steadier time
+INT_BUSINESS_PAGE_ROUNDS = 3
+# Rows written per transaction by the database stage, the default --batch-size
+INT_DATABASE_BATCH_SIZE = 20
+
+
+@dataclass
+class Fixtures:
+    """
+    Fixtures class to hold the HTML of the saved pages, by kind of page
+    """
+    l_search_pages: list[str]
+    l_biz_pages: list[str]
+    l_gallery_pages: list[str]
+
+    @classmethod
+    def load(cls, s_fixtures_dir: str = S_FIXTURES_DIR) -> 'Fixtures':
+        dc_pages: dict[str, list[tuple[int, str]]] = {"search": [], "biz": [], "biz_photos": []}
+        for s_file_name in os.listdir(s_fixtures_dir):
+            o_match = re.fullmatch(r"(search|biz|biz_photos)_(\d+)\.html\.gz", s_file_name)
+            if o_match:
+                with gzip.open(os.path.join(s_fixtures_dir, s_file_name), "rt", encoding="utf-8") as o_file:
+                    dc_pages[o_match.group(1)].append((int(o_match.group(2)), o_file.read()))
+        if not all(dc_pages.values()):
+            raise FileNotFoundError(f"Missing fixtures in {s_fixtures_dir}, "
+                                    f"run `python -m benchmarks.generate_fixtures`")
+        return cls(*([s_html for _, s_html in sorted(dc_pages[s_kind])] for s_kind in ("search", "biz", "biz_photos")))
+
+
+def make_response(s_url: str, s_html: str) -> Response:
+    """
+    Build a response like the fetchers do, the HTML being parsed at construction
+    :param s_url: str
+    :param s_html: str
+    :return: Response
+    """
+    return Response(url=s_url, text=s_html, body=s_html.encode("utf-8"), status=200, reason="OK", cookies={},
+                    headers={}, request_headers={})
+
+
+@dataclass
+class Benchmark:
+    """
+    Benchmark class to run the stages over the fixtures without any network request. Each stage function returns the
+    number of items (pages or rows) it has processed and the time spent on them, its inputs being prepared untimed.
+    """
+    o_fixtures: Fixtures
+
+    def __post_init__(self) -> None:
+        # The photo gallery pages requested by BusinessExtractor are served from the fixtures
+        business_model.make_request_with_retries = self._serve_gallery_page
+        self.l_search_rows = [BusinessSearchExtractor.extract_data_from_main_content(
+            get_search_main_content(make_response(f"{S_BASE_URL}/search", s_html)))
+            for s_html in self.o_fixtures.l_search_pages]
+        self.df_search_rows = self._get_search_rows()
+        self.int_table = 0
+
+    def get_stages(self) -> dict[str, Callable[[], tuple[int, float]]]:
+        return {
+            "parse_html": self.run_parse_html,
+            "extract_json_data_from_html": self.run_extract_json_data_from_html,
+            "business_search_extractor": self.run_business_search_extractor,
+            "business_extractor_extract": self.run_business_extractor_extract,
+            "post_processing_data": self.run_post_processing_data,
+            "sqlite_upsert": self.run_sqlite_upsert,
+        }
+
+    def run_parse_html(self) -> tuple[int, float]:
+        l_pages = self.o_fixtures.l_search_pages + self.o_fixtures.l_biz_pages + self.o_fixtures.l_gallery_pages
+        with Timer() as o_timer:
+            for s_html in l_pages:
+                make_response(S_BASE_URL, s_html)
+        return len(l_pages), o_timer.f_elapsed
+
+    def run_extract_json_data_from_html(self) -> tuple[int, float]:
+        l_search_responses = [make_response(S_BASE_URL, s_html) for s_html in self.o_fixtures.l_search_pages]
+        l_biz_responses = [make_response(S_BASE_URL, s_html) for s_html in self.o_fixtures.l_biz_pages]
+        with Timer() as o_timer:
+            for o_response in l_search_responses:
+                extract_json_data_from_html(o_response, "data-hypernova-key=")
+            for o_response in l_biz_responses:
+                extract_json_data_from_html(o_response, "data-apollo-state")
+        return len(l_search_responses) + len(l_biz_responses), o_timer.f_elapsed
+
+    def run_business_search_extractor(self) -> tuple[int, float]:
+        l_main_contents = [get_search_main_content(make_response(S_BASE_URL, s_html))
+                           for s_html in self.o_fixtures.l_search_pages]
+        with Timer() as o_timer:
+            o_extractor = BusinessSearchExtractor()
+            int_nb_results = sum(o_extractor.add_main_content(l_main_content) for l_main_content in l_main_contents)
+            o_extractor.to_dataframe()
+        return int_nb_results, o_timer.f_elapsed
+
+    def run_business_extractor_extract(self) -> tuple[int, float]:
+        l_responses = [make_response(f"{S_BASE_URL}/biz/{int_index}", s_html)
+                       for int_index, s_html in enumerate(self.o_fixtures.l_biz_pages * INT_BUSINESS_PAGE_ROUNDS)]
+        with Timer() as o_timer:
+            asyncio.run(extract_businesses(l_responses))
+        return len(l_responses), o_timer.f_elapsed
+
+    def run_post_processing_data(self) -> tuple[int, float]:
+        df_rows = self.df_search_rows.copy()
+        with Timer() as o_timer:
+            post_processing_data(df_rows, {})
+        return len(df_rows), o_timer.f_elapsed
+
+    def run_sqlite_upsert(self) -> tuple[int, float]:
+        # Every run inserts into a new table so that the rows are inserted, not updated
+        self.int_table += 1
+        o_sql_requests = SqlRequests({"find_desc": "benchmark", "find_loc": f"run_{self.int_table}"})
+        df_rows = post_processing_data(self.df_search_rows.copy(), {})
+        with Timer() as o_timer:
+            for int_start in range(0, len(df_rows), INT_DATABASE_BATCH_SIZE):
+                df_batch = df_rows.iloc[int_start:int_start + INT_DATABASE_BATCH_SIZE]
+                o_sql_requests.upsert_dataframe_into_database(df_batch)
+        return len(df_rows), o_timer.f_elapsed
+
+    def _get_search_rows(self) -> pd.DataFrame:
+        """
+        Get `INT_SEARCH_ROWS` rows of a search: the search results merged with the business pages, repeated with
+        distinct urls
+        :return: pd.DataFrame
+        """
+        df_search = pd.concat(self.l_search_rows, ignore_index=True)
+        l_businesses = [asyncio.run(BusinessExtractor(make_response(f"{S_BASE_URL}/biz/{int_index}", s_html)).extract())
+                        for int_index, s_html in enumerate(self.o_fixtures.l_biz_pages)]
+        df_businesses = pd.DataFrame([o_business.model_dump() for o_business in l_businesses])
+        df_rows = pd.concat([df_search] * (INT_SEARCH_ROWS // len(df_search) + 1), ignore_index=True)
+        df_rows = df_rows.iloc[:INT_SEARCH_ROWS]
+        df_rows['url'] = [f"{S_BASE_URL}{s_url}?row={int_row}" for int_row, s_url in enumerate(df_rows['url'])]
+        df_details = df_businesses.drop(columns='business_id').iloc[
+            [int_row % len(df_businesses) for int_row in range(len(df_rows))]].reset_index(drop=True)
+        return pd.concat([df_rows, df_details], axis=1)
+
+    async def _serve_gallery_page(self, s_url: str, max_retries: int = 3) -> Response | None:
+        int_start = int(parse_qs(urlsplit(s_url).query).get("start", ["0"])[0])
+        int_page = int_start // business_model.INT_IMAGES_PER_GALLERY_PAGE
+        if "/biz_photos/" not in s_url or int_page >= len(self.o_fixtures.l_gallery_pages):
+            return None
+        return make_response(s_url, self.o_fixtures.l_gallery_pages[int_page])
+
+
+async def extract_businesses(l_responses: list[Response]) -> list:
+    return [await BusinessExtractor(o_response).extract() for o_response in l_responses]
+
+
+class Timer:
+    """
+    Timer class to measure the part of a stage that is benchmarked, the preparation of its inputs being excluded
+    """
+
+    def __enter__(self) -> 'Timer':
+        self.f_start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.f_elapsed = time.perf_counter() - self.f_start
+
+
+def measure_stage(fn_stage: Callable[[], tuple[int, float]], int_repeat: int) -> dict[str, float]:
+    """
+    Measure a stage: its best time per item over `int_repeat` runs after a warm-up run, the slower runs being slowed
+    down by the rest of the machine, and its peak of allocated memory in a separate run, tracemalloc slowing down the
+    code it traces
+    :param fn_stage: Callable[[], tuple[int, float]]
+    :param int_repeat: int
+    :return: dict[str, float]
+    """
+    fn_stage()
+    l_item_times = []
+    for _ in range(int_repeat):
+        int_items, f_elapsed = fn_stage()
+        l_item_times.append(f_elapsed / int_items)
+    tracemalloc.start()
+    fn_stage()
+    _, int_peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    f_item_time = min(l_item_times)
+    return {
+        "items": int_items,
+        "ms_per_item": round(f_item_time * 1000, 4),
+        "items_per_s": round(1 / f_item_time, 1),
+        "peak_memory_kb": round(int_peak_bytes / 1024, 1),
+    }
+
+
+def compare_with_baseline(dc_results: dict[str, dict], dc_baseline: dict[str, dict], f_threshold: float) -> list[str]:
+    """
+    Compare the time per item and the peak memory of each stage with the baseline
+    :param dc_results: dict[str, dict]
+    :param dc_baseline: dict[str, dict] - stages of the baseline
+    :param f_threshold: float - relative increase above which a stage has regressed, e.g. 0.25 for 25%
+    :return: list[str] - regressions, e.g. "post_processing_data (time)"
+    """
+    l_regressions = []
+    for s_stage, dc_result in dc_results.items():
+        if s_stage not in dc_baseline:
+            continue
+        dc_result["vs_baseline"] = round(dc_result["ms_per_item"] / dc_baseline[s_stage]["ms_per_item"], 3)
+        dc_result["memory_vs_baseline"] = round(dc_result["peak_memory_kb"] / dc_baseline[s_stage]["peak_memory_kb"], 3)
+        if dc_result["vs_baseline"] > 1 + f_threshold:
+            l_regressions.append(f"{s_stage} (time)")
+        if dc_result["memory_vs_baseline"] > 1 + f_threshold:
+            l_regressions.append(f"{s_stage} (memory)")
+    return l_regressions
+
+
+def parse_arguments() -> argparse.Namespace:
+    obj_argparse = argparse.ArgumentParser(description='Offline benchmark of the Yelp scraper over saved pages')
+    obj_argparse.add_argument('--repeat', type=int, default=5,
+                              help='Number of measured runs per stage, the best one is kept (default: 5)')
+    obj_argparse.add_argument('--stage', action='append', default=None,
+                              help='Stage to run, can be repeated (default: every stage)')
+    obj_argparse.add_argument('--baseline', default=S_BASELINE_PATH,
+                              help='Baseline the stages are compared with (default: benchmarks/baseline.json)')
+    obj_argparse.add_argument('--threshold', type=float, default=0.25,
+                              help='Relative increase of the time or memory of a stage against the baseline that '
+                                   'fails the run (default: 0.25, i.e. 25%%)')
+    obj_argparse.add_argument('--update-baseline', action='store_true',
+                              help='Save the results as the new baseline instead of comparing with it')
+    obj_argparse.add_argument('--output', default=None, help='JSON file the results are saved to')
+    return obj_argparse.parse_args()
+
+
+def main() -> int:
+    obj_argparse = parse_arguments()
+    logging.disable(logging.CRITICAL)  # the logs of every page would be measured with the stages
+    o_fixtures = Fixtures.load()
+    with tempfile.TemporaryDirectory() as s_work_dir:
+        # The database stage uses the SQLite engine of a setup_database.json of the working directory
+        os.makedirs(os.path.join(s_work_dir, "inputs"))
+        with open(os.path.join(s_work_dir, "inputs", "setup_database.json"), "w") as o_file:
+            json.dump({"engine": "sqlite", "database": os.path.join(s_work_dir, "benchmark.db"), "schema": "yelp"},
+                      o_file)
+        s_previous_dir = os.getcwd()
+        os.chdir(s_work_dir)
+        try:
+            o_benchmark = Benchmark(o_fixtures)
+            dc_stages = o_benchmark.get_stages()
+            l_stages = obj_argparse.stage or list(dc_stages)
+            dc_results = {s_stage: measure_stage(dc_stages[s_stage], max(1, obj_argparse.repeat))
+                          for s_stage in l_stages}
+        finally:
+            os.chdir(s_previous_dir)
+
+    dc_run = {"python": platform.python_version(), "machine": platform.machine(), "processor": platform.processor(),
+              "stages": dc_results}
+    l_regressions = []
+    if obj_argparse.update_baseline:
+        with open(obj_argparse.baseline, "w") as o_file:
+            json.dump(dc_run, o_file, indent=2)
+    elif os.path.isfile(obj_argparse.baseline):
+        with open(obj_argparse.baseline) as o_file:
+            l_regressions = compare_with_baseline(dc_results, json.load(o_file)["stages"], obj_argparse.threshold)
+
+    print(f"{'stage':<30}{'items':>7}{'ms/item':>12}{'items/s':>12}{'peak KB':>12}{'time vs base':>14}"
+          f"{'mem vs base':>13}")
+    for s_stage, dc_result in dc_results.items():
+        print(f"{s_stage:<30}{dc_result['items']:>7}{dc_result['ms_per_item']:>12.4f}{dc_result['items_per_s']:>12.1f}"
+              f"{dc_result['peak_memory_kb']:>12.1f}{dc_result.get('vs_baseline', ''):>14}"
+              f"{dc_result.get('memory_vs_baseline', ''):>13}")
+    if obj_argparse.output:
+        with open(obj_argparse.output, "w") as o_file:
+            json.dump(dc_run, o_file, indent=2)
+    if obj_argparse.update_baseline:
+        print(f"Baseline saved to {obj_argparse.baseline}")
+    elif l_regressions:
+        print(f"Regression above {obj_argparse.threshold:.0%} against the baseline: {', '.join(l_regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,7 +1,8 @@
 import logging
 from dataclasses import dataclass
+from typing import AsyncIterator
 
-from pandas import DataFrame
+from pandas import DataFrame, Series
 
 o_logger = logging.getLogger(__name__)
 
@@ -20,6 +21,13 @@ class DataProcessing:
         """
         raise NotImplementedError
 
+    def _iter_data(self) -> AsyncIterator[DataFrame]:
+        """
+        Get data from the source as a stream of DataFrames, one per processed record
+        :return: AsyncIterator[DataFrame]
+        """
+        raise NotImplementedError
+
     def _parse_data(self, df: DataFrame) -> DataFrame:
         """
         Parse data from the source to a DataFrame
@@ -28,9 +36,31 @@ class DataProcessing:
         """
         raise NotImplementedError
 
-    def process_data(self) -> [DataFrame | None]:
+    def process_data(self, bool_stream: bool = False) -> [DataFrame | AsyncIterator[DataFrame] | None]:
         """
-        Process data from the source to a DataFrame
-        :return: [DataFrame | None]
+        Process data from the source to a DataFrame, or to a stream of DataFrames if `bool_stream` is set
+        :param bool_stream: bool
+        :return: [DataFrame | AsyncIterator[DataFrame] | None]
         """
-        return self._get_data()
+        return self._iter_data() if bool_stream else self._get_data()
+
+
+def flatten_list_columns(df: DataFrame) -> DataFrame:
+    """
+    Flatten the list values of a DataFrame into strings for the text outputs (CSV file, database): the items of a list
+    are joined with ", " and the items of a nested list with " : " (e.g. the day and the hours of the opening hours),
+    then the joined string is stripped
+    :param df: DataFrame
+    :return: DataFrame - a new DataFrame if a column has list values, `df` otherwise
+    """
+    dc_flattened_columns = {}
+    for s_key, s_column in df.items():
+        if s_column.dtype != 'object':
+            continue
+        l_values = s_column.to_list()
+        if not any(isinstance(value, list) for value in l_values):
+            continue
+        dc_flattened_columns[s_key] = Series(
+            [", ".join(" : ".join(map(str, item)) if isinstance(item, list) else str(item) for item in value).strip()
+             if isinstance(value, list) else value for value in l_values], index=s_column.index, dtype=object)
+    return df.assign(**dc_flattened_columns) if dc_flattened_columns else df
@@ -1,12 +1,33 @@
-from dataclasses import field
+import asyncio
+import math
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import lru_cache
 
 import pandas as pd
 from pandas import DataFrame
 from pydantic import BaseModel, Field
 
 from utilities.helper import o_logger, extract_json_data_from_html
+from utilities.json_utils import IndexedJson
+from utilities.metrics import METRICS
+from utilities.rate_limiter import RATE_LIMITER
 from utilities.request_utils import make_request_with_retries
 
+INT_IMAGES_PER_GALLERY_PAGE = 30
+PATTERN_GALLERY_PAGE_OF_PAGES = re.compile(r"Page\s+\d+\s+(?:sur|of)\s+(\d+)", re.IGNORECASE)
+
+DC_DAYS_OF_WEEK = {"Mon": "Lundi", "Tue": "Mardi", "Wed": "Mercredi", "Thu": "Jeudi", "Fri": "Vendredi",
+                   "Sat": "Samedi", "Sun": "Dimanche"}
+
+# Extraction plan of a business page: every element read by the field extractors, collected in one traversal
+XPATH_BUSINESS_PAGE_PLAN = " | ".join((
+    '//meta[@content and (@name or @property)]',
+    '//img[contains(@src, "maps.googleapis.com")]',
+    '//script[@type="application/json"]',
+))
+
 
 class SearchDataMainContent(BaseModel):
     """
@@ -42,19 +63,27 @@ class BusinessPageData(BaseModel):
 
 class BusinessSearchExtractor:
     """
-    BusinessSearchExtractor class to extract data from the Yelp json data of the search page
+    BusinessSearchExtractor class to extract data from the Yelp json data of the search page.
+    The results of every added page are collected column by column and the DataFrame is built once at the end.
     """
 
-    @staticmethod
-    def extract_data_from_main_content(json_main_content: dict) -> DataFrame:
+    def __init__(self):
         """
-        Extract data from the main content of the JSON data
-        :param json_main_content: dict
-        :return: DataFrame
+        Initialize the BusinessSearchExtractor class with an empty batch
+        """
+        self.dc_columns: dict[str, list] = {s_field: [] for s_field in SearchDataMainContent.model_fields}
+
+    @METRICS.time_stage("search_extraction")
+    def add_main_content(self, json_main_content: list[dict]) -> int:
+        """
+        Add the results of the main content of the JSON data of a search page to the batch
+        :param json_main_content: list[dict]
+        :return: int - number of results added
         """
-        json_main_content = [item for item in json_main_content if 'bizId' in item]
-        df_main_content = pd.DataFrame()
+        int_nb_results = 0
         for item in json_main_content:
+            if 'bizId' not in item:
+                continue
             website = item['searchResultBusiness'].get('website')
             website = website["href"] if isinstance(website, dict) and "href" in website else (
                 website if isinstance(website, str) else "")
@@ -70,8 +99,59 @@ class BusinessSearchExtractor:
                             isinstance(cat, dict)],
                 website=website
             )
-            df_main_content = pd.concat([df_main_content, pd.DataFrame([business_data.model_dump()])])
-        return df_main_content
+            for s_field, value in business_data:
+                self.dc_columns[s_field].append(value)
+            int_nb_results += 1
+        return int_nb_results
+
+    def to_dataframe(self) -> DataFrame:
+        """
+        Build the DataFrame of all the results added to the batch
+        :return: DataFrame
+        """
+        if not self.dc_columns['business_id']:
+            return pd.DataFrame()
+        return pd.DataFrame(self.dc_columns)
+
+    @staticmethod
+    def extract_data_from_main_content(json_main_content: list[dict]) -> DataFrame:
+        """
+        Extract data from the main content of the JSON data of a single search page
+        :param json_main_content: list[dict]
+        :return: DataFrame
+        """
+        business_search = BusinessSearchExtractor()
+        business_search.add_main_content(json_main_content)
+        return business_search.to_dataframe()
+
+
+@dataclass
+class PageIndex:
+    """
+    PageIndex class to hold the elements of a business page collected by `XPATH_BUSINESS_PAGE_PLAN`
+    """
+    dc_meta: dict[str, str] = field(default_factory=dict)
+    s_map_url: str | None = None
+    l_json_scripts: list = field(default_factory=list)
+
+    @classmethod
+    @METRICS.time_stage("dom_parsing")
+    def from_response(cls, o_response) -> 'PageIndex':
+        """
+        Build the index of a page in one traversal of its document
+        :param o_response: scrapling.Adaptor
+        :return: PageIndex
+        """
+        o_page_index = cls()
+        for element in o_response.xpath(XPATH_BUSINESS_PAGE_PLAN):
+            if element.tag == "meta":
+                s_meta_key = element.attrib.get("name") or element.attrib.get("property")
+                o_page_index.dc_meta.setdefault(s_meta_key, element.attrib["content"])
+            elif element.tag == "img":
+                o_page_index.s_map_url = element.attrib["src"]
+            else:
+                o_page_index.l_json_scripts.append(element)
+        return o_page_index
 
 
 class BusinessExtractor:
@@ -80,29 +160,36 @@ class BusinessExtractor:
     """
     json_data: dict = field(init=False)
 
-    def __init__(self, o_response):
+    def __init__(self, o_response, int_max_images: int | None = None):
         """
         Initialize the BusinessExtractor class
         :param o_response: scrapling.Adaptor - Response of the request
+        :param int_max_images: int | None - maximum number of images extracted, all of them if None
         """
         self.o_response = o_response
+        self.o_page_index = PageIndex.from_response(o_response)
+        self.int_max_images = int_max_images
         self.o_logger = o_logger
         self.dc_data = {}
+        # Whether the page had the business data, the page being fetched again without the cache when it hadn't
+        self.bool_has_business_data = False
 
     async def extract(self) -> BusinessPageData:
         """
         Extract the data from the website and return it as a Business object
         :return: Business
         """
-        self._extract_location()
         self.json_data = await self._retry_extract_json_data(self.o_response)
-        self._extract_business_id()
-        self._extract_address()
-        self._extract_phone_number()
-        self._extract_description()
-        self._extract_amneties()
-        self._extract_hours()
-        await self._extract_images()
+        with METRICS.time_stage("business_extraction"):
+            self._extract_location()
+            self._extract_business_id()
+            self._extract_address()
+            self._extract_phone_number()
+            self._extract_description()
+            self._extract_amneties()
+            self._extract_hours()
+        with METRICS.time_stage("image_extraction"):  # with the requests of the photo gallery pages
+            await self._extract_images()
         try:
             self.o_logger.info(f"url: {self.o_response.url}")
             for s_key, s_value in self.dc_data.items():
@@ -115,22 +202,34 @@ class BusinessExtractor:
     async def _retry_extract_json_data(self, o_response) -> dict[str, dict]:
         """
         Retry extracting JSON data from the response up to 3 times with different CSS classes.
+        A page without the business data is fetched again, bypassing the response cache, and replaces the response of
+        the extractor once its data is found.
         :param o_response: Response object from the request
         :return: Extracted JSON data as a dictionary
         """
-        json_data = {}
+        json_data = IndexedJson()
         css_classes = ["data-apollo-state", ""]
+        o_page_index = self.o_page_index
         for attempt in range(3):  # Retry up to 3 times
             for s_css_class in css_classes:
-                json_data = extract_json_data_from_html(o_response, s_css_class) or {}
+                json_data = extract_json_data_from_html(o_response, s_css_class, o_page_index.l_json_scripts) or IndexedJson()
                 try:
-                    if isinstance(json_data, dict) and any(key.startswith('Business:') for key in json_data.keys()):
+                    if isinstance(json_data, IndexedJson) and json_data.has_typename('Business'):
+                        self.o_response, self.o_page_index = o_response, o_page_index
+                        self.bool_has_business_data = True
                         return json_data  # ✅ Success, return data
                     self.o_logger.warning(
                         f"Attempt {attempt + 1}: No data found with CSS class '{s_css_class}', retrying with '{css_classes[attempt + 1]}' ...")
                 except Exception as obj_exception:
                     self.o_logger.error(f"Error while extracting data with CSS class '{s_css_class}': {obj_exception}")
-            o_response = await make_request_with_retries(o_response.url)  # Retry fetching the response
+            # A page without the business data is usually a bot check page served with a 200 status
+            RATE_LIMITER.on_blocked(o_response.url, "no business data in the page")
+            # Retry fetching the response, the cached copy being the page without the data
+            o_response = await make_request_with_retries(o_response.url, bool_bypass_cache=True,
+                                                         bool_cache_response=False)
+            if o_response is None:
+                break
+            o_page_index = PageIndex.from_response(o_response)
         return json_data  # Return the last extracted data, even if empty
 
     def _extract_business_id(self):
@@ -139,8 +238,8 @@ class BusinessExtractor:
         :return: self
         """
         try:
-            self.dc_data['business_id'] = self.o_response.find("meta", {"name": "yelp-biz-id"}).attrib["content"]
-        except AttributeError as obj_exception:
+            self.dc_data['business_id'] = self.o_page_index.dc_meta["yelp-biz-id"]
+        except KeyError as obj_exception:
             self.dc_data['business_id'] = ""
         except Exception as obj_exception:
             o_logger.error(f"Error while extracting business id: {obj_exception}")
@@ -188,8 +287,8 @@ class BusinessExtractor:
         :return: self
         """
         try:
-            self.dc_data['description'] = self.o_response.find("meta", {"property": "og:description"}).attrib["content"]
-        except AttributeError as obj_exception:
+            self.dc_data['description'] = self.o_page_index.dc_meta["og:description"]
+        except KeyError as obj_exception:
             self.dc_data['description'] = ""
         except Exception as obj_exception:
             o_logger.error(f"Error while extracting description: {obj_exception}")
@@ -221,37 +320,13 @@ class BusinessExtractor:
 
     def _extract_hours(self):
         """
-        Extract the hours of the restaurant
+        Extract the hours of the restaurant, each day with all its time ranges
         :return: self
         """
         try:
-            list_hours = []
             hours_data = self.json_data[f'Business:{self.dc_data["business_id"]}'] \
                 ['operationHours']['regularHoursMergedWithSpecialHoursForCurrentWeek']
-            for element in hours_data:
-                day_of_week = element['dayOfWeekShort']
-                hours = element['hours'][0]
-                hours = hours.split("(")[0].strip() if "(" in hours else hours
-                if "AM" in hours or "PM" in hours:
-                    start_time, end_time = hours.split(' - ')
-                    start_time_24h = pd.to_datetime(start_time, format='%I:%M %p').strftime('%Hh%M')
-                    if end_time == '12:00 PM':
-                        end_time_24h = '00h00'
-                    else:
-                        end_time_24h = pd.to_datetime(end_time, format='%I:%M %p').strftime('%Hh%M')
-                    hours = f"{start_time_24h} - {end_time_24h}"
-                else:
-                    hours = hours.replace("Closed", "Fermé")
-                day_of_week = (day_of_week
-                               .replace("Mon", "Lundi")
-                               .replace("Tue", "Mardi")
-                               .replace("Wed", "Mercredi")
-                               .replace("Thu", "Jeudi")
-                               .replace("Fri", "Vendredi")
-                               .replace("Sat", "Samedi")
-                               .replace("Sun", "Dimanche")
-                               )
-                list_hours.append([day_of_week, hours])
+            list_hours = normalize_hours(hours_data)
             self.dc_data['hours'] = list_hours
         except IndexError as obj_exception:
             self.dc_data['hours'] = []
@@ -269,12 +344,11 @@ class BusinessExtractor:
         :return: self
         """
         try:
-            images = self.o_response.find_all("img")
-            for image in images:
-                if "maps.googleapis.com" in image.attrib["src"]:
-                    self.dc_data['latitude'] = float(image.attrib["src"].split("center=")[1].split("%2C")[0])
-                    self.dc_data['longitude'] = float(
-                        image.attrib["src"].split("center=")[1].split("%2C")[1].split("&")[0])
+            s_map_url = self.o_page_index.s_map_url
+            if s_map_url is None:
+                raise AttributeError("no map image in the page")
+            self.dc_data['latitude'] = float(s_map_url.split("center=")[1].split("%2C")[0])
+            self.dc_data['longitude'] = float(s_map_url.split("center=")[1].split("%2C")[1].split("&")[0])
         except AttributeError as obj_exception:
             o_logger.warning(f"No location found, {obj_exception}")
             self.dc_data['latitude'] = 0.0
@@ -285,43 +359,141 @@ class BusinessExtractor:
 
     async def _extract_images(self):
         """
-        Extract the images of the restaurant
+        Extract the images of the restaurant.
+        The first gallery page gives the number of pages, the other pages are then fetched concurrently.
         :return: self
         """
         try:
-            if not any(key.startswith('BusinessPhoto:') for key in self.json_data.keys()):
+            if not self.json_data.has_typename('BusinessPhoto'):
                 o_logger.info("No images found")
                 self.dc_data['images'] = []
                 return self
-            images_list = []
-            int_nb_images = 0
-            bool_is_last_page = False
             base_url_images = f"https://www.yelp.fr/biz_photos/{self.dc_data['business_id']}"
-            while not bool_is_last_page:
-                o_response_images = await make_request_with_retries(base_url_images)
-                base_url_images = o_response_images.url
-                if o_response_images.status == 200:
-                    o_logger.info(f"Extracting images from {base_url_images}, page {int_nb_images // 30 + 1}")
-                    ul_path = o_response_images.find("div", {"class": "media-landing_gallery photos"}).children.first
-                    for li in ul_path.find_all("li"):
-                        str_images_url = li.find("img").attrib["srcset"].split(" ")[0]
-                        images_list.append(str_images_url)
-                else:
-                    self.dc_data['images'] = []
-                int_nb_images += 30
-                if "start=" in base_url_images:
-                    base_url_images = base_url_images.split("?")[0]
-                base_url_images = f"{base_url_images}?start={int_nb_images}"
-                adaptator_last_page = o_response_images.find_by_text("Suivant")
-                try:
-                    s_last_page = adaptator_last_page.text
-                    bool_is_last_page = False if s_last_page == "Suivant" else True
-                except AttributeError:
-                    bool_is_last_page = True
-            images_list = list(set(images_list))
-            self.dc_data['images'] = images_list
+            o_response_images = await make_request_with_retries(base_url_images)
+            if o_response_images is None or o_response_images.status != 200:
+                self.dc_data['images'] = []
+                return self
+            base_url_images = o_response_images.url.split("?")[0]
+            o_logger.info(f"Extracting images from {base_url_images}, page 1")
+            images_list = self._extract_gallery_images(o_response_images)
+
+            int_nb_pages = get_gallery_page_count(o_response_images)
+            if int_nb_pages is None:
+                images_list += await self._extract_next_gallery_pages_sequentially(o_response_images)
+            else:
+                if self.int_max_images is not None:
+                    int_nb_pages = min(int_nb_pages, math.ceil(self.int_max_images / INT_IMAGES_PER_GALLERY_PAGE))
+                l_urls = [f"{base_url_images}?start={int_page * INT_IMAGES_PER_GALLERY_PAGE}"
+                          for int_page in range(1, int_nb_pages)]
+                for l_page_images in await asyncio.gather(*(self._extract_gallery_page(s_url) for s_url in l_urls)):
+                    images_list += l_page_images
+
+            images_list = list(dict.fromkeys(images_list))
+            self.dc_data['images'] = images_list[:self.int_max_images] if self.int_max_images is not None \
+                else images_list
         except AttributeError as obj_exception:
             self.dc_data['images'] = []
         except Exception as obj_exception:
             o_logger.error(f"Error while extracting images: {obj_exception}")
         return self
+
+    async def _extract_gallery_page(self, s_url: str) -> list[str]:
+        """
+        Fetch a page of the photo gallery and extract its images
+        :param s_url: str
+        :return: list[str]
+        """
+        o_response_images = await make_request_with_retries(s_url)
+        if o_response_images is None or o_response_images.status != 200:
+            o_logger.error(f"Error while retrieving the gallery page: {s_url}")
+            return []
+        o_logger.info(f"Extracting images from {s_url}")
+        try:
+            return self._extract_gallery_images(o_response_images)
+        except AttributeError:
+            return []
+
+    async def _extract_next_gallery_pages_sequentially(self, o_response_images) -> list[str]:
+        """
+        Extract the images of the gallery pages following an already retrieved one, one after another until there is
+        no "Suivant" link anymore
+        :param o_response_images: scrapling.Adaptor - response of the first gallery page
+        :return: list[str]
+        """
+        images_list = []
+        base_url_images = o_response_images.url.split("?")[0]
+        int_nb_images = 0
+        while getattr(o_response_images.find_by_text("Suivant"), "text", None) == "Suivant":
+            if self.int_max_images is not None and int_nb_images + INT_IMAGES_PER_GALLERY_PAGE >= self.int_max_images:
+                break
+            int_nb_images += INT_IMAGES_PER_GALLERY_PAGE
+            s_url = f"{base_url_images}?start={int_nb_images}"
+            o_response_images = await make_request_with_retries(s_url)
+            if o_response_images is None or o_response_images.status != 200:
+                break
+            o_logger.info(f"Extracting images from {s_url}, page {int_nb_images // INT_IMAGES_PER_GALLERY_PAGE + 1}")
+            images_list += self._extract_gallery_images(o_response_images)
+        return images_list
+
+    @staticmethod
+    def _extract_gallery_images(o_response_images) -> list[str]:
+        """
+        Extract the images URLs of a photo gallery page
+        :param o_response_images: scrapling.Adaptor
+        :return: list[str]
+        """
+        ul_path = o_response_images.find("div", {"class": "media-landing_gallery photos"}).children.first
+        return [li.find("img").attrib["srcset"].split(" ")[0] for li in ul_path.find_all("li")]
+
+
+def get_gallery_page_count(o_response_images) -> int | None:
+    """
+    Get the number of pages of a photo gallery from its "Page 1 sur N" pagination text
+    :param o_response_images: scrapling.Adaptor
+    :return: int | None - None if the pagination is not found
+    """
+    o_page_of_pages = o_response_images.find_by_regex(PATTERN_GALLERY_PAGE_OF_PAGES)
+    if not o_page_of_pages:
+        return None
+    o_match = PATTERN_GALLERY_PAGE_OF_PAGES.search(o_page_of_pages.text)
+    return int(o_match.group(1)) if o_match else None
+
+
+def normalize_hours(hours_data: list[dict]) -> list[list[str]]:
+    """
+    Normalize the opening hours of the Apollo state: French day names and 24-hour time ranges, the ranges of a day
+    being joined with " / " (e.g. [["Lundi", "11h30 - 14h30 / 19h00 - 23h00"], ["Dimanche", "Fermé"]]). A day without
+    hours gets an empty string
+    :param hours_data: list[dict] | None - elements with the `dayOfWeekShort` and `hours` keys
+    :return: list[list[str]]
+    """
+    list_hours = []
+    for element in hours_data or []:
+        day_of_week = DC_DAYS_OF_WEEK.get(element['dayOfWeekShort'], element['dayOfWeekShort'])
+        hours = " / ".join(normalize_hours_range(s_hours) for s_hours in element.get('hours') or [])
+        list_hours.append([day_of_week, hours])
+    return list_hours
+
+
+@lru_cache(maxsize=1024)
+def normalize_hours_range(hours: str) -> str:
+    """
+    Normalize a time range of Yelp, e.g. "7:00 PM - 2:00 AM (Next day)" to "19h00 - 02h00" and "Closed" to "Fermé"
+    :param hours: str
+    :return: str
+    """
+    hours = hours.split("(")[0].strip() if "(" in hours else hours
+    if "AM" in hours or "PM" in hours:
+        start_time, end_time = hours.split(' - ')
+        return f"{convert_time_to_24h(start_time)} - {convert_time_to_24h(end_time)}"
+    return hours.replace("Closed", "Fermé")
+
+
+@lru_cache(maxsize=1024)
+def convert_time_to_24h(s_time: str) -> str:
+    """
+    Convert a 12-hour time to the 24-hour format, e.g. "2:30 PM" to "14h30"
+    :param s_time: str
+    :return: str
+    """
+    return datetime.strptime(s_time, '%I:%M %p').strftime('%Hh%M')
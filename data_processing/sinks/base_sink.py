@@ -0,0 +1,135 @@
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+
+import pandas as pd
+from pandas import DataFrame
+
+from data_processing.data_processing import flatten_list_columns
+from utilities.metrics import METRICS
+
+o_logger = logging.getLogger(__name__)
+
+
+class RecordSink(ABC):
+    """
+    RecordSink class to write the processed records incrementally, buffered in batches of `int_batch_size` rows.
+    With `f_flush_interval`, the buffer is also written by a timer when its oldest records have waited that many
+    seconds, even if no other record is written meanwhile.
+    The list values of the records are flattened into strings, unless the sink keeps native list columns.
+    Each write returns a future telling whether the records have been stored, once their batch has been written (and
+    committed for a database), so that the callers only mark the records as done once they can't be lost.
+    """
+    s_sink_name: str = "sink"
+    bool_native_lists: bool = False
+
+    def __init__(self, int_batch_size: int = 20, f_flush_interval: float | None = None):
+        self.int_batch_size = max(1, int_batch_size)
+        self.f_flush_interval = f_flush_interval
+        self.o_task_flush_timer: asyncio.Task | None = None
+        self.l_buffer: list[DataFrame] = []
+        self.l_buffer_futures: list[asyncio.Future[bool]] = []
+        self.int_buffered_rows = 0
+        self.int_written_rows = 0
+
+    async def write(self, df: DataFrame) -> asyncio.Future[bool]:
+        """
+        Buffer the records and write them once a batch is full, or once the flush interval has elapsed
+        :param df: DataFrame
+        :return: asyncio.Future[bool] - resolved once the records are stored, False if their batch failed
+        """
+        o_future_stored = asyncio.get_running_loop().create_future()
+        if df.empty:
+            o_future_stored.set_result(True)
+            return o_future_stored
+        if not self.l_buffer and self.f_flush_interval is not None:
+            self.o_task_flush_timer = asyncio.create_task(self._flush_after_interval())
+        self.l_buffer.append(df)
+        self.l_buffer_futures.append(o_future_stored)
+        self.int_buffered_rows += len(df)
+        if self.int_buffered_rows >= self.int_batch_size:
+            await self.flush()
+        return o_future_stored
+
+    async def flush(self) -> None:
+        """
+        Write the buffered records
+        :return: None
+        """
+        self._cancel_flush_timer()
+        if not self.l_buffer:
+            return
+        df_batch = pd.concat(self.l_buffer, ignore_index=True)
+        if not self.bool_native_lists:
+            df_batch = flatten_list_columns(df_batch)
+        l_futures_stored = self.l_buffer_futures
+        self.l_buffer = []
+        self.l_buffer_futures = []
+        self.int_buffered_rows = 0
+        try:
+            with METRICS.time_stage(f"{self.s_sink_name}_write"):
+                o_future_batch = await self._write_batch(df_batch)
+        except Exception:
+            set_futures_result(l_futures_stored, False)
+            raise
+        self.int_written_rows += len(df_batch)
+        if o_future_batch is None:
+            set_futures_result(l_futures_stored, True)
+        else:
+            o_future_batch.add_done_callback(
+                lambda o_future: set_futures_result(l_futures_stored, self._is_batch_stored(o_future)))
+
+    async def close(self) -> None:
+        """
+        Write the remaining records and release the resources of the sink
+        :return: None
+        """
+        await self.flush()
+
+    async def _flush_after_interval(self) -> None:
+        """
+        Write the buffer once its oldest records have waited `f_flush_interval` seconds
+        :return: None
+        """
+        await asyncio.sleep(self.f_flush_interval)
+        try:
+            await self.flush()
+        except Exception as o_exception:
+            o_logger.error(f"Failed to write the buffer of the {self.s_sink_name} after {self.f_flush_interval} "
+                           f"seconds: {o_exception}")
+
+    def _cancel_flush_timer(self) -> None:
+        # The timer is not cancelled by its own flush
+        if self.o_task_flush_timer is not None and self.o_task_flush_timer is not asyncio.current_task():
+            self.o_task_flush_timer.cancel()
+        self.o_task_flush_timer = None
+
+    @abstractmethod
+    async def _write_batch(self, df_batch: DataFrame) -> asyncio.Future[bool] | None:
+        """
+        Write a batch of records
+        :param df_batch: DataFrame
+        :return: asyncio.Future[bool] | None - future resolved once the batch is stored if it is written in the
+        background, None if it is already stored
+        """
+        pass
+
+    def _is_batch_stored(self, o_future_batch: asyncio.Future[bool]) -> bool:
+        if o_future_batch.cancelled():
+            return False
+        if o_future_batch.exception() is not None:
+            o_logger.error(f"Failed to write a batch to the {self.s_sink_name}: {o_future_batch.exception()}")
+            return False
+        return o_future_batch.result()
+
+
+def set_futures_result(l_futures: list[asyncio.Future[bool]], bool_stored: bool) -> None:
+    """
+    Resolve the futures of the records of a batch
+    :param l_futures: list[asyncio.Future[bool]]
+    :param bool_stored: bool
+    :return: None
+    """
+    for o_future in l_futures:
+        if not o_future.done():
+            o_future.set_result(bool_stored)
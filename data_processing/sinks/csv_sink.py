@@ -0,0 +1,31 @@
+import logging
+import os
+
+from pandas import DataFrame
+
+from data_processing.sinks.base_sink import RecordSink
+from utilities.metrics import METRICS
+
+o_logger = logging.getLogger(__name__)
+
+
+class CsvSink(RecordSink):
+    """
+    CsvSink class to append the records to a CSV file batch by batch, the header is written with the first batch.
+    With `bool_append`, the records are appended to the existing file of an interrupted run, without a new header
+    """
+    s_sink_name = "csv"
+
+    def __init__(self, s_output_filename: str, int_batch_size: int = 20, f_flush_interval: float | None = None,
+                 bool_append: bool = False):
+        super().__init__(int_batch_size, f_flush_interval)
+        self.s_output_filename = s_output_filename
+        self.bool_header_written = bool_append and os.path.isfile(s_output_filename)
+
+    async def _write_batch(self, df_batch: DataFrame) -> None:
+        os.makedirs(os.path.dirname(self.s_output_filename) or ".", exist_ok=True)
+        df_batch.to_csv(self.s_output_filename, mode='a' if self.bool_header_written else 'w',
+                        header=not self.bool_header_written, index=False)
+        self.bool_header_written = True
+        METRICS.increment("rows_written_total", len(df_batch), sink=self.s_sink_name)
+        o_logger.info(f"{len(df_batch)} row(s) saved to {self.s_output_filename}")
@@ -0,0 +1,79 @@
+import asyncio
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from pandas import DataFrame
+from sqlalchemy.exc import SQLAlchemyError
+
+from data_processing.sinks.base_sink import RecordSink
+from database.sql_requests import SqlRequests
+from utilities.metrics import METRICS
+
+o_logger = logging.getLogger(__name__)
+
+
+class DatabaseSink(RecordSink):
+    """
+    DatabaseSink class to upsert the records into the database batch by batch, one transaction per batch.
+    The batches are written by a dedicated writer thread so that the event loop keeps crawling while the database
+    answers. Up to `int_max_pending_batches` batches can wait for the writer, then writing awaits the oldest one
+    without blocking the event loop. The records of a batch are stored once its transaction is committed.
+    """
+    s_sink_name = "database"
+
+    def __init__(self, o_sql_requests: SqlRequests, int_batch_size: int = 20, f_flush_interval: float | None = None,
+                 int_max_pending_batches: int = 4):
+        super().__init__(int_batch_size, f_flush_interval)
+        self.o_sql_requests = o_sql_requests
+        self.int_max_pending_batches = max(1, int_max_pending_batches)
+        self.o_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="database-writer")
+        self.dq_pending_batches: deque[asyncio.Future[bool]] = deque()
+
+    async def close(self) -> None:
+        """
+        Write the remaining records, wait for the writer thread to finish and stop it
+        :return: None
+        """
+        try:
+            await super().close()
+            await self._wait_pending_batches(0)
+        finally:
+            await asyncio.to_thread(self.o_executor.shutdown, True)
+
+    async def _write_batch(self, df_batch: DataFrame) -> asyncio.Future[bool]:
+        await self._wait_pending_batches(self.int_max_pending_batches - 1)
+        o_future_batch = asyncio.wrap_future(self.o_executor.submit(self._upsert_batch, df_batch))
+        self.dq_pending_batches.append(o_future_batch)
+        return o_future_batch
+
+    async def _wait_pending_batches(self, int_max_pending_batches: int) -> None:
+        """
+        Wait until at most `int_max_pending_batches` batches are waiting for the writer thread
+        :param int_max_pending_batches: int
+        :return: None
+        """
+        while self.dq_pending_batches and (len(self.dq_pending_batches) > int_max_pending_batches
+                                           or self.dq_pending_batches[0].done()):
+            o_future_batch = self.dq_pending_batches[0]
+            await asyncio.wait([o_future_batch])
+            # Another writer of the sink may have removed it meanwhile
+            if self.dq_pending_batches and self.dq_pending_batches[0] is o_future_batch:
+                self.dq_pending_batches.popleft()
+
+    @METRICS.time_stage("database_insert")
+    def _upsert_batch(self, df_batch: DataFrame) -> bool:
+        """
+        Upsert a batch in one transaction, in the writer thread
+        :param df_batch: DataFrame
+        :return: bool - whether the transaction was committed
+        """
+        try:
+            int_nb_rows = self.o_sql_requests.upsert_dataframe_into_database(df_batch)
+            o_logger.info(f"{int_nb_rows} row(s) upserted into the database")
+            METRICS.increment("rows_written_total", int_nb_rows, sink=self.s_sink_name)
+            return True
+        except SQLAlchemyError as e:
+            o_logger.error(f"Failed to insert data into the database: {e}")
+            METRICS.increment("rows_failed_total", len(df_batch), sink=self.s_sink_name)
+            return False
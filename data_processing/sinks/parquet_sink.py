@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import os
+import typing
+import uuid
+from datetime import date
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pandas import DataFrame
+
+from data_processing.sinks.base_sink import RecordSink
+from utilities.metrics import METRICS
+
+o_logger = logging.getLogger(__name__)
+
+# Rows per row group, a row group is written each time the buffer is full, when `--flush-interval` has elapsed and when
+# the sink is closed
+INT_ROW_GROUP_SIZE = 10_000
+# Arrow types of the Python types of the declared columns
+DC_ARROW_TYPES = {str: pa.string(), int: pa.int64(), float: pa.float64(), bool: pa.bool_(), date: pa.date32()}
+
+
+class ParquetSink(RecordSink):
+    """
+    ParquetSink class to write the records to a Parquet file compressed with zstd, one row group per batch, with the
+    list columns kept as native lists. The file is written in a hive partition of the dataset directory, e.g.
+    outputs/parquet/find_loc=lyon/find_desc=restaurants/date=2025-01-31/, so that the files of every run are read at once
+    as a single dataset. The row groups are written to disk as the batches arrive, the footer that makes the file
+    readable is written when the sink is closed. The schema is declared from the types of the columns, the undeclared
+    columns are not written.
+    """
+    s_sink_name = "parquet"
+    bool_native_lists = True
+
+    def __init__(self, s_dataset_dir: str, dc_partitions: dict[str, str], dc_column_types: dict[str, type],
+                 s_file_prefix: str = "part", int_batch_size: int = INT_ROW_GROUP_SIZE,
+                 f_flush_interval: float | None = None):
+        super().__init__(int_batch_size, f_flush_interval)
+        s_partition_dir = os.path.join(s_dataset_dir, *(f"{s_key}={str(s_value).replace('/', '_')}"
+                                                        for s_key, s_value in dc_partitions.items()))
+        self.s_output_filename = os.path.join(s_partition_dir, f"{s_file_prefix}-{uuid.uuid4().hex}.parquet")
+        self.o_schema = get_arrow_schema(dc_column_types)
+        self.o_writer: pq.ParquetWriter | None = None
+        # The row groups are written by a thread, one at a time
+        self.o_lock_writer = asyncio.Lock()
+
+    async def close(self) -> None:
+        """
+        Write the remaining records and the footer of the file
+        :return: None
+        """
+        try:
+            await super().close()
+        finally:
+            async with self.o_lock_writer:
+                if self.o_writer is not None:
+                    await asyncio.to_thread(self.o_writer.close)
+                    o_logger.info(f"{self.int_written_rows} row(s) saved to {self.s_output_filename}")
+
+    async def _write_batch(self, df_batch: DataFrame) -> None:
+        o_table = self._to_table(df_batch)
+        async with self.o_lock_writer:
+            if self.o_writer is None:
+                os.makedirs(os.path.dirname(self.s_output_filename), exist_ok=True)
+                self.o_writer = pq.ParquetWriter(self.s_output_filename, self.o_schema, compression='zstd')
+            await asyncio.to_thread(self.o_writer.write_table, o_table)
+        METRICS.increment("rows_written_total", len(df_batch), sink=self.s_sink_name)
+
+    def _to_table(self, df_batch: DataFrame) -> pa.Table:
+        """
+        Convert a batch to the declared schema: the missing columns are null, the numbers and dates that can't be
+        parsed are null too, and the undeclared columns are dropped
+        :param df_batch: DataFrame
+        :return: pa.Table
+        """
+        l_arrays = []
+        for o_field in self.o_schema:
+            if o_field.name not in df_batch.columns:
+                l_arrays.append(pa.nulls(len(df_batch), o_field.type))
+                continue
+            s_column = df_batch[o_field.name]
+            if pa.types.is_integer(o_field.type) or pa.types.is_floating(o_field.type):
+                s_column = pd.to_numeric(s_column, errors='coerce')
+                if pa.types.is_integer(o_field.type):
+                    s_column = s_column.round().astype("Int64")
+            elif pa.types.is_date(o_field.type):
+                s_column = pd.to_datetime(s_column, errors='coerce').dt.date
+            elif pa.types.is_string(o_field.type):
+                s_column = s_column.map(lambda value: value if value is None or isinstance(value, str)
+                                        else None if pd.isna(value) else str(value))
+            l_arrays.append(pa.Array.from_pandas(s_column, type=o_field.type))
+        return pa.Table.from_arrays(l_arrays, schema=self.o_schema)
+
+
+def get_arrow_schema(dc_column_types: dict[str, type]) -> pa.Schema:
+    """
+    Get the Arrow schema of declared columns, the lists of lists included, e.g. {"hours": list[list[str]]}
+    :param dc_column_types: dict[str, type]
+    :return: pa.Schema
+    """
+    def _get_arrow_type(o_type: type) -> pa.DataType:
+        if typing.get_origin(o_type) is list:
+            return pa.list_(_get_arrow_type(typing.get_args(o_type)[0]))
+        return DC_ARROW_TYPES[o_type]
+
+    return pa.schema([(s_column, _get_arrow_type(o_type)) for s_column, o_type in dc_column_types.items()])
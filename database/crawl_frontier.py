@@ -0,0 +1,132 @@
+import json
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+import pandas as pd
+from pandas import DataFrame
+from sqlalchemy import Column, Float, Integer, MetaData, String, Table, Text, delete, func, select, update
+from sqlalchemy.engine import Engine
+
+from database.strategies.sqlite_strategy import SQLiteStrategy
+from utilities.logging_utils import LoggerManager
+
+o_logger = LoggerManager.get_logger(__name__)
+
+# States of a link of the frontier: in flight while it is processed, failed when all the fetchers failed
+PENDING, IN_FLIGHT, DONE, FAILED = "pending", "in_flight", "done", "failed"
+
+FRONTIER_TABLE = Table(
+    "crawl_frontier", MetaData(),
+    Column("job_key", String(255), primary_key=True),
+    Column("url", String(255), primary_key=True),
+    Column("position", Integer, nullable=False),
+    Column("status", String(10), nullable=False),
+    Column("attempts", Integer, nullable=False, default=0),
+    Column("search_row", Text, nullable=False),
+    Column("last_error", Text),
+    Column("updated_at", Float, nullable=False),
+)
+
+
+@lru_cache(maxsize=None)
+def get_frontier_engine(s_frontier_path: str) -> Engine:
+    """
+    Get the engine of the SQLite file of the frontier, shared by the searches of the run
+    :param s_frontier_path: str
+    :return: Engine
+    """
+    s_url = f"sqlite:///{s_frontier_path}"
+    o_strategy = SQLiteStrategy()
+    o_engine = o_strategy.create_engine(s_url, "main")
+    o_strategy.create_schema(o_engine, "main", "")
+    FRONTIER_TABLE.create(o_engine, checkfirst=True)
+    return o_engine
+
+
+@dataclass
+class CrawlFrontier:
+    """
+    CrawlFrontier class to persist the state of each business link of a search (pending, in flight, done, failed with
+    its number of attempts) in a SQLite file next to the outputs, so that an interrupted run can be resumed without
+    crawling again the search pages and the links already done
+    """
+    s_frontier_path: str
+    s_job_key: str
+    o_engine: Engine = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.o_engine = get_frontier_engine(self.s_frontier_path)
+
+    def start_search(self, df_search_page: DataFrame, l_links: list[str]) -> None:
+        """
+        Replace the frontier of the search by the links to process, with their search page elements
+        :param df_search_page: DataFrame - elements of the search pages
+        :param l_links: list[str] - links to process
+        :return: None
+        """
+        dc_search_rows = {dc_row['url']: dc_row for dc_row in df_search_page.to_dict('records')}
+        f_now = time.time()
+        l_rows = [{"job_key": self.s_job_key, "url": s_link, "position": int_position, "status": PENDING,
+                   "attempts": 0, "search_row": json.dumps(dc_search_rows[s_link], default=str), "updated_at": f_now}
+                  for int_position, s_link in enumerate(l_links)]
+        with self.o_engine.begin() as o_connection:
+            o_connection.execute(delete(FRONTIER_TABLE).where(FRONTIER_TABLE.c.job_key == self.s_job_key))
+            if l_rows:
+                o_connection.execute(FRONTIER_TABLE.insert(), l_rows)
+
+    def get_links_to_resume(self) -> tuple[DataFrame, list[str]] | None:
+        """
+        Get the links of the search that are not done yet: pending, failed, or in flight when the run was interrupted.
+        A search whose run was completed, i.e. without pending nor in flight link left, is not resumed but crawled again
+        :return: tuple[DataFrame, list[str]] | None - search page elements and links to process, None if the search
+        has no frontier yet or its run was completed
+        """
+        with self.o_engine.connect() as o_connection:
+            l_rows = o_connection.execute(
+                select(FRONTIER_TABLE.c.url, FRONTIER_TABLE.c.status, FRONTIER_TABLE.c.search_row)
+                .where(FRONTIER_TABLE.c.job_key == self.s_job_key).order_by(FRONTIER_TABLE.c.position)).all()
+        if not any(t_row.status in (PENDING, IN_FLIGHT) for t_row in l_rows):
+            if l_rows:
+                o_logger.info("The previous run of the search was completed, the search is crawled again")
+            return None
+        l_rows_to_resume = [t_row for t_row in l_rows if t_row.status != DONE]
+        o_logger.info(f"Resuming the search: {len(l_rows) - len(l_rows_to_resume)} link(s) already done, "
+                      f"{len(l_rows_to_resume)} link(s) to process")
+        df_search_page = pd.DataFrame([json.loads(t_row.search_row) for t_row in l_rows_to_resume])
+        return df_search_page, [t_row.url for t_row in l_rows_to_resume]
+
+    def mark_in_flight(self, s_url: str) -> None:
+        self._update_link(s_url, status=IN_FLIGHT, attempts=FRONTIER_TABLE.c.attempts + 1)
+
+    def mark_done(self, l_urls: list[str]) -> None:
+        """
+        Mark the links of a stored batch done, in one transaction
+        :param l_urls: list[str]
+        :return: None
+        """
+        with self.o_engine.begin() as o_connection:
+            o_connection.execute(
+                update(FRONTIER_TABLE)
+                .where(FRONTIER_TABLE.c.job_key == self.s_job_key, FRONTIER_TABLE.c.url.in_(l_urls))
+                .values(updated_at=time.time(), status=DONE, last_error=None))
+
+    def mark_failed(self, s_url: str, s_error: str) -> None:
+        self._update_link(s_url, status=FAILED, last_error=s_error[:2000])
+
+    def count_by_status(self) -> dict[str, int]:
+        """
+        Count the links of the search by status
+        :return: dict[str, int]
+        """
+        with self.o_engine.connect() as o_connection:
+            return dict(o_connection.execute(
+                select(FRONTIER_TABLE.c.status, func.count())
+                .where(FRONTIER_TABLE.c.job_key == self.s_job_key).group_by(FRONTIER_TABLE.c.status)).all())
+
+    def _update_link(self, s_url: str, **dc_values) -> None:
+        with self.o_engine.begin() as o_connection:
+            o_connection.execute(
+                update(FRONTIER_TABLE)
+                .where(FRONTIER_TABLE.c.job_key == self.s_job_key, FRONTIER_TABLE.c.url == s_url)
+                .values(updated_at=time.time(), **dc_values))
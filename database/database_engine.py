@@ -1,13 +1,14 @@
 import urllib.parse
 from dataclasses import dataclass, field
 
-from sqlalchemy import create_engine
+from sqlalchemy import Table, create_engine, inspect, text
 from sqlalchemy.engine import Engine
 
-from database.generate_orm_tables import Base
+from database.generate_orm_tables import get_yelp_table
 from database.strategies.base_strategy import DatabaseStrategy
 from database.strategies.mysql_strategy import MySQLStrategy
 from database.strategies.postgresql_strategy import PostgreSQLStrategy
+from database.strategies.sqlite_strategy import SQLiteStrategy
 from utilities.helper import get_database_credentials, bind_database_engine_type
 from utilities.logging_utils import LoggerManager
 
@@ -26,50 +27,111 @@ class SingletonMeta(type):
 
 @dataclass
 class DatabaseEngine(metaclass=SingletonMeta):
-    s_table_name: str = field(init=False)
+    """
+    DatabaseEngine class to hold the connection to the database, shared by the tables of all the searches of the run
+    """
+    s_schema: str = field(init=False)
     o_database_engine: Engine = field(init=False)
     strategy: DatabaseStrategy = field(init=False)
 
     def __post_init__(self) -> None:
         try:
             dc_setup_database = get_database_credentials('inputs/setup_database.json')
-            dc_yelp_config = get_database_credentials('inputs/yelp_config.json')["Yelp"]["params"]
-            s_table_name = f"{dc_yelp_config['find_desc']}_{dc_yelp_config['find_loc']}".replace(" ", "_").lower()
 
-            s_encoded_password = urllib.parse.quote_plus(dc_setup_database['password'])
             s_engine_type = bind_database_engine_type(dc_setup_database)
-            connection_string = f'{s_engine_type}://{dc_setup_database["username"]}:{s_encoded_password}@{dc_setup_database["hostname"]}:{dc_setup_database["port"]}'
+            if dc_setup_database['engine'] == 'sqlite':
+                connection_string = f"{s_engine_type}:///{dc_setup_database.get('database', 'outputs/yelp.db')}"
+            else:
+                s_encoded_password = urllib.parse.quote_plus(dc_setup_database['password'])
+                connection_string = f'{s_engine_type}://{dc_setup_database["username"]}:{s_encoded_password}@{dc_setup_database["hostname"]}:{dc_setup_database["port"]}'
 
             if dc_setup_database['engine'] == 'postgresql':
-                self.strategy = PostgreSQLStrategy()
+                self.strategy = PostgreSQLStrategy(use_copy=bool(dc_setup_database.get('use_copy', False)))
                 o_logger.info("Connecting to PostgreSQL database...")
             elif dc_setup_database['engine'] == 'mysql':
                 self.strategy = MySQLStrategy()
                 o_logger.info("Connecting to MySQL database...")
+            elif dc_setup_database['engine'] == 'sqlite':
+                self.strategy = SQLiteStrategy()
+                o_logger.info("Opening SQLite database...")
             else:
                 raise ValueError("Unsupported database engine")
 
             pre_engine = create_engine(connection_string)
-            with pre_engine.connect() as connection:
-                if not connection.dialect.has_schema(connection, dc_setup_database["schema"]):
-                    o_logger.warning(f"Schema {dc_setup_database['schema']} does not exist. Creating it...")
-            self.strategy.create_schema(pre_engine, dc_setup_database["schema"], dc_setup_database["username"])
+            if self.strategy.supports_schemas:
+                with pre_engine.connect() as connection:
+                    if not connection.dialect.has_schema(connection, dc_setup_database["schema"]):
+                        o_logger.warning(f"Schema {dc_setup_database['schema']} does not exist. Creating it...")
+            self.strategy.create_schema(pre_engine, dc_setup_database["schema"], dc_setup_database.get("username", ""))
             pre_engine.dispose()
 
-            self.o_database_engine = self.strategy.create_engine(connection_string, dc_setup_database["schema"])
-            self.s_table_name = s_table_name
+            self.o_database_engine = self.strategy.create_engine(connection_string, dc_setup_database["schema"],
+                                                                 get_engine_options(dc_setup_database))
+            self.s_schema = dc_setup_database["schema"]
 
             with self.o_database_engine.connect() as connection:
-                Base.metadata.create_all(self.o_database_engine)
-                o_logger.info(f"Connection to {dc_setup_database['schema']}.{self.s_table_name} database established!")
+                o_logger.info(f"Connection to {self.s_schema} database established!")
 
         except Exception as o_exception:
             raise CantConnectToDataBaseException from o_exception
 
+    def create_table(self, s_table_name: str) -> None:
+        """
+        Create the Yelp table of a search if it does not exist yet
+        :param s_table_name: str
+        :return: None
+        """
+        o_table = get_yelp_table(s_table_name, self.s_schema).__table__
+        o_table.create(self.o_database_engine, checkfirst=True)
+        self._add_missing_columns(o_table)
+        o_logger.info(f"Table {self.s_schema}.{s_table_name} ready")
+
+    def _add_missing_columns(self, o_table: Table) -> None:
+        """
+        Add to a table created by a previous version of the scraper the nullable columns it does not have yet
+        (e.g. content_hash)
+        :param o_table: Table
+        :return: None
+        """
+        s_schema = self.s_schema if self.strategy.supports_schemas else None
+        set_existing_columns = {dc_column["name"] for dc_column in
+                                inspect(self.o_database_engine).get_columns(o_table.name, schema=s_schema)}
+        s_qualified_name = f"{s_schema}.{o_table.name}" if s_schema else o_table.name
+        with self.o_database_engine.begin() as o_connection:
+            for o_column in o_table.columns:
+                if o_column.name in set_existing_columns or not o_column.nullable:
+                    continue
+                s_type = o_column.type.compile(dialect=self.o_database_engine.dialect)
+                o_connection.execute(text(f"ALTER TABLE {s_qualified_name} ADD COLUMN {o_column.name} {s_type}"))
+                o_logger.info(f"Column {o_column.name} added to the table {s_qualified_name}")
+
     def __del__(self) -> None:
         self.o_database_engine.dispose()
 
 
+def get_table_name(dc_params: dict[str, str]) -> str:
+    """
+    Get the table name of a search from its parameters, e.g. restaurants_lyon
+    :param dc_params: dict[str, str] - search parameters with `find_desc` and `find_loc`
+    :return: str
+    """
+    return f"{dc_params['find_desc']}_{dc_params['find_loc']}".replace(" ", "_").lower()
+
+
+def get_engine_options(dc_setup_database: dict) -> dict:
+    """
+    Get the connection pool options of the engine from the setup_database.json file, the writer thread and the
+    requests of the event loop each hold a connection of the pool
+    :param dc_setup_database: dict - database setup data
+    :return: dict
+    """
+    return {
+        "pool_size": int(dc_setup_database.get("pool_size", 5)),
+        "max_overflow": int(dc_setup_database.get("max_overflow", 10)),
+        "pool_pre_ping": True,
+    }
+
+
 class CantConnectToDataBaseException(Exception):
     def __str__(self) -> str:
         return "Can't connect to database. Check your connection inputs in the setup_database.json file."
\ No newline at end of file
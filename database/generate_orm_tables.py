@@ -1,11 +1,10 @@
 import datetime
+from functools import lru_cache
 from typing import Any
 
 from sqlalchemy import String, Date, Text, Integer, Float
 from sqlalchemy.orm import mapped_column, DeclarativeBase, Mapped
 
-from utilities.helper import get_database_credentials
-
 
 class Base(DeclarativeBase):
     """
@@ -15,16 +14,10 @@ class Base(DeclarativeBase):
                                       'postgresql_engine': 'InnoDB', 'postgresql_charset': 'utf8mb4'}
 
 
-class YelpTable(Base):
+class YelpTableColumns:
     """
-    Model for the Yelp table
+    Columns of the Yelp tables, the table of a search is built at runtime by `get_yelp_table`
     """
-    dc_database = get_database_credentials("inputs/setup_database.json")
-    dc_yelp_config = get_database_credentials('inputs/yelp_config.json')["Yelp"]["params"]
-    s_table_name = f"{dc_yelp_config['find_desc']}_{dc_yelp_config['find_loc']}"
-    __tablename__: str = s_table_name
-    __table_args__: dict[str, Any] = {'schema': dc_database['schema']}
-
     business_id: Mapped[str] = mapped_column(String(100), nullable=False)
     url: Mapped[str] = mapped_column(String(255), nullable=False, primary_key=True)
     name: Mapped[str] = mapped_column(String(255), nullable=False)
@@ -45,3 +38,20 @@ class YelpTable(Base):
     hours: Mapped[list[str]] = mapped_column(Text, nullable=False)
     images: Mapped[list[str]] = mapped_column(Text, nullable=False)
     date_insertion: Mapped[datetime.date] = mapped_column(Date, nullable=False)
+    # Hash of the details extracted from the business page, to tell whether a refresh changed them
+    content_hash: Mapped[str | None] = mapped_column(String(64), nullable=True)
+
+
+@lru_cache(maxsize=None)
+def get_yelp_table(s_table_name: str, s_schema: str) -> type[Base]:
+    """
+    Get the model of the Yelp table of a search, built once per table from the runtime configuration instead of the
+    configuration files read at import
+    :param s_table_name: str - table name, e.g. restaurants_lyon
+    :param s_schema: str - schema of the table
+    :return: type[Base]
+    """
+    return type(f"YelpTable_{s_table_name}", (YelpTableColumns, Base), {
+        "__tablename__": s_table_name,
+        "__table_args__": {'schema': s_schema},
+    })
@@ -1,17 +1,46 @@
 import logging
+from contextlib import contextmanager
+from dataclasses import dataclass, field, InitVar
+from functools import cached_property
+from typing import Iterator
 
 import pandas as pd
 from pandas import DataFrame
+from sqlalchemy import Column, MetaData, String, Table, text
+from sqlalchemy.engine import Connection, Engine
 
-from database.database_engine import DatabaseEngine
+from database.database_engine import DatabaseEngine, get_table_name
+from database.strategies.base_strategy import DatabaseStrategy
 
 o_logger = logging.getLogger(__name__)
 
+# Temporary table of the urls of a search, joined with the table of the search in the database
+CANDIDATE_URLS_TABLE = Table("candidate_urls", MetaData(), Column("url", String(2048), nullable=False),
+                             prefixes=["TEMPORARY"])
 
-class SqlRequests(DatabaseEngine):
 
-    def __post_init__(self) -> None:
-        super().__post_init__()
+@dataclass
+class SqlRequests:
+    """
+    SqlRequests class to run the requests of a search on its own table, through the database engine shared by all the
+    searches of the run
+    """
+    dc_params: InitVar[dict[str, str]]
+    s_table_name: str = field(init=False)
+    o_database: DatabaseEngine = field(init=False)
+
+    def __post_init__(self, dc_params: dict[str, str]) -> None:
+        self.o_database = DatabaseEngine()
+        self.s_table_name = get_table_name(dc_params)
+        self.o_database.create_table(self.s_table_name)
+
+    @property
+    def o_database_engine(self) -> Engine:
+        return self.o_database.o_database_engine
+
+    @property
+    def strategy(self) -> DatabaseStrategy:
+        return self.o_database.strategy
 
     def insert_dataframe_into_database(self, df: DataFrame) -> None:
         """
@@ -25,6 +54,31 @@ class SqlRequests(DatabaseEngine):
             except Exception as o_exception:
                 o_logger.error(f"Failed to insert data into the database: {o_exception}")
 
+    def upsert_dataframe_into_database(self, df: DataFrame) -> int:
+        """
+        Insert a DataFrame into the database in a single transaction, with multi-row INSERT statements updating the
+        rows already in the table instead of failing on their primary key
+        :param df: DataFrame
+        :return: int - number of rows upserted
+        """
+        l_primary_keys = [o_column.name for o_column in self.o_table.primary_key.columns]
+        l_columns = [s_column for s_column in df.columns if s_column in self.o_table.columns]
+        df_rows = df[l_columns].drop_duplicates(subset=l_primary_keys, keep='last')
+        l_rows = df_rows.astype(object).where(df_rows.notna(), None).to_dict('records')
+        if not l_rows:
+            return 0
+        with self.o_database_engine.begin() as o_connection:
+            self.strategy.upsert(o_connection, self.o_table, l_rows)
+        return len(l_rows)
+
+    @cached_property
+    def o_table(self) -> Table:
+        """
+        Table of the search, reflected from the database once
+        :return: Table
+        """
+        return Table(self.s_table_name, MetaData(), autoload_with=self.o_database_engine)
+
     def get_all_distinct_primary_keys(self) -> list[list[str]]:
         """
         Get all distinct primary keys from the database
@@ -39,4 +93,55 @@ class SqlRequests(DatabaseEngine):
         :return: list[str]
         """
         s_query = f"SELECT DISTINCT url FROM {self.s_table_name};"
-        return pd.read_sql_query(s_query, self.o_database_engine).values.tolist()
+        with self.o_database_engine.connect() as o_connection:
+            return list(o_connection.execute(text(s_query)).scalars())
+
+    def get_urls_not_in_database(self, l_urls: list[str]) -> list[str]:
+        """
+        Get the urls that are not in the database yet, with an anti-join between a temporary table of the candidate
+        urls and the table, so that only the new urls are sent back instead of every url of the table
+        :param l_urls: list[str] - candidate urls
+        :return: list[str] - new urls, in the order of `l_urls` and without duplicates
+        """
+        l_candidate_urls = list(dict.fromkeys(l_urls))
+        if not l_candidate_urls:
+            return []
+        s_query = (f"SELECT c.url FROM {CANDIDATE_URLS_TABLE.name} c "
+                   f"LEFT JOIN {self.s_table_name} t ON t.url = c.url WHERE t.url IS NULL;")
+        with self.o_database_engine.begin() as o_connection, _candidate_urls(o_connection, l_candidate_urls):
+            set_new_urls = set(o_connection.execute(text(s_query)).scalars())
+        return [s_url for s_url in l_candidate_urls if s_url in set_new_urls]
+
+    def get_rows_of_urls(self, l_urls: list[str], l_columns: list[str]) -> DataFrame:
+        """
+        Get some columns of the rows of the urls already in the database, with a join between a temporary table of the
+        candidate urls and the table, so that only the rows of the search are sent back
+        :param l_urls: list[str] - candidate urls
+        :param l_columns: list[str] - columns to get besides the url
+        :return: DataFrame - one row per url in the database, with the url and `l_columns`
+        """
+        l_candidate_urls = list(dict.fromkeys(l_urls))
+        if not l_candidate_urls:
+            return pd.DataFrame(columns=["url", *l_columns])
+        s_columns = ", ".join(f"t.{s_column}" for s_column in ["url", *l_columns])
+        s_query = (f"SELECT {s_columns} FROM {CANDIDATE_URLS_TABLE.name} c "
+                   f"JOIN {self.s_table_name} t ON t.url = c.url;")
+        with self.o_database_engine.begin() as o_connection, _candidate_urls(o_connection, l_candidate_urls):
+            l_rows = o_connection.execute(text(s_query)).all()
+        return pd.DataFrame(l_rows, columns=["url", *l_columns])
+
+
+@contextmanager
+def _candidate_urls(o_connection: Connection, l_urls: list[str]) -> Iterator[None]:
+    """
+    Fill a temporary table with candidate urls for the duration of a query joining it
+    :param o_connection: Connection
+    :param l_urls: list[str] - urls without duplicates
+    :return: Iterator[None]
+    """
+    CANDIDATE_URLS_TABLE.create(o_connection)
+    try:
+        o_connection.execute(CANDIDATE_URLS_TABLE.insert(), [{"url": s_url} for s_url in l_urls])
+        yield
+    finally:
+        CANDIDATE_URLS_TABLE.drop(o_connection)
@@ -1,13 +1,47 @@
 from abc import ABC, abstractmethod
 
-from sqlalchemy.engine import Engine
+from sqlalchemy import Table
+from sqlalchemy.engine import Connection, Engine
 
 
 class DatabaseStrategy(ABC):
+    # False if the database has no schemas, the tables of the schema are then created in the database itself
+    supports_schemas: bool = True
+
     @abstractmethod
     def create_schema(self, engine: Engine, schema: str, username: str) -> None:
         pass
 
     @abstractmethod
-    def create_engine(self, connection_string: str, schema: str) -> Engine:
+    def create_engine(self, connection_string: str, schema: str, engine_options: dict | None = None) -> Engine:
+        """
+        Create the engine of the schema
+        :param connection_string: str
+        :param schema: str
+        :param engine_options: dict | None - keyword arguments of sqlalchemy.create_engine (e.g. pool_size)
+        :return: Engine
+        """
         pass
+
+    @abstractmethod
+    def upsert(self, connection: Connection, table: Table, rows: list[dict]) -> None:
+        """
+        Insert the rows into the table, the rows whose primary key already exists are updated instead. The statement is
+        compiled once and executed for all the rows, which the drivers send as multi-row INSERT statements
+        (insertmanyvalues of SQLAlchemy for psycopg2, executemany rewriting of pymysql). It runs in the transaction of
+        the connection.
+        :param connection: Connection
+        :param table: Table
+        :param rows: list[dict]
+        :return: None
+        """
+        pass
+
+    @staticmethod
+    def get_update_columns(table: Table) -> list[str]:
+        """
+        Get the columns updated when a row already exists: every column except the primary key
+        :param table: Table
+        :return: list[str]
+        """
+        return [column.name for column in table.columns if not column.primary_key]
@@ -1,5 +1,6 @@
-from sqlalchemy import create_engine, text
-from sqlalchemy.engine import Engine
+from sqlalchemy import Table, create_engine, text
+from sqlalchemy.dialects.mysql import insert
+from sqlalchemy.engine import Connection, Engine
 
 from database.strategies.base_strategy import DatabaseStrategy
 
@@ -9,5 +10,11 @@ class MySQLStrategy(DatabaseStrategy):
         with engine.connect() as connection:
             connection.execute(text(f"CREATE DATABASE IF NOT EXISTS {schema};"))
 
-    def create_engine(self, connection_string: str, schema: str) -> Engine:
-        return create_engine(f"{connection_string}/{schema}")
+    def create_engine(self, connection_string: str, schema: str, engine_options: dict | None = None) -> Engine:
+        return create_engine(f"{connection_string}/{schema}", **(engine_options or {}))
+
+    def upsert(self, connection: Connection, table: Table, rows: list[dict]) -> None:
+        statement = insert(table)
+        statement = statement.on_duplicate_key_update(
+            {column: statement.inserted[column] for column in self.get_update_columns(table)})
+        connection.execute(statement, rows)
@@ -1,14 +1,66 @@
-from sqlalchemy import create_engine, text
-from sqlalchemy.engine import Engine
+import csv
+import io
+
+from sqlalchemy import Table, create_engine, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Connection, Engine
 
 from database.strategies.base_strategy import DatabaseStrategy
 
 
 class PostgreSQLStrategy(DatabaseStrategy):
+    def __init__(self, use_copy: bool = False):
+        """
+        :param use_copy: bool - upsert the rows through COPY into a temporary staging table instead of INSERT statements
+        """
+        self.use_copy = use_copy
+
     def create_schema(self, engine: Engine, schema: str, username: str) -> None:
         with engine.connect() as connection:
             connection.execute(text(f"CREATE SCHEMA IF NOT EXISTS {schema} AUTHORIZATION {username}; COMMIT;"))
             connection.execute(text(f'GRANT ALL ON SCHEMA "{schema}" TO "{username}";'))
 
-    def create_engine(self, connection_string: str, schema: str) -> Engine:
-        return create_engine(connection_string, connect_args={"options": f"-csearch_path={schema}"})
+    def create_engine(self, connection_string: str, schema: str, engine_options: dict | None = None) -> Engine:
+        return create_engine(connection_string, connect_args={"options": f"-csearch_path={schema}"},
+                             **(engine_options or {}))
+
+    def upsert(self, connection: Connection, table: Table, rows: list[dict]) -> None:
+        if self.use_copy:
+            self._upsert_with_copy(connection, table, rows)
+            return
+        primary_keys = [column.name for column in table.primary_key.columns]
+        statement = insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=primary_keys,
+            set_={column: statement.excluded[column] for column in self.get_update_columns(table)})
+        connection.execute(statement, rows)
+
+    def _upsert_with_copy(self, connection: Connection, table: Table, rows: list[dict]) -> None:
+        """
+        Stream the rows as CSV into a temporary staging table with COPY, then upsert them into the table with a single
+        INSERT ... SELECT, which is faster than INSERT statements for big batches (requires psycopg2)
+        :param connection: Connection
+        :param table: Table
+        :param rows: list[dict]
+        :return: None
+        """
+        columns = [column.name for column in table.columns]
+        quoted_columns = ", ".join(f'"{column}"' for column in columns)
+        primary_keys = ", ".join(f'"{column.name}"' for column in table.primary_key.columns)
+        update_columns = ", ".join(f'"{column}" = EXCLUDED."{column}"' for column in self.get_update_columns(table))
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow(["\\N" if row.get(column) is None else row[column] for column in columns])
+        buffer.seek(0)
+
+        connection.execute(text(f'CREATE TEMPORARY TABLE "staging_{table.name}" (LIKE "{table.name}") ON COMMIT DROP;'))
+        cursor = connection.connection.cursor()
+        try:
+            cursor.copy_expert(f'COPY "staging_{table.name}" ({quoted_columns}) '
+                               f"FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer)
+        finally:
+            cursor.close()
+        connection.execute(text(f'INSERT INTO "{table.name}" ({quoted_columns}) '
+                                f'SELECT {quoted_columns} FROM "staging_{table.name}" '
+                                f'ON CONFLICT ({primary_keys}) DO UPDATE SET {update_columns};'))
@@ -0,0 +1,48 @@
+import os
+
+from sqlalchemy import Table, create_engine, event
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.engine import Connection, Engine
+
+from database.strategies.base_strategy import DatabaseStrategy
+
+# Pragmas set on every connection: WAL lets the readers go on while a batch is written, synchronous=NORMAL only syncs
+# at checkpoints (safe with WAL), and a 64 MB page cache keeps the url index of a big table in memory
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -64 * 1024,
+    "temp_store": "MEMORY",
+    "mmap_size": 256 * 1024 * 1024,
+    "busy_timeout": 5000,
+}
+
+
+class SQLiteStrategy(DatabaseStrategy):
+    supports_schemas = False
+
+    def create_schema(self, engine: Engine, schema: str, username: str) -> None:
+        database = engine.url.database
+        if database and database != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(database)), exist_ok=True)
+
+    def create_engine(self, connection_string: str, schema: str, engine_options: dict | None = None) -> Engine:
+        engine = create_engine(connection_string, connect_args={"check_same_thread": False}, **(engine_options or {}))
+
+        @event.listens_for(engine, "connect")
+        def set_pragmas(dbapi_connection, connection_record) -> None:
+            cursor = dbapi_connection.cursor()
+            for pragma, value in SQLITE_PRAGMAS.items():
+                cursor.execute(f"PRAGMA {pragma} = {value};")
+            cursor.close()
+
+        # The tables of the schema are created in the SQLite database itself
+        return engine.execution_options(schema_translate_map={schema: None})
+
+    def upsert(self, connection: Connection, table: Table, rows: list[dict]) -> None:
+        primary_keys = [column.name for column in table.primary_key.columns]
+        statement = insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=primary_keys,
+            set_={column: statement.excluded[column] for column in self.get_update_columns(table)})
+        connection.execute(statement, rows)
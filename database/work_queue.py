@@ -0,0 +1,237 @@
+import json
+import time
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Any
+
+from sqlalchemy import Column, Float, Index, Integer, MetaData, String, Table, Text, and_, create_engine, func, or_, \
+    select, update
+from sqlalchemy.engine import Connection, Engine
+
+from utilities.logging_utils import LoggerManager
+
+o_logger = LoggerManager.get_logger(__name__)
+
+# States of a work item: pending until a worker leases it, leased until it is acknowledged (done) or released
+# (pending again, or failed once it has been attempted `int_max_attempts` times). A leased item whose lease has expired
+# was abandoned by its worker and can be leased again.
+PENDING, LEASED, DONE, FAILED = "pending", "leased", "done", "failed"
+
+
+@dataclass
+class WorkItem:
+    """
+    WorkItem class to hold a leased unit of work: a business url and the data needed to process it
+    """
+    int_id: int
+    s_url: str
+    s_job_key: str
+    dc_payload: dict[str, Any]
+    int_attempts: int
+    s_lease_token: str
+
+
+class WorkQueue(ABC):
+    """
+    WorkQueue class to share the business urls to crawl between processes, possibly on several hosts.
+    Items are leased for a limited time: a worker that dies without acknowledging its items loses its lease and the
+    items are leased again by another worker.
+    """
+
+    @abstractmethod
+    def enqueue(self, l_items: list[tuple[str, str, dict[str, Any]]], bool_requeue: bool = False) -> int:
+        """
+        Add items to the queue, the items already in the queue (same url and job) are skipped
+        :param l_items: list[tuple[str, str, dict[str, Any]]] - url, job key and payload of each item
+        :param bool_requeue: bool - put the items already done or failed back to pending with their new payload, e.g.
+        the urls crawled again by `--refresh`
+        :return: int - number of items added or put back to pending
+        """
+        pass
+
+    @abstractmethod
+    def lease(self, s_worker_id: str, int_max_items: int, f_lease_timeout: float) -> list[WorkItem]:
+        """
+        Lease up to `int_max_items` pending or abandoned items
+        :param s_worker_id: str
+        :param int_max_items: int
+        :param f_lease_timeout: float - seconds after which the items are considered abandoned
+        :return: list[WorkItem]
+        """
+        pass
+
+    @abstractmethod
+    def ack(self, o_item: WorkItem) -> None:
+        """
+        Mark a leased item as done
+        :param o_item: WorkItem
+        :return: None
+        """
+        pass
+
+    @abstractmethod
+    def release(self, o_item: WorkItem, s_error: str) -> None:
+        """
+        Give a leased item back after a failure, to be retried or marked as failed after too many attempts
+        :param o_item: WorkItem
+        :param s_error: str
+        :return: None
+        """
+        pass
+
+    @abstractmethod
+    def count_by_status(self) -> dict[str, int]:
+        """
+        Count the items of the queue by status
+        :return: dict[str, int]
+        """
+        pass
+
+
+@dataclass
+class SqlWorkQueue(WorkQueue):
+    """
+    SqlWorkQueue class to store the queue in a table of a SQL database: a local SQLite file for the workers of a single
+    host, or the database of the run (MySQL, PostgreSQL) for workers on several hosts.
+    A lease is taken with a conditional UPDATE, so two workers can't lease the same item even without row locks.
+    """
+    o_engine: Engine
+    int_max_attempts: int = 3
+    s_table_name: str = "work_items"
+    o_table: Table = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.o_table = Table(
+            self.s_table_name, MetaData(),
+            Column("id", Integer, primary_key=True, autoincrement=True),
+            Column("url", String(255), nullable=False),
+            Column("job_key", String(255), nullable=False),
+            Column("payload", Text, nullable=False),
+            Column("status", String(10), nullable=False, default=PENDING),
+            Column("attempts", Integer, nullable=False, default=0),
+            Column("lease_token", String(36)),
+            Column("lease_owner", String(255)),
+            Column("lease_expires_at", Float),
+            Column("last_error", Text),
+            Column("updated_at", Float, nullable=False),
+            Index(f"ix_{self.s_table_name}_url_job_key", "url", "job_key", unique=True),
+            Index(f"ix_{self.s_table_name}_status", "status", "lease_expires_at"),
+            Index(f"ix_{self.s_table_name}_lease_token", "lease_token"),
+        )
+        self.o_table.create(self.o_engine, checkfirst=True)
+
+    def enqueue(self, l_items: list[tuple[str, str, dict[str, Any]]], bool_requeue: bool = False) -> int:
+        dc_items = {(s_url, s_job_key): dc_payload for s_url, s_job_key, dc_payload in l_items}
+        if not dc_items:
+            return 0
+        f_now = time.time()
+        with self.o_engine.begin() as o_connection:
+            dc_queued = {(t_row.url, t_row.job_key): (t_row.id, t_row.status) for t_row in o_connection.execute(
+                select(self.o_table.c.id, self.o_table.c.url, self.o_table.c.job_key, self.o_table.c.status)
+                .where(self.o_table.c.job_key.in_({s_job_key for _, s_job_key in dc_items}))).all()}
+            l_rows = [{"url": s_url, "job_key": s_job_key, "payload": json.dumps(dc_payload, default=str),
+                       "status": PENDING, "attempts": 0, "updated_at": f_now}
+                      for (s_url, s_job_key), dc_payload in dc_items.items() if (s_url, s_job_key) not in dc_queued]
+            if l_rows:
+                o_connection.execute(self.o_table.insert(), l_rows)
+            int_nb_requeued = 0
+            if bool_requeue:
+                # The pending and leased items are left as they are, they are about to be processed
+                for (s_url, s_job_key), dc_payload in dc_items.items():
+                    t_queued = dc_queued.get((s_url, s_job_key))
+                    if t_queued is None or t_queued[1] not in (DONE, FAILED):
+                        continue
+                    int_nb_requeued += o_connection.execute(
+                        update(self.o_table).where(self.o_table.c.id == t_queued[0],
+                                                   self.o_table.c.status.in_((DONE, FAILED)))
+                        .values(payload=json.dumps(dc_payload, default=str), status=PENDING, attempts=0,
+                                lease_token=None, lease_owner=None, lease_expires_at=None, last_error=None,
+                                updated_at=f_now)).rowcount
+        return len(l_rows) + int_nb_requeued
+
+    def lease(self, s_worker_id: str, int_max_items: int, f_lease_timeout: float) -> list[WorkItem]:
+        f_now = time.time()
+        s_lease_token = str(uuid.uuid4())
+        o_leasable = and_(
+            self.o_table.c.attempts < self.int_max_attempts,
+            or_(self.o_table.c.status == PENDING,
+                and_(self.o_table.c.status == LEASED, self.o_table.c.lease_expires_at < f_now)))
+        with self.o_engine.begin() as o_connection:
+            self._fail_abandoned_items(o_connection, f_now)
+            l_ids = list(o_connection.execute(
+                select(self.o_table.c.id).where(o_leasable).order_by(self.o_table.c.id).limit(int_max_items)).scalars())
+            if not l_ids:
+                return []
+            # The condition is checked again, the items leased meanwhile by another worker are not updated
+            o_connection.execute(
+                update(self.o_table).where(self.o_table.c.id.in_(l_ids), o_leasable)
+                .values(status=LEASED, attempts=self.o_table.c.attempts + 1, lease_token=s_lease_token,
+                        lease_owner=s_worker_id, lease_expires_at=f_now + f_lease_timeout, updated_at=f_now))
+            l_rows = o_connection.execute(
+                select(self.o_table).where(self.o_table.c.lease_token == s_lease_token)
+                .order_by(self.o_table.c.id)).mappings().all()
+        return [WorkItem(dc_row["id"], dc_row["url"], dc_row["job_key"], json.loads(dc_row["payload"]),
+                         dc_row["attempts"], s_lease_token) for dc_row in l_rows]
+
+    def ack(self, o_item: WorkItem) -> None:
+        self._update_leased_item(o_item, status=DONE, lease_expires_at=None, last_error=None)
+
+    def release(self, o_item: WorkItem, s_error: str) -> None:
+        s_status = FAILED if o_item.int_attempts >= self.int_max_attempts else PENDING
+        self._update_leased_item(o_item, status=s_status, lease_expires_at=None, last_error=s_error[:2000])
+
+    def count_by_status(self) -> dict[str, int]:
+        with self.o_engine.connect() as o_connection:
+            return dict(o_connection.execute(
+                select(self.o_table.c.status, func.count()).group_by(self.o_table.c.status)).all())
+
+    def _update_leased_item(self, o_item: WorkItem, **dc_values: Any) -> None:
+        """
+        Update an item only if it is still leased with the same lease, a worker whose lease has expired can't change
+        an item leased again by another worker
+        :param o_item: WorkItem
+        :param dc_values: Any - values of the columns to update
+        :return: None
+        """
+        with self.o_engine.begin() as o_connection:
+            o_result = o_connection.execute(
+                update(self.o_table)
+                .where(self.o_table.c.id == o_item.int_id, self.o_table.c.lease_token == o_item.s_lease_token)
+                .values(updated_at=time.time(), **dc_values))
+        if o_result.rowcount == 0:
+            o_logger.warning(f"Lease of {o_item.s_url} lost, it has been leased again by another worker")
+
+    def _fail_abandoned_items(self, o_connection: Connection, f_now: float) -> None:
+        """
+        Mark as failed the abandoned items that have already been attempted `int_max_attempts` times
+        :param o_connection: Connection
+        :param f_now: float
+        :return: None
+        """
+        o_connection.execute(
+            update(self.o_table)
+            .where(self.o_table.c.status == LEASED, self.o_table.c.lease_expires_at < f_now,
+                   self.o_table.c.attempts >= self.int_max_attempts)
+            .values(status=FAILED, last_error="lease expired", updated_at=f_now))
+
+
+def get_work_queue(s_queue_url: str, int_max_attempts: int = 3) -> WorkQueue:
+    """
+    Get the work queue of an URL: `database` for a table of the database set up in inputs/setup_database.json, shared
+    by workers on several hosts, or a SQLAlchemy URL such as `sqlite:///outputs/queue.db` for the workers of one host
+    :param s_queue_url: str
+    :param int_max_attempts: int - attempts of an item before it is marked as failed
+    :return: WorkQueue
+    """
+    if s_queue_url == "database":
+        from database.database_engine import DatabaseEngine
+        o_engine = DatabaseEngine().o_database_engine
+    elif s_queue_url.startswith("sqlite"):
+        from database.strategies.sqlite_strategy import SQLiteStrategy
+        o_strategy = SQLiteStrategy()
+        o_strategy.create_schema(create_engine(s_queue_url), "main", "")
+        o_engine = o_strategy.create_engine(s_queue_url, "main")
+    else:
+        o_engine = create_engine(s_queue_url, pool_pre_ping=True)
+    return SqlWorkQueue(o_engine, int_max_attempts)
@@ -1,7 +1,6 @@
 import asyncio
 import os
 
-from scraper import MainScraper
 from utilities.config_loader import ConfigLoader
 from utilities.helper import parse_arguments
 from utilities.logging_utils import LoggerManager
@@ -18,10 +17,12 @@ async def main() -> None:
     Main function to execute the script and log the start and end of the script execution
     :return: None
     """
+    obj_argparse = parse_arguments()
     o_logger.info(f'Script `{s_script_name}` started.')
     str_path = os.path.abspath(__file__)
     obj_config_loader = ConfigLoader(str_path, 'inputs/yelp_config.json')
-    obj_argparse = parse_arguments()
+    # Imported once the arguments are parsed, so that `--help` and invalid arguments don't load the scraping stack
+    from scraper import MainScraper
     obj_scraper = MainScraper(obj_config_loader.dc_config_data, obj_argparse)
     await obj_scraper.execute()
     o_logger.info('Script ended.')
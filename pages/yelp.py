@@ -1,30 +1,58 @@
+import asyncio
+import hashlib
 import logging
 import sys
 from argparse import ArgumentParser
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import AsyncIterator, TYPE_CHECKING
 
 import pandas as pd
 import scrapling
-from pandas import DataFrame
-from sqlalchemy.exc import ProgrammingError
+from pandas import DataFrame, Series
+from pandas.api.types import infer_dtype
 from tqdm.asyncio import tqdm
 
-from data_processing.data_processing import DataProcessing
-from data_processing.models.business_model import BusinessExtractor, BusinessSearchExtractor
-from database.sql_requests import SqlRequests
+from data_processing.data_processing import DataProcessing, flatten_list_columns
+from data_processing.models.business_model import BusinessExtractor, BusinessPageData, BusinessSearchExtractor, \
+    SearchDataMainContent
 from utilities.helper import get_today_date, extract_json_data_from_html
+from utilities.metrics import METRICS
 from utilities.request_utils import make_request_with_retries
+from utilities.response_cache import RESPONSE_CACHE
+
+if TYPE_CHECKING:
+    from database.crawl_frontier import CrawlFrontier
+    from database.sql_requests import SqlRequests
 
 o_logger = logging.getLogger(__name__)
 
+# Yelp doesn't display more than 24 pages of 10 results for a search
+INT_MAX_SEARCH_RESULTS = 240
+# HTML entities and non-breaking spaces cleaned from every string value, in this order
+HTML_CLEANUP_REPLACEMENTS = [("amp;", ""), ("&#x27;", "'"), ("\xa0", "")]
+# Elements of the search page compared with the rows in the database to find the businesses that changed
+L_SEARCH_CHANGE_COLUMNS = ["rating", "review_count", "price_range", "categories"]
+# Elements of the business page hashed in the content_hash column
+L_CONTENT_HASH_COLUMNS = [s_field for s_field in BusinessPageData.model_fields if s_field != "business_id"]
+# Types of the columns of the post-processed businesses, declared to the outputs with a fixed schema (Parquet) so that
+# a batch with only empty lists or missing values has the same schema as the others
+DC_COLUMN_TYPES = {**{s_field: o_field.annotation for s_field, o_field in SearchDataMainContent.model_fields.items()},
+                   **{s_field: o_field.annotation for s_field, o_field in BusinessPageData.model_fields.items()},
+                   "date_insertion": date, "content_hash": str}
+
 
 @dataclass
 class Yelp(DataProcessing):
     """
     Yelp class to get data from the website Yelp and parse it to a DataFrame
     """
-    o_sql_requests: SqlRequests | None
+    o_sql_requests: 'SqlRequests | None'
     obj_argparse: ArgumentParser
+    o_frontier: 'CrawlFrontier | None' = None
+    set_tasks_mark_done: set[asyncio.Task] = field(default_factory=set, init=False)
+    dc_stored_content_hashes: dict[str, str] = field(default_factory=dict, init=False)
 
     def __post_init__(self):
         super(Yelp, self)
@@ -34,61 +62,236 @@ class Yelp(DataProcessing):
         Get the data from the website and return it as a DataFrame
         :return: DataFrame
         """
-        df = pd.DataFrame()
-        dc_path = self.dc_configuration["Yelp"]
-        s_base_url = dc_path["urls"]["base"]
-        s_search_url = dc_path["urls"]["search"]
-        dc_params = dc_path["params"]
+        l_df_links = [df_batch async for _, df_batch in self.iter_batches()]
+        return flatten_list_columns(pd.concat(l_df_links, ignore_index=True)) if l_df_links else pd.DataFrame()
+
+    async def _iter_data(self) -> AsyncIterator[DataFrame]:
+        """
+        Get the data from the website and yield the businesses as soon as they are processed, post-processed together
+        by batches of `--batch-size` businesses. The list values are kept as lists, the sinks flatten them if needed
+        :return: AsyncIterator[DataFrame]
+        """
+        async for _, df_batch in self.iter_batches():
+            yield df_batch
+
+    async def iter_batches(self) -> AsyncIterator[tuple[list[str], DataFrame]]:
+        """
+        Get the data from the website and yield the batches of businesses with their links. With a frontier, the links
+        of a batch are only marked done by `mark_done_once_stored`, once the sinks have stored the batch
+        :return: AsyncIterator[tuple[list[str], DataFrame]]
+        """
+        dc_params = self.dc_configuration["Yelp"]["params"]
         l_links_failed_to_process = []
+        t_resumed = None
+        if self.o_frontier is not None:
+            t_resumed = await asyncio.to_thread(self.o_frontier.get_links_to_resume)
+        if t_resumed is not None:
+            df_search_page, l_links = t_resumed
+        else:
+            df_search_page, l_links = await self.retrieve_links()
+            if self.o_frontier is not None:
+                await asyncio.to_thread(self.o_frontier.start_search, df_search_page, l_links)
+
+        int_concurrency = max(1, self.obj_argparse.concurrency)
+        o_logger.info(f"Processing {len(l_links)} link(s) with {int_concurrency} concurrent worker(s)")
+        o_queue_links: asyncio.Queue[tuple[int, str]] = asyncio.Queue()
+        for int_index, s_link in enumerate(l_links):
+            o_queue_links.put_nowait((int_index, s_link))
+        o_queue_results: asyncio.Queue[tuple[str, DataFrame] | None] = asyncio.Queue()
+
+        with tqdm(total=len(l_links), file=sys.stdout) as o_progress_bar:
+            async def _worker() -> None:
+                while not o_queue_links.empty():
+                    int_index, s_link = o_queue_links.get_nowait()
+                    o_logger.info(f"link number {int_index}/{len(l_links)}")
+                    await self._update_frontier("mark_in_flight", s_link)
+                    df_link = await self._process_link(s_link, df_search_page, dc_params)
+                    if df_link is None:
+                        l_links_failed_to_process.append(s_link)
+                        await self._update_frontier("mark_failed", s_link, "failed to process")
+                    elif df_link.empty:
+                        await self._update_frontier("mark_failed", s_link, "parsed data is empty")
+                    else:
+                        o_queue_results.put_nowait((s_link, df_link))
+                    o_progress_bar.update(1)
+
+            async def _crawl() -> None:
+                try:
+                    await asyncio.gather(*(_worker() for _ in range(int_concurrency)))
+                finally:
+                    o_queue_results.put_nowait(None)
 
-        s_url = f"{s_base_url}{s_search_url}"
-        df_search_page = await self._retrieve_elements_from_search_page(s_url, dc_params)
+            o_task_crawl = asyncio.create_task(_crawl())
+            try:
+                l_batch = []
+                while (t_result := await o_queue_results.get()) is not None:
+                    l_batch.append(t_result)
+                    if len(l_batch) >= self.obj_argparse.batch_size:
+                        yield [s_link for s_link, _ in l_batch], self._post_process_batch(l_batch, dc_params)
+                        l_batch = []
+                if l_batch:
+                    yield [s_link for s_link, _ in l_batch], self._post_process_batch(l_batch, dc_params)
+                await o_task_crawl
+            finally:
+                o_task_crawl.cancel()
+        o_logger.warning(f"Links failed to process: {l_links_failed_to_process}")
+
+    def _post_process_batch(self, l_batch: list[tuple[str, DataFrame]], dc_params: dict[str]) -> DataFrame:
+        """
+        Post-process a batch of businesses, the ones crawled again by `--refresh` are compared with the database
+        :param l_batch: list[tuple[str, DataFrame]] - link and data of each business
+        :param dc_params: dict[str]
+        :return: DataFrame
+        """
+        df_batch = post_processing_data(pd.concat([df for _, df in l_batch], ignore_index=True), dc_params,
+                                        bool_flatten_lists=False)
+        if self.dc_stored_content_hashes:
+            count_content_changes(df_batch, self.dc_stored_content_hashes)
+        return df_batch
+
+    def mark_done_once_stored(self, l_links: list[str], l_futures_stored: list[asyncio.Future[bool]]) -> None:
+        """
+        Mark the links of a batch done in the frontier once every sink has stored it, so that the links whose rows are
+        still buffered or waiting for the database writer are processed again if the run is interrupted
+        :param l_links: list[str] - links of the batch
+        :param l_futures_stored: list[asyncio.Future[bool]] - futures returned by the writes of the batch to the sinks
+        :return: None
+        """
+        if self.o_frontier is None:
+            return
+
+        async def _mark_done() -> None:
+            if all(await asyncio.gather(*l_futures_stored)):
+                await asyncio.to_thread(self.o_frontier.mark_done, l_links)
+            else:
+                o_logger.warning(f"{len(l_links)} link(s) not stored, they stay to be processed again by --resume")
+
+        o_task = asyncio.create_task(_mark_done())
+        self.set_tasks_mark_done.add(o_task)
+        o_task.add_done_callback(self.set_tasks_mark_done.discard)
+
+    async def wait_links_marked_done(self) -> None:
+        """
+        Wait until the links of the stored batches are marked done, once the sinks are closed
+        :return: None
+        """
+        if self.set_tasks_mark_done:
+            await asyncio.gather(*self.set_tasks_mark_done)
+
+    async def _update_frontier(self, s_method: str, *args: str) -> None:
+        """
+        Update the state of a link in the frontier of the search, if the run has one
+        :param s_method: str - method of the frontier, e.g. mark_done
+        :param args: str - arguments of the method
+        :return: None
+        """
+        if self.o_frontier is not None:
+            await asyncio.to_thread(getattr(self.o_frontier, s_method), *args)
+
+    async def retrieve_links(self) -> tuple[DataFrame, list[str]]:
+        """
+        Retrieve the elements of the search pages and the links of the businesses to process, without the ones already
+        in the database
+        :return: tuple[DataFrame, list[str]] - elements of the search pages and links to process
+        """
+        dc_path = self.dc_configuration["Yelp"]
+        s_base_url = dc_path["urls"]["base"]
+        s_url = f"{s_base_url}{dc_path['urls']['search']}"
+        df_search_page = await self._retrieve_elements_from_search_page(s_url, dc_path["params"])
+        if df_search_page.empty:
+            return df_search_page, []
         df_search_page['url'] = df_search_page['url'].apply(lambda _url: f"{s_base_url}{_url}")
 
-        if not self.obj_argparse.no_database:
-            l_distinct_urls_in_database = self.o_sql_requests.get_all_distinct_urls()
-            o_logger.info(f"length of distinct urls in database: {len(l_distinct_urls_in_database)} row(s)")
-            l_links = [url for url in df_search_page['url'].to_list() if [url] not in l_distinct_urls_in_database]
+        if not self.obj_argparse.no_database and self.obj_argparse.refresh:
+            l_links = await asyncio.to_thread(self._select_urls_to_refresh, df_search_page)
+        elif not self.obj_argparse.no_database:
+            # Run in a thread so that the event loop is not blocked while the database answers
+            l_links = await asyncio.to_thread(self._remove_urls_in_database, df_search_page['url'].to_list())
             o_logger.info(f"length of research after removing urls already in the database: {len(l_links)} row(s)")
         else:
             l_links = df_search_page['url'].to_list()
+        return df_search_page, l_links
 
-        for s_url in tqdm(l_links, file=sys.stdout):
-            o_logger.info(f"link number {l_links.index(s_url)}/{len(l_links)}")
-            try:
-                o_response = await make_request_with_retries(s_url)
-                if o_response and o_response.status == 200:
-                    df_link = await self._parse_data(o_response)
-                    if not df_link.empty:
-                        df_link = pd.merge(df_search_page, df_link, on='business_id', how='inner')
-                    else:
-                        o_logger.error(f"Parsed data is empty for {s_url}")
-                    df_link = post_processing_data(df_link, dc_params)
-                    df = pd.concat([df, df_link], ignore_index=True)
-                    if not self.obj_argparse.no_database:
-                        try:
-                            self.o_sql_requests.insert_dataframe_into_database(df_link)
-                            o_logger.info(f"Data inserted into the database")
-                        except ProgrammingError as e:
-                            o_logger.error(f"Failed to insert data into the database: {e}")
+    async def process_link(self, s_url: str, df_search_page: DataFrame) -> DataFrame | None:
+        """
+        Fetch and parse a single business page, merged with its search page elements, without post-processing
+        :param s_url: str
+        :param df_search_page: DataFrame - elements retrieved from the search page, at least the ones of the business
+        :return: DataFrame | None - None if the link failed to process
+        """
+        return await self._process_link(s_url, df_search_page, self.dc_configuration["Yelp"]["params"])
+
+    def _remove_urls_in_database(self, l_urls: list[str]) -> list[str]:
+        """
+        Remove the urls already in the database, with an anti-join in the database by default or by loading every
+        distinct url of the table into a set with `--dedup-in-memory`
+        :param l_urls: list[str]
+        :return: list[str]
+        """
+        if self.obj_argparse.dedup_in_memory:
+            set_distinct_urls_in_database = set(self.o_sql_requests.get_all_distinct_urls())
+            o_logger.info(f"length of distinct urls in database: {len(set_distinct_urls_in_database)} row(s)")
+            return [s_url for s_url in dict.fromkeys(l_urls) if s_url not in set_distinct_urls_in_database]
+        return self.o_sql_requests.get_urls_not_in_database(l_urls)
+
+    def _select_urls_to_refresh(self, df_search_page: DataFrame) -> list[str]:
+        """
+        Select the urls of an incremental refresh: the new businesses, and the businesses of the database whose search
+        page elements changed, whose details were never hashed, or inserted more than `--refresh-after` days ago
+        :param df_search_page: DataFrame - elements of the search pages
+        :return: list[str]
+        """
+        df_stored = self.o_sql_requests.get_rows_of_urls(
+            df_search_page['url'].to_list(), L_SEARCH_CHANGE_COLUMNS + ["content_hash", "date_insertion"])
+        date_stale_before = get_date_insertion(get_today_date()) - timedelta(days=self.obj_argparse.refresh_after)
+        l_urls = get_urls_to_refresh(df_search_page, df_stored, date_stale_before)
+        df_hashed = df_stored[df_stored['content_hash'].notna() & df_stored['url'].isin(l_urls)]
+        self.dc_stored_content_hashes = dict(zip(df_hashed['url'], df_hashed['content_hash']))
+        o_logger.info(f"Refresh: {len(l_urls)} url(s) to crawl out of {df_search_page['url'].nunique()}, "
+                      f"{len(df_stored)} already in the database")
+        return l_urls
+
+    async def _process_link(self, s_url: str, df_search_page: DataFrame, dc_params: dict[str]) -> DataFrame | None:
+        """
+        Fetch and parse a single business page, merged with its search page elements
+        :param s_url: str
+        :param df_search_page: DataFrame - elements retrieved from the search page
+        :param dc_params: dict[str]
+        :return: DataFrame | None - None if the link failed to process
+        """
+        try:
+            # The page is cached by `_parse_data` once its data has been extracted
+            o_response = await make_request_with_retries(s_url, bool_cache_response=False)
+            if o_response and o_response.status == 200:
+                df_link = await self._parse_data(s_url, o_response)
+                if not df_link.empty:
+                    df_link = pd.merge(df_search_page, df_link, on='business_id', how='inner')
                 else:
-                    o_logger.error(f"Request failed for {s_url} with status {o_response.status}")
-                    l_links_failed_to_process.append(s_url)
-            except Exception as e:
-                o_logger.error(f"Failed to process {s_url}: {e}, {type(e)}")
-                l_links_failed_to_process.append(s_url)
-        o_logger.warning(f"Links failed to process: {l_links_failed_to_process}")
-        return df
+                    o_logger.error(f"Parsed data is empty for {s_url}")
+                return df_link
+            o_logger.error(f"Request failed for {s_url} with status {o_response.status if o_response else None}")
+        except Exception as e:
+            o_logger.error(f"Failed to process {s_url}: {e}, {type(e)}")
+        return None
 
-    async def _parse_data(self, o_response: scrapling.Adaptor) -> DataFrame:
+    async def _parse_data(self, s_url: str, o_response: scrapling.Adaptor) -> DataFrame:
         """
-        Parse the data from the website and return it as a DataFrame with a builder pattern approach to extract data
+        Parse the data from the website and return it as a DataFrame with a builder pattern approach to extract data.
+        The page is saved to the response cache only if it had the business data, otherwise its cached copy (e.g. a bot
+        check page) is evicted so that it is not served again
+        :param s_url: str - requested URL, the key of the page in the cache
         :param o_response: scrapling.Adaptor
         :return: DataFrame
         """
         o_logger.info('Parsing data')
-        business_page = BusinessExtractor(o_response)
+        business_page = BusinessExtractor(o_response, self.obj_argparse.max_images)
         data_business_page = await business_page.extract()
+        if business_page.bool_has_business_data:
+            # A page served from the cache keeps its entry, a page fetched again replaces it
+            RESPONSE_CACHE.put(s_url, business_page.o_response,
+                               bool_keep_fresh_entry=business_page.o_response is o_response)
+        else:
+            RESPONSE_CACHE.evict(s_url)
         df = pd.DataFrame([data_business_page.model_dump()])
         df.fillna("", inplace=True)
         return df
@@ -96,68 +299,285 @@ class Yelp(DataProcessing):
     @staticmethod
     async def _retrieve_elements_from_search_page(s_url: str, dc_params: dict[str]) -> DataFrame:
         """
-        Retrieve the elements from the search page of the website Yelp
+        Retrieve the elements from the search page of the website Yelp.
+        The first page gives the total number of results, the other pages are then fetched concurrently and the
+        DataFrame is built once all of them have arrived.
         :param s_url: str
         :param dc_params: dict[str]
         :return: DataFrame
         """
-        df = pd.DataFrame()
-        int_nb_business = 0
-        bool_is_last_page = False
         business_search = BusinessSearchExtractor()
-        while not bool_is_last_page:
+        s_first_page_url = parse_url_with_query_params(s_url, dc_params, 0)
+        o_logger.info(f"Retrieving links from {s_first_page_url}, page 1")
+        o_first_page_response = await make_request_with_retries(s_first_page_url)
+        if o_first_page_response is None or o_first_page_response.status != 200:
+            o_logger.error(f"Error while retrieving the first search page: {s_first_page_url}")
+            return pd.DataFrame()
+
+        json_main_content_path = get_search_main_content_or_evict(s_first_page_url, o_first_page_response)
+        if not json_main_content_path:
+            return pd.DataFrame()
+        business_search.add_main_content(json_main_content_path)
+        int_total_results, int_results_per_page = get_search_pagination(json_main_content_path)
+        if int_total_results is None:
+            o_logger.warning("No pagination found in the first search page, retrieving the next pages one by one")
+            l_json_main_contents = await Yelp._retrieve_next_search_pages_sequentially(s_url, dc_params,
+                                                                                     o_first_page_response)
+        else:
+            int_total_results = min(int_total_results, INT_MAX_SEARCH_RESULTS)
+            l_offsets = list(range(int_results_per_page, int_total_results, int_results_per_page))
+            o_logger.info(f"{int_total_results} result(s) found, retrieving {len(l_offsets)} other page(s) "
+                          f"concurrently")
+
+            async def _retrieve_page(int_nb_business: int) -> list[dict]:
+                url = parse_url_with_query_params(s_url, dc_params, int_nb_business)
+                o_logger.info(f"Retrieving links from {url}, page {int_nb_business // int_results_per_page + 1}")
+                o_page_response = await make_request_with_retries(url)
+                if o_page_response is None or o_page_response.status != 200:
+                    o_logger.error(f"Error while retrieving the page: {url}")
+                    return []
+                return get_search_main_content_or_evict(url, o_page_response)
+
+            l_json_main_contents = await asyncio.gather(*(_retrieve_page(int_offset) for int_offset in l_offsets))
+
+        for json_main_content in l_json_main_contents:
+            business_search.add_main_content(json_main_content)
+        return business_search.to_dataframe()
+
+    @staticmethod
+    async def _retrieve_next_search_pages_sequentially(s_url: str, dc_params: dict[str],
+                                                       o_page_response: scrapling.Adaptor) -> list[list[dict]]:
+        """
+        Retrieve the search pages following an already retrieved one, one after another until the "Next Page" button
+        is disabled
+        :param s_url: str
+        :param dc_params: dict[str]
+        :param o_page_response: scrapling.Adaptor - response of the first search page
+        :return: list[list[dict]] - main content of each page
+        """
+        l_json_main_contents = []
+        int_nb_business = 0
+        while 'disabled' not in o_page_response.find_by_text("Next Page").parent.html_content:
+            int_nb_business += 10
             url = parse_url_with_query_params(s_url, dc_params, int_nb_business)
             o_logger.info(f"Retrieving links from {url}, page {int_nb_business // 10 + 1}")
             o_page_response = await make_request_with_retries(url)
-            str_button_next_page = o_page_response.find_by_text("Next Page").parent.html_content
             if o_page_response.status == 200:
-                json_data = extract_json_data_from_html(o_page_response, "data-hypernova-key=")
-                json_data_path = json_data['legacyProps']['searchAppProps']['searchPageProps']
-                json_main_content_path = json_data_path['mainContentComponentsListProps']
-                df_main_content = business_search.extract_data_from_main_content(json_main_content_path)
-                df = pd.concat([df, df_main_content], ignore_index=True)
+                l_json_main_contents.append(get_search_main_content_or_evict(url, o_page_response))
             else:
                 o_logger.error(f"Error while retrieving the page: {o_page_response.url} {o_page_response.status}")
-            if 'disabled' in str_button_next_page:
-                bool_is_last_page = True
-            else:
-                int_nb_business += 10
-        return df
+        return l_json_main_contents
+
+
+def get_search_main_content(o_page_response: scrapling.Adaptor) -> list[dict]:
+    """
+    Get the main content components of a search page from its hypernova JSON data
+    :param o_page_response: scrapling.Adaptor
+    :return: list[dict]
+    """
+    json_data = extract_json_data_from_html(o_page_response, "data-hypernova-key=")
+    json_data_path = json_data['legacyProps']['searchAppProps']['searchPageProps']
+    return json_data_path['mainContentComponentsListProps']
+
+
+def get_search_main_content_or_evict(s_url: str, o_page_response: scrapling.Adaptor) -> list[dict]:
+    """
+    Get the main content components of a search page, or evict the page from the response cache if it has no search
+    data (e.g. a bot check page served with a 200 status) so that it is not served again
+    :param s_url: str - requested URL, the key of the page in the cache
+    :param o_page_response: scrapling.Adaptor
+    :return: list[dict] - empty if the page has no search data
+    """
+    try:
+        return get_search_main_content(o_page_response)
+    except (KeyError, TypeError) as o_exception:
+        o_logger.error(f"No search data in the page {s_url}: {o_exception!r}")
+        RESPONSE_CACHE.evict(s_url)
+        return []
 
 
-def post_processing_data(df: DataFrame, dc_params: dict[str]) -> DataFrame:
+def get_search_pagination(json_main_content: list[dict]) -> tuple[int | None, int]:
     """
-    Post-processing of the data from the DataFrame before inserting it into the database
+    Get the total number of results and the number of results per page from the pagination component of a search page
+    :param json_main_content: list[dict]
+    :return: tuple[int | None, int] - total number of results (None if not found) and number of results per page
+    """
+    for item in json_main_content:
+        if isinstance(item, dict) and item.get('type') == 'pagination':
+            dc_pagination = item.get('props', {})
+            if 'totalResults' in dc_pagination:
+                return int(dc_pagination['totalResults']), int(dc_pagination.get('resultsPerPage') or 10)
+    return None, 10
+
+
+@METRICS.time_stage("post_processing")
+def post_processing_data(df: DataFrame, dc_params: dict[str], bool_flatten_lists: bool = True) -> DataFrame:
+    """
+    Post-processing of the data from the DataFrame before inserting it into the database.
+    Every step works on whole columns, so it is meant to be run once on a batch of businesses.
     :param df: DataFrame
     :param dc_params: dict[str]
+    :param bool_flatten_lists: bool - join the list values (categories, images, hours) into strings, otherwise they are
+    kept as lists for the outputs with native list columns and flattened by the text outputs
     """
     try:
-        df['date_insertion'] = get_today_date()
-        df['date_insertion'] = pd.to_datetime(df['date_insertion'], format='%d_%m_%Y').dt.date
-        df['website'] = df['website'].apply(lambda x: x.replace("http://", "") \
-                                            .replace("https://", "").strip() if isinstance(x, str) else x)
-        df['description'] = df['description'].apply(
-            lambda x: x.replace("Specialties: ", "").strip() if isinstance(x, str) else x)
-        df['categories'] = df['categories'].apply(lambda x: ", ".join(x) if isinstance(x, list) else x)
-        df['street_address'] = df['street_address'].apply(
-            lambda x: x.replace("None", "").strip() if isinstance(x, str) else x)
-        df['images'] = df['images'].apply(
-            lambda x: [i.replace(i.split("/")[-1], "o.jpg") for i in x] if isinstance(x, list) else x)
-        df['images'] = df['images'].apply(lambda x: ", ".join(x) if isinstance(x, list) else x)
-        df['hours'] = df['hours'].apply(lambda x: ", ".join([" : ".join(i) for i in x]) if isinstance(x, list) else x)
+        df['date_insertion'] = get_date_insertion(get_today_date())
+        df['website'] = replace_in_strings(df['website'], [("http://", ""), ("https://", "")])
+        df['description'] = replace_in_strings(df['description'], [("Specialties: ", "")])
+        df['street_address'] = replace_in_strings(df['street_address'], [("None", "")])
+        mask_images = get_type_mask(df['images'], list)
+        if mask_images.any():
+            df.loc[mask_images, 'images'] = Series([[i.replace(i.split("/")[-1], "o.jpg") for i in x]
+                                                    for x in df.loc[mask_images, 'images']],
+                                                   index=df.index[mask_images], dtype=object)
         for s_key, s_value in df.items():
             if s_value.dtype == 'object':
-                df[s_key] = df[s_key].apply(
-                    lambda x: x \
-                        .replace("amp;", "") \
-                        .replace("&#x27;", "'") \
-                        .replace(" ", "") \
-                        .strip() if isinstance(x, str) else x)
+                df[s_key] = replace_in_lists(replace_in_strings(s_value, HTML_CLEANUP_REPLACEMENTS),
+                                             HTML_CLEANUP_REPLACEMENTS)
+        df['content_hash'] = get_content_hash(flatten_list_columns(df), L_CONTENT_HASH_COLUMNS)
+        if bool_flatten_lists:
+            df = flatten_list_columns(df)
     except Exception as e:
         o_logger.error(f"Failed to post-process data: {e}")
     return df
 
 
+def get_content_hash(df: DataFrame, l_columns: list[str]) -> Series:
+    """
+    Get the SHA-256 hash of some post-processed columns of each row
+    :param df: DataFrame
+    :param l_columns: list[str] - columns hashed, the missing ones are skipped
+    :return: Series
+    """
+    df_content = df[[s_column for s_column in l_columns if s_column in df.columns]].astype(str)
+    return Series([hashlib.sha256("\x1f".join(t_values).encode()).hexdigest()
+                   for t_values in df_content.itertuples(index=False, name=None)], index=df.index, dtype=object)
+
+
+def get_urls_to_refresh(df_search_page: DataFrame, df_stored: DataFrame, date_stale_before: date) -> list[str]:
+    """
+    Get the urls of the search to crawl again: not in the database, with search page elements different from the
+    database (rating, review count, price range, categories), without content hash, or older than `date_stale_before`
+    :param df_search_page: DataFrame - elements of the search pages
+    :param df_stored: DataFrame - url, `L_SEARCH_CHANGE_COLUMNS`, content_hash and date_insertion of the rows in the
+    database
+    :param date_stale_before: date
+    :return: list[str] - in the order of the search, without duplicates
+    """
+    df_search = df_search_page.drop_duplicates(subset='url')[['url'] + L_SEARCH_CHANGE_COLUMNS].copy()
+    # The search page elements are compared once formatted like the rows of the database
+    mask_categories = get_type_mask(df_search['categories'], list)
+    if mask_categories.any():
+        df_search.loc[mask_categories, 'categories'] = df_search.loc[mask_categories, 'categories'].str.join(", ")
+    for s_column in ('price_range', 'categories'):
+        df_search[s_column] = replace_in_strings(df_search[s_column].fillna(""), HTML_CLEANUP_REPLACEMENTS)
+    df_merged = df_search.merge(df_stored, on='url', how='left', suffixes=('', '_stored'), indicator=True)
+
+    mask_refresh = (df_merged['_merge'] == 'left_only').to_numpy()
+    mask_refresh |= df_merged['content_hash'].isna().to_numpy()
+    mask_refresh |= (pd.to_datetime(df_merged['date_insertion']) < pd.Timestamp(date_stale_before)).to_numpy()
+    for s_column, int_decimals in (('rating', 1), ('review_count', 0)):
+        mask_refresh |= (pd.to_numeric(df_merged[s_column]).round(int_decimals)
+                         != pd.to_numeric(df_merged[f"{s_column}_stored"]).round(int_decimals)).to_numpy()
+    for s_column in ('price_range', 'categories'):
+        mask_refresh |= (df_merged[s_column].astype(str) != df_merged[f"{s_column}_stored"].astype(str)).to_numpy()
+    return df_merged.loc[mask_refresh, 'url'].to_list()
+
+
+def count_content_changes(df_business: DataFrame, dc_stored_content_hashes: dict[str, str]) -> tuple[int, int]:
+    """
+    Compare the content hash of the businesses crawled again with the one stored in the database, the rows are still
+    written to refresh their insertion date, the changes are counted in the refreshed_rows_total metric
+    :param df_business: DataFrame - post-processed businesses
+    :param dc_stored_content_hashes: dict[str, str] - content hash in the database of the urls crawled again
+    :return: tuple[int, int] - number of businesses crawled again whose content changed, and did not change
+    """
+    s_stored_hashes = df_business['url'].map(dc_stored_content_hashes)
+    mask_refreshed = s_stored_hashes.notna()
+    int_nb_changed = int((mask_refreshed & (s_stored_hashes != df_business['content_hash'])).sum())
+    int_nb_unchanged = int(mask_refreshed.sum()) - int_nb_changed
+    for s_content, int_nb_rows in (("changed", int_nb_changed), ("unchanged", int_nb_unchanged)):
+        if int_nb_rows:
+            METRICS.increment("refreshed_rows_total", int_nb_rows, content=s_content)
+    if mask_refreshed.any():
+        o_logger.info(f"Refresh: {int_nb_changed} business(es) changed since their last crawl, "
+                      f"{int_nb_unchanged} unchanged")
+    return int_nb_changed, int_nb_unchanged
+
+
+@lru_cache(maxsize=1)
+def get_date_insertion(s_today_date: str) -> date:
+    """
+    Get the insertion date of the rows, parsed once per day and shared by every batch
+    :param s_today_date: str - today's date in the format of dd_mm_yyyy
+    :return: date
+    """
+    return datetime.strptime(s_today_date, '%d_%m_%Y').date()
+
+
+def replace_in_lists(s_column: Series, l_replacements: list[tuple[str, str]]) -> Series:
+    """
+    Apply the replacements to the string items of the list values of a column, nested lists included, the other values
+    are left untouched. The items are not stripped, the text outputs strip the joined string like before the lists were
+    kept
+    :param s_column: Series
+    :param l_replacements: list[tuple[str, str]] - (old, new) pairs applied in order
+    :return: Series
+    """
+    mask_lists = get_type_mask(s_column, list)
+    if not mask_lists.any():
+        return s_column
+    s_column = s_column.copy()
+    s_column[mask_lists] = Series([_replace_in_list(l_value, l_replacements) for l_value in s_column[mask_lists]],
+                                  index=s_column.index[mask_lists], dtype=object)
+    return s_column
+
+
+def _replace_in_list(l_values: list, l_replacements: list[tuple[str, str]]) -> list:
+    l_replaced = []
+    for value in l_values:
+        if isinstance(value, list):
+            value = _replace_in_list(value, l_replacements)
+        elif isinstance(value, str):
+            for s_old, s_new in l_replacements:
+                value = value.replace(s_old, s_new)
+        l_replaced.append(value)
+    return l_replaced
+
+
+def get_type_mask(s_column: Series, o_type: type) -> Series:
+    """
+    Get the mask of the values of a column that are instances of a type
+    :param s_column: Series
+    :param o_type: type
+    :return: Series
+    """
+    if o_type is str and infer_dtype(s_column, skipna=False) == "string":
+        return pd.Series(True, index=s_column.index)
+    return s_column.map(lambda x: isinstance(x, o_type)).astype(bool)
+
+
+def replace_in_strings(s_column: Series, l_replacements: list[tuple[str, str]]) -> Series:
+    """
+    Apply the replacements then strip the string values of a column, the other values are left untouched
+    :param s_column: Series
+    :param l_replacements: list[tuple[str, str]] - (old, new) pairs applied in order
+    :return: Series
+    """
+    mask_strings = get_type_mask(s_column, str)
+    if not mask_strings.any():
+        return s_column
+    s_strings = s_column[mask_strings]
+    for s_old, s_new in l_replacements:
+        s_strings = s_strings.str.replace(s_old, s_new, regex=False)
+    s_strings = s_strings.str.strip()
+    if mask_strings.all():
+        return s_strings
+    s_column = s_column.copy()
+    s_column[mask_strings] = s_strings
+    return s_column
+
+
 def parse_url_with_query_params(s_url: str, dc_params: dict[str], int_nb_business: int) -> str:
     """
     Parse the URL with the query parameters
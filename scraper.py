@@ -1,17 +1,34 @@
+import asyncio
+import json
 import logging
 import os
+import socket
 from argparse import ArgumentParser
 from dataclasses import dataclass
-from typing import Any
+from datetime import date
+from typing import Any, TYPE_CHECKING
 
-from pandas import DataFrame
+import pandas as pd
 
-from database.sql_requests import SqlRequests
-from pages.yelp import Yelp
-from utilities.helper import get_today_date
+from data_processing.sinks.base_sink import RecordSink
+from data_processing.sinks.csv_sink import CsvSink
+from pages.yelp import DC_COLUMN_TYPES, Yelp, count_content_changes, post_processing_data
+from utilities.fetcher_pool import FETCHER_POOL
+from utilities.helper import get_today_date, get_search_jobs
+from utilities.metrics import METRICS
+from utilities.rate_limiter import RATE_LIMITER
+from utilities.response_cache import RESPONSE_CACHE
+from utilities.request_utils import FETCHER_SELECTOR, INT_DEFAULT_MAX_REQUESTS, set_max_concurrent_requests
+
+if TYPE_CHECKING:
+    from database.sql_requests import SqlRequests
+    from database.work_queue import WorkItem
 
 o_logger = logging.getLogger(__name__)
 
+# Seconds a queue worker waits before leasing again when the queue is empty but links are still being processed
+F_QUEUE_POLL_INTERVAL = 5.0
+
 
 @dataclass
 class MainScraper:
@@ -26,29 +43,268 @@ class MainScraper:
         Execute the main process
         :return: None
         """
+        set_max_concurrent_requests(self.obj_argparse.max_requests
+                                    or max(INT_DEFAULT_MAX_REQUESTS, self.obj_argparse.concurrency))
+        FETCHER_POOL.configure(self.obj_argparse.pool_size or self.obj_argparse.concurrency,
+                               self.obj_argparse.max_pages_per_context)
+        RATE_LIMITER.configure(self.obj_argparse.rate_limit, self.obj_argparse.burst, self.obj_argparse.max_rate_limit)
+        RESPONSE_CACHE.configure(self.obj_argparse.cache_dir, self.obj_argparse.cache_max_size,
+                                 not self.obj_argparse.no_cache, self.obj_argparse.replay)
+        o_task_metrics = None
+        if self.obj_argparse.metrics_file:
+            o_task_metrics = asyncio.create_task(
+                METRICS.write_prometheus_periodically(self.obj_argparse.metrics_file, self.obj_argparse.metrics_interval))
         try:
-            await self._main_scraper()
+            if self.obj_argparse.queue_role == "producer":
+                await self._enqueue_searches()
+            elif self.obj_argparse.queue_role == "worker":
+                await self._work_from_queue()
+            else:
+                await self._main_scraper()
         except Exception as o_exception:
             o_logger.error(f"Error in main process: {o_exception}")
             raise o_exception
+        finally:
+            await FETCHER_POOL.close()
+            FETCHER_SELECTOR.dump_stats(f"outputs/fetcher_stats_{get_today_date()}.json")
+            if o_task_metrics is not None:
+                o_task_metrics.cancel()
+                METRICS.write_prometheus(self.obj_argparse.metrics_file)
+            METRICS.dump_summary(f"outputs/run_summary_{get_today_date()}_{os.getpid()}.json")
 
     async def _main_scraper(self) -> None:
         """
-        Main process of the script: get data from the website, parse it and save it
+        Main process of the script: crawl the searches of the run, `--parallel-jobs` at a time. The searches share the
+        fetchers, the rate limiter, the response cache and the database engine, their requests are interleaved by the
+        global limit of requests in flight, and each one is written to its own table and file.
         :return: None
         """
         o_logger.info('Main process started.')
-        o_sql_requests = SqlRequests() if not self.obj_argparse.no_database else None
-        df_yelp = await Yelp(self.dc_configuration, o_sql_requests, self.obj_argparse).process_data()
-        o_logger.info(f"length of dataframe yelp: {len(df_yelp)} row(s)")
-        self.save_data_to_csv(df_yelp) if not self.obj_argparse.no_csv else None
+        l_jobs = get_search_jobs(self.dc_configuration["Yelp"])
+        int_parallel_jobs = max(1, min(self.obj_argparse.parallel_jobs, len(l_jobs)))
+        o_logger.info(f"{len(l_jobs)} search(es) to crawl, {int_parallel_jobs} at a time")
+        o_queue_jobs: asyncio.Queue[dict[str, str]] = asyncio.Queue()
+        for dc_job_params in l_jobs:
+            o_queue_jobs.put_nowait(dc_job_params)
+        l_jobs_failed = []
+
+        async def _job_worker() -> None:
+            while not o_queue_jobs.empty():
+                dc_job_params = o_queue_jobs.get_nowait()
+                try:
+                    await self._run_job(dc_job_params)
+                except Exception as o_exception:
+                    o_logger.error(f"Search {dc_job_params} failed: {o_exception}")
+                    l_jobs_failed.append(dc_job_params)
+
+        await asyncio.gather(*(_job_worker() for _ in range(int_parallel_jobs)))
+        if l_jobs_failed:
+            raise RuntimeError(f"{len(l_jobs_failed)}/{len(l_jobs)} search(es) failed: {l_jobs_failed}")
         o_logger.info('Main process ended.')
 
-    def save_data_to_csv(self, df_yelp: DataFrame) -> None:
-        dc_path = self.dc_configuration["Yelp"]
-        dc_params = dc_path["params"]
-        dc_params['find_loc'] = dc_params['find_loc'].lower()
-        dc_params['find_desc'] = dc_params['find_desc'].lower()
+    async def _enqueue_searches(self) -> None:
+        """
+        Producer of the work queue: crawl the search pages of the run and enqueue the business links to process, with
+        their search page elements, for the workers
+        :return: None
+        """
+        o_logger.info('Producer started.')
+        from database.work_queue import get_work_queue
+        o_work_queue = get_work_queue(self.obj_argparse.queue_url, self.obj_argparse.max_attempts)
+        for dc_job_params in get_search_jobs(self.dc_configuration["Yelp"]):
+            o_sql_requests = await asyncio.to_thread(self._connect_database, dc_job_params)
+            o_yelp = Yelp(self._get_job_configuration(dc_job_params), o_sql_requests, self.obj_argparse)
+            df_search_page, l_links = await o_yelp.retrieve_links()
+            dc_search_rows = {dc_row['url']: dc_row for dc_row in df_search_page.to_dict('records')}
+            s_job_key = get_job_key(dc_job_params)
+            l_items = [(s_link, s_job_key, {"params": dc_job_params, "search_row": dc_search_rows[s_link],
+                                            "stored_content_hash": o_yelp.dc_stored_content_hashes.get(s_link)})
+                       for s_link in l_links]
+            # The urls crawled again by --refresh were already processed by a previous run
+            int_nb_added = await asyncio.to_thread(o_work_queue.enqueue, l_items, self.obj_argparse.refresh)
+            o_logger.info(f"Search {dc_job_params}: {int_nb_added}/{len(l_items)} link(s) added to the queue")
+        o_logger.info(f"Producer ended, queue: {await asyncio.to_thread(o_work_queue.count_by_status)}")
+
+    async def _work_from_queue(self) -> None:
+        """
+        Worker of the work queue: lease the business links one by one with `--concurrency` workers, process them and
+        acknowledge them once their rows are stored by every sink, until the queue has no pending nor leased link left.
+        A link that fails, or whose rows failed to be stored, is given back to be retried, by this worker or another
+        one, up to `--max-attempts` times.
+        :return: None
+        """
+        s_worker_id = self.obj_argparse.worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        o_logger.info(f'Worker {s_worker_id} started.')
+        from database.work_queue import LEASED, PENDING, get_work_queue
+        o_work_queue = get_work_queue(self.obj_argparse.queue_url, self.obj_argparse.max_attempts)
+        dc_job_sessions: dict[str, asyncio.Task[tuple[Yelp, list[RecordSink]]]] = {}
+        set_tasks_ack: set[asyncio.Task] = set()
+
+        async def _open_job_session(dc_job_params: dict[str, str]) -> tuple[Yelp, list[RecordSink]]:
+            o_sql_requests = await asyncio.to_thread(self._connect_database, dc_job_params)
+            return (Yelp(self._get_job_configuration(dc_job_params), o_sql_requests, self.obj_argparse),
+                    self._build_sinks(o_sql_requests, dc_job_params, s_worker_id))
+
+        async def _get_job_session(s_job_key: str, dc_job_params: dict[str, str]) -> tuple[Yelp, list[RecordSink]]:
+            # The workers of a search share its session, opened once by the first of them
+            if s_job_key not in dc_job_sessions:
+                dc_job_sessions[s_job_key] = asyncio.create_task(_open_job_session(dc_job_params))
+            return await dc_job_sessions[s_job_key]
+
+        def _get_opened_sinks() -> list[RecordSink]:
+            return [o_sink for o_task_session in dc_job_sessions.values()
+                    if o_task_session.done() and not o_task_session.cancelled() and o_task_session.exception() is None
+                    for o_sink in o_task_session.result()[1]]
+
+        def _ack_once_stored(o_item: 'WorkItem', l_futures_stored: list[asyncio.Future[bool]]) -> None:
+            async def _ack() -> None:
+                if all(await asyncio.gather(*l_futures_stored)):
+                    await asyncio.to_thread(o_work_queue.ack, o_item)
+                else:
+                    await asyncio.to_thread(o_work_queue.release, o_item, "failed to store the rows")
+
+            o_task = asyncio.create_task(_ack())
+            set_tasks_ack.add(o_task)
+            o_task.add_done_callback(set_tasks_ack.discard)
+
+        async def _wait_items_acked() -> None:
+            if set_tasks_ack:
+                await asyncio.gather(*set_tasks_ack)
+
+        async def _worker() -> None:
+            while True:
+                l_items = await asyncio.to_thread(o_work_queue.lease, s_worker_id, 1, self.obj_argparse.lease_timeout)
+                if not l_items:
+                    # The links of this worker whose rows are still buffered are leased until the rows are stored
+                    for o_sink in _get_opened_sinks():
+                        await o_sink.flush()
+                    await _wait_items_acked()
+                    dc_counts = await asyncio.to_thread(o_work_queue.count_by_status)
+                    if not dc_counts.get(PENDING) and not dc_counts.get(LEASED):
+                        return
+                    await asyncio.sleep(F_QUEUE_POLL_INTERVAL)
+                    continue
+                o_item = l_items[0]
+                dc_job_params = o_item.dc_payload["params"]
+                try:
+                    o_yelp, l_sinks = await _get_job_session(o_item.s_job_key, dc_job_params)
+                    df_link = await o_yelp.process_link(o_item.s_url,
+                                                        pd.DataFrame([o_item.dc_payload["search_row"]]))
+                    if df_link is None:
+                        await asyncio.to_thread(o_work_queue.release, o_item, "failed to process")
+                        continue
+                    l_futures_stored = []
+                    if not df_link.empty:
+                        df_business = post_processing_data(df_link, dc_job_params, bool_flatten_lists=False)
+                        if o_item.dc_payload.get("stored_content_hash"):
+                            count_content_changes(df_business,
+                                                  {o_item.s_url: o_item.dc_payload["stored_content_hash"]})
+                        l_futures_stored = [await o_sink.write(df_business) for o_sink in l_sinks]
+                except Exception as o_exception:
+                    o_logger.error(f"Failed to process {o_item.s_url}: {o_exception}")
+                    await asyncio.to_thread(o_work_queue.release, o_item, str(o_exception))
+                    continue
+                _ack_once_stored(o_item, l_futures_stored)
+
+        try:
+            await asyncio.gather(*(_worker() for _ in range(max(1, self.obj_argparse.concurrency))))
+        finally:
+            for o_sink in _get_opened_sinks():
+                await o_sink.close()
+            await _wait_items_acked()
+        o_logger.info(f"Worker {s_worker_id} ended, queue: {await asyncio.to_thread(o_work_queue.count_by_status)}")
+
+    def _get_job_configuration(self, dc_job_params: dict[str, str]) -> dict[str, Any]:
+        """
+        Get the configuration of a search: the configuration of the run with the parameters of the search
+        :param dc_job_params: dict[str, str] - search parameters of the job
+        :return: dict[str, Any]
+        """
+        return {**self.dc_configuration, "Yelp": {**self.dc_configuration["Yelp"], "params": dc_job_params}}
+
+    async def _run_job(self, dc_job_params: dict[str, str]) -> None:
+        """
+        Get the data of a search from the website, parse it and stream it to the sinks of the search
+        :param dc_job_params: dict[str, str] - search parameters of the job
+        :return: None
+        """
+        o_logger.info(f"Search {dc_job_params} started.")
+        dc_configuration = self._get_job_configuration(dc_job_params)
+        o_sql_requests = await asyncio.to_thread(self._connect_database, dc_job_params)
+        l_sinks = self._build_sinks(o_sql_requests, dc_job_params)
+        o_frontier = None
+        if self.obj_argparse.resume:
+            from database.crawl_frontier import CrawlFrontier
+            o_frontier = await asyncio.to_thread(CrawlFrontier, self.obj_argparse.frontier_path,
+                                                 get_job_key(dc_job_params))
+        o_yelp = Yelp(dc_configuration, o_sql_requests, self.obj_argparse, o_frontier)
+        int_nb_rows = 0
+        try:
+            async for l_links, df_business in o_yelp.iter_batches():
+                int_nb_rows += len(df_business)
+                o_yelp.mark_done_once_stored(l_links, [await o_sink.write(df_business) for o_sink in l_sinks])
+        finally:
+            for o_sink in l_sinks:
+                await o_sink.close()
+            await o_yelp.wait_links_marked_done()
+        o_logger.info(f"length of dataframe yelp for {dc_job_params}: {int_nb_rows} row(s)")
+        if o_frontier is not None:
+            o_logger.info(f"Crawl frontier of {dc_job_params}: "
+                          f"{await asyncio.to_thread(o_frontier.count_by_status)}")
+
+    def _connect_database(self, dc_job_params: dict[str, str]) -> 'SqlRequests | None':
+        """
+        Connect to the table of a search, the database stack is only imported when the database is used.
+        Connecting and creating the table block, so the callers run it in a thread, out of the event loop
+        :param dc_job_params: dict[str, str] - search parameters of the job
+        :return: SqlRequests | None - None with `--no-database`
+        """
+        if self.obj_argparse.no_database:
+            return None
+        from database.sql_requests import SqlRequests
+        return SqlRequests(dc_job_params)
+
+    def _build_sinks(self, o_sql_requests: 'SqlRequests | None', dc_job_params: dict[str, str],
+                     s_worker_id: str | None = None) -> list[RecordSink]:
+        """
+        Build the sinks the processed records of a search are streamed to, according to the arguments
+        :param o_sql_requests: SqlRequests | None
+        :param dc_job_params: dict[str, str] - search parameters of the job
+        :param s_worker_id: str | None - id of the queue worker, each worker writes its own CSV file
+        :return: list[RecordSink]
+        """
+        int_batch_size = self.obj_argparse.batch_size
+        f_flush_interval = self.obj_argparse.flush_interval
+        l_sinks: list[RecordSink] = []
+        if o_sql_requests is not None:
+            from data_processing.sinks.database_sink import DatabaseSink
+            l_sinks.append(DatabaseSink(o_sql_requests, int_batch_size, f_flush_interval))
+        if not self.obj_argparse.no_csv:
+            s_output_filename = self.get_output_filename(dc_job_params)
+            if s_worker_id is not None:
+                s_output_filename = s_output_filename.replace(".csv", f"_{s_worker_id}.csv".replace(" ", "_"))
+            l_sinks.append(CsvSink(s_output_filename, int_batch_size, f_flush_interval, self.obj_argparse.resume))
+            o_logger.info(f"Data will be saved to {s_output_filename}")
+        if self.obj_argparse.parquet:
+            from data_processing.sinks.parquet_sink import ParquetSink
+            dc_partitions = {s_key: str(dc_job_params[s_key]).strip().lower().replace(" ", "_")
+                             for s_key in ("find_loc", "find_desc")}
+            dc_partitions["date"] = date.today().isoformat()
+            o_parquet_sink = ParquetSink(self.obj_argparse.parquet_dir, dc_partitions, DC_COLUMN_TYPES,
+                                         "part" if s_worker_id is None else f"part-{s_worker_id}".replace(" ", "_"),
+                                         self.obj_argparse.parquet_row_group_size, f_flush_interval)
+            l_sinks.append(o_parquet_sink)
+            o_logger.info(f"Data will be saved to {o_parquet_sink.s_output_filename}")
+        return l_sinks
+
+    @staticmethod
+    def get_output_filename(dc_job_params: dict[str, str]) -> str:
+        """
+        Get the path of the CSV file of a search: outputs/<find_loc>/<find_desc>/<params>_<date>.csv
+        :param dc_job_params: dict[str, str] - search parameters of the job
+        :return: str
+        """
+        dc_params = {s_key: str(s_value).lower() for s_key, s_value in dc_job_params.items()}
         s_output_filename = ""
         for s_key, s_value in dc_params.items():
             s_output_filename += f"{s_value}_".replace(" ", "_")
@@ -56,7 +312,13 @@ class MainScraper:
         s_output_filename += f"{s_today_date}.csv"
         s_inner_dir = f"{dc_params['find_loc']}".strip().replace(" ", "_")
         s_sub_dir = f"{dc_params['find_desc']}".strip().replace(" ", "_")
-        os.makedirs(f"outputs/{s_inner_dir}/{s_sub_dir}", exist_ok=True)
-        s_output_filename = f"outputs/{s_inner_dir}/{s_sub_dir}/{s_output_filename}"
-        df_yelp.to_csv(s_output_filename, index=False)
-        o_logger.info(f"Data saved to {s_output_filename}")
+        return f"outputs/{s_inner_dir}/{s_sub_dir}/{s_output_filename}"
+
+
+def get_job_key(dc_job_params: dict[str, str]) -> str:
+    """
+    Get the key of a search in the work queue, the links of a search are enqueued once
+    :param dc_job_params: dict[str, str] - search parameters of the job
+    :return: str
+    """
+    return json.dumps({s_key: str(s_value).lower() for s_key, s_value in dc_job_params.items()}, sort_keys=True)
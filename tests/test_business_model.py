@@ -0,0 +1,47 @@
+import pytest
+
+from data_processing.models.business_model import convert_time_to_24h, normalize_hours, normalize_hours_range
+
+
+@pytest.mark.parametrize("s_time, s_expected", [
+    ("11:30 AM", "11h30"),
+    ("2:30 PM", "14h30"),
+    ("12:00 PM", "12h00"),
+    ("12:00 AM", "00h00"),
+    ("12:30 AM", "00h30"),
+])
+def test_convert_time_to_24h(s_time, s_expected):
+    assert convert_time_to_24h(s_time) == s_expected
+
+
+@pytest.mark.parametrize("s_hours, s_expected", [
+    ("11:30 AM - 2:30 PM", "11h30 - 14h30"),
+    ("8:00 AM - 12:00 PM", "08h00 - 12h00"),
+    ("12:00 PM - 3:00 PM", "12h00 - 15h00"),
+    ("6:00 PM - 12:00 AM", "18h00 - 00h00"),
+    ("7:00 PM - 2:00 AM (Next day)", "19h00 - 02h00"),
+    ("12:00 PM - 12:00 AM (Next day)", "12h00 - 00h00"),
+    ("Closed", "Fermé"),
+])
+def test_normalize_hours_range(s_hours, s_expected):
+    assert normalize_hours_range(s_hours) == s_expected
+
+
+def test_normalize_hours_keeps_every_range_of_a_day():
+    l_hours_data = [
+        {"dayOfWeekShort": "Mon", "hours": ["11:30 AM - 2:30 PM", "7:00 PM - 11:00 PM"]},
+        {"dayOfWeekShort": "Fri", "hours": ["11:30 AM - 2:30 PM", "7:00 PM - 1:00 AM (Next day)"]},
+        {"dayOfWeekShort": "Sun", "hours": ["Closed"]},
+    ]
+    assert normalize_hours(l_hours_data) == [
+        ["Lundi", "11h30 - 14h30 / 19h00 - 23h00"],
+        ["Vendredi", "11h30 - 14h30 / 19h00 - 01h00"],
+        ["Dimanche", "Fermé"],
+    ]
+
+
+def test_normalize_hours_without_hours():
+    assert normalize_hours([]) == []
+    assert normalize_hours(None) == []
+    assert normalize_hours([{"dayOfWeekShort": "Tue", "hours": []},
+                            {"dayOfWeekShort": "Wed"}]) == [["Mardi", ""], ["Mercredi", ""]]
@@ -0,0 +1,35 @@
+import pandas as pd
+
+from database.crawl_frontier import CrawlFrontier, DONE, FAILED, PENDING
+
+
+def get_frontier(tmp_path, s_job_key: str = "job") -> CrawlFrontier:
+    o_frontier = CrawlFrontier(str(tmp_path / "frontier.db"), s_job_key)
+    l_links = ["u1", "u2", "u3"]
+    o_frontier.start_search(pd.DataFrame({"url": l_links, "business_id": ["b1", "b2", "b3"]}), l_links)
+    return o_frontier
+
+
+def test_interrupted_search_resumes_the_links_not_done(tmp_path):
+    o_frontier = get_frontier(tmp_path)
+    o_frontier.mark_in_flight("u1")
+    o_frontier.mark_done(["u1"])
+    o_frontier.mark_in_flight("u2")
+    o_frontier.mark_failed("u2", "error")
+    df_search_page, l_links = o_frontier.get_links_to_resume()
+    assert l_links == ["u2", "u3"]
+    assert df_search_page["business_id"].to_list() == ["b2", "b3"]
+
+
+def test_completed_search_is_crawled_again(tmp_path):
+    o_frontier = get_frontier(tmp_path)
+    o_frontier.mark_done(["u1", "u3"])
+    o_frontier.mark_failed("u2", "error")
+    assert o_frontier.count_by_status() == {DONE: 2, FAILED: 1}
+    assert o_frontier.get_links_to_resume() is None
+    assert o_frontier.count_by_status()[DONE] == 2
+
+
+def test_search_without_frontier_is_not_resumed(tmp_path):
+    assert get_frontier(tmp_path).count_by_status() == {PENDING: 3}
+    assert CrawlFrontier(str(tmp_path / "frontier.db"), "other_job").get_links_to_resume() is None
@@ -0,0 +1,23 @@
+from utilities.fetcher_selector import FetcherSelector
+from utilities.rate_limiter import HostRateLimiter
+
+S_URL = "https://www.yelp.com/biz/some-restaurant"
+
+
+def test_failures_of_other_fetchers_do_not_slow_the_host_down():
+    o_limiter = HostRateLimiter()
+    o_limiter.on_response(S_URL, 403, bool_throttle=False)
+    o_limiter.on_response(S_URL, None, bool_throttle=False)
+    assert "www.yelp.com" not in o_limiter.dc_buckets
+    o_limiter.on_response(S_URL, 403)
+    assert o_limiter.dc_buckets["www.yelp.com"].f_rate == o_limiter.f_rate / 2
+
+
+def test_selected_fetcher_is_the_cheapest_working_one():
+    o_selector = FetcherSelector(l_fetchers_by_cost=["AsyncFetcher", "StealthyFetcher"], f_exploration_rate=1.0)
+    assert o_selector.get_selected_fetcher(S_URL) == "AsyncFetcher"
+    for _ in range(3):
+        o_selector.record(S_URL, "AsyncFetcher", False, 0.1)
+    assert o_selector.get_selected_fetcher(S_URL) == "StealthyFetcher"
+    # The exploration requests still try the cheapest fetcher first
+    assert o_selector.order_fetchers(S_URL) == ["AsyncFetcher", "StealthyFetcher"]
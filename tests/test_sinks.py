@@ -0,0 +1,68 @@
+import asyncio
+
+import pandas as pd
+
+from data_processing.sinks.csv_sink import CsvSink
+
+
+def test_csv_sink_writes_the_full_batches_and_flattens_the_lists(tmp_path):
+    s_output_filename = str(tmp_path / "out.csv")
+
+    async def _write() -> list[bool]:
+        o_sink = CsvSink(s_output_filename, int_batch_size=2)
+        o_future_first = await o_sink.write(pd.DataFrame({"url": ["u1"], "categories": [["Bar", "Café"]]}))
+        assert not o_future_first.done()
+        o_future_second = await o_sink.write(pd.DataFrame({"url": ["u2"], "categories": [[]]}))
+        o_future_last = await o_sink.write(pd.DataFrame({"url": ["u3"], "categories": [["Pub"]]}))
+        assert o_future_first.done() and not o_future_last.done()
+        await o_sink.close()
+        return [o_future.result() for o_future in (o_future_first, o_future_second, o_future_last)]
+
+    assert asyncio.run(_write()) == [True, True, True]
+    df = pd.read_csv(s_output_filename, keep_default_na=False)
+    assert df.to_dict("list") == {"url": ["u1", "u2", "u3"], "categories": ["Bar, Café", "", "Pub"]}
+
+
+def test_sink_writes_the_buffer_once_the_flush_interval_has_elapsed_without_other_write(tmp_path):
+    s_output_filename = str(tmp_path / "out.csv")
+
+    async def _write() -> bool:
+        o_sink = CsvSink(s_output_filename, int_batch_size=100, f_flush_interval=0.05)
+        o_future_stored = await o_sink.write(pd.DataFrame({"url": ["u1"]}))
+        bool_stored = await asyncio.wait_for(o_future_stored, 1)
+        assert pd.read_csv(s_output_filename)["url"].to_list() == ["u1"]
+        await o_sink.close()
+        return bool_stored
+
+    assert asyncio.run(_write())
+
+
+def test_parquet_sink_writes_row_groups_with_the_declared_schema(tmp_path):
+    from datetime import date
+
+    import pyarrow.parquet as pq
+
+    from data_processing.sinks.parquet_sink import ParquetSink
+
+    dc_column_types = {"url": str, "rating": float, "review_count": int, "categories": list[str],
+                       "hours": list[list[str]], "date_insertion": date}
+
+    async def _write() -> str:
+        o_sink = ParquetSink(str(tmp_path), {"find_loc": "lyon"}, dc_column_types, int_batch_size=2)
+        # The first batch only has empty lists and missing values, the columns of the second one are of other types
+        await o_sink.write(pd.DataFrame({"url": ["u1", "u2"], "rating": [None, None], "review_count": ["", ""],
+                                         "categories": [[], []], "hours": [[], []], "extra": [1, 2]}))
+        await o_sink.write(pd.DataFrame({"url": ["u3"], "rating": ["4.5"], "review_count": [12.0],
+                                         "categories": [["Bar"]], "hours": [[["Lundi", "11h30 - 14h30"]]],
+                                         "date_insertion": [date(2025, 1, 31)]}))
+        await o_sink.close()
+        return o_sink.s_output_filename
+
+    o_file = pq.ParquetFile(asyncio.run(_write()))
+    assert o_file.metadata.num_row_groups == 2
+    assert o_file.schema_arrow.names == list(dc_column_types)
+    assert o_file.read().to_pylist() == [
+        {"url": "u1", "rating": None, "review_count": None, "categories": [], "hours": [], "date_insertion": None},
+        {"url": "u2", "rating": None, "review_count": None, "categories": [], "hours": [], "date_insertion": None},
+        {"url": "u3", "rating": 4.5, "review_count": 12, "categories": ["Bar"], "hours": [["Lundi", "11h30 - 14h30"]],
+         "date_insertion": date(2025, 1, 31)}]
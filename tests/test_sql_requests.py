@@ -0,0 +1,62 @@
+import json
+from datetime import date
+
+import pandas as pd
+import pytest
+from sqlalchemy import inspect, text
+
+from database.database_engine import DatabaseEngine, SingletonMeta
+from database.sql_requests import SqlRequests
+
+DC_PARAMS = {"find_desc": "restaurants", "find_loc": "lyon"}
+
+
+@pytest.fixture
+def o_sql_requests(tmp_path, monkeypatch) -> SqlRequests:
+    # The engine of the run reads the SQLite setup_database.json of the working directory
+    (tmp_path / "inputs").mkdir()
+    (tmp_path / "inputs" / "setup_database.json").write_text(
+        json.dumps({"engine": "sqlite", "database": str(tmp_path / "yelp.db"), "schema": "yelp"}))
+    monkeypatch.chdir(tmp_path)
+    SingletonMeta._instances.pop(DatabaseEngine, None)
+    yield SqlRequests(DC_PARAMS)
+    SingletonMeta._instances.pop(DatabaseEngine).o_database_engine.dispose()
+
+
+def get_df_rows(l_urls: list[str], s_name: str = "name") -> pd.DataFrame:
+    return pd.DataFrame([{"business_id": f"id-{s_url}", "url": s_url, "name": s_name, "rating": 4.5, "review_count": 10,
+                          "price_range": "€€", "categories": "Bar, Café", "phone": "", "website": "", "latitude": 45.7,
+                          "longitude": 4.8, "street_address": "", "postal_code": "69001", "address_locality": "Lyon",
+                          "address_country": "FR", "description": "", "amneties": "", "hours": "", "images": "",
+                          "date_insertion": date(2025, 1, 31), "content_hash": f"hash-{s_name}"} for s_url in l_urls])
+
+
+def test_upsert_updates_the_rows_already_in_the_table(o_sql_requests):
+    assert o_sql_requests.upsert_dataframe_into_database(get_df_rows(["u1", "u2"])) == 2
+    assert o_sql_requests.upsert_dataframe_into_database(get_df_rows(["u2", "u3"], "renamed")) == 2
+    df_rows = o_sql_requests.get_rows_of_urls(["u1", "u2", "u3"], ["name", "content_hash"]).sort_values("url")
+    assert df_rows.values.tolist() == [["u1", "name", "hash-name"], ["u2", "renamed", "hash-renamed"],
+                                       ["u3", "renamed", "hash-renamed"]]
+    assert sorted(o_sql_requests.get_all_distinct_urls()) == ["u1", "u2", "u3"]
+
+
+def test_get_urls_not_in_database_keeps_only_the_unseen_urls(o_sql_requests):
+    o_sql_requests.upsert_dataframe_into_database(get_df_rows(["u1", "u3"]))
+    assert o_sql_requests.get_urls_not_in_database(["u4", "u1", "u2", "u4", "u3"]) == ["u4", "u2"]
+    assert o_sql_requests.get_urls_not_in_database([]) == []
+
+
+def test_get_rows_of_urls_only_returns_the_stored_urls(o_sql_requests):
+    o_sql_requests.upsert_dataframe_into_database(get_df_rows(["u1", "u2"]))
+    df_rows = o_sql_requests.get_rows_of_urls(["u2", "u5"], ["rating", "categories"])
+    assert df_rows.values.tolist() == [["u2", 4.5, "Bar, Café"]]
+    assert o_sql_requests.get_rows_of_urls([], ["rating"]).columns.to_list() == ["url", "rating"]
+
+
+def test_create_table_adds_the_missing_nullable_columns(o_sql_requests):
+    o_engine = o_sql_requests.o_database_engine
+    with o_engine.begin() as o_connection:
+        o_connection.execute(text("ALTER TABLE restaurants_lyon DROP COLUMN content_hash"))
+    assert "content_hash" not in {dc_column["name"] for dc_column in inspect(o_engine).get_columns("restaurants_lyon")}
+    o_sql_requests.o_database.create_table("restaurants_lyon")
+    assert "content_hash" in {dc_column["name"] for dc_column in inspect(o_engine).get_columns("restaurants_lyon")}
@@ -0,0 +1,18 @@
+from database.work_queue import DONE, FAILED, LEASED, PENDING, get_work_queue
+
+
+def test_enqueue_puts_the_processed_items_back_to_pending_only_when_requeued(tmp_path):
+    o_work_queue = get_work_queue(f"sqlite:///{tmp_path / 'queue.db'}", int_max_attempts=1)
+    assert o_work_queue.enqueue([("u1", "job", {"v": 1}), ("u2", "job", {"v": 1}), ("u3", "job", {"v": 1})]) == 3
+    o_item_done, o_item_failed, o_item_leased = o_work_queue.lease("worker", 3, 60)
+    o_work_queue.ack(o_item_done)
+    o_work_queue.release(o_item_failed, "error")
+    assert o_work_queue.count_by_status() == {DONE: 1, FAILED: 1, LEASED: 1}
+
+    l_items = [("u1", "job", {"v": 2}), ("u2", "job", {"v": 2}), ("u3", "job", {"v": 2})]
+    assert o_work_queue.enqueue(l_items) == 0
+    assert o_work_queue.enqueue(l_items, bool_requeue=True) == 2
+    assert o_work_queue.count_by_status() == {PENDING: 2, LEASED: 1}
+    l_leased = o_work_queue.lease("worker", 3, 60)
+    assert [(o_item.s_url, o_item.dc_payload, o_item.int_attempts) for o_item in l_leased] == [
+        ("u1", {"v": 2}, 1), ("u2", {"v": 2}, 1)]
@@ -0,0 +1,34 @@
+import pandas as pd
+
+from data_processing.data_processing import flatten_list_columns
+from pages.yelp import count_content_changes, post_processing_data
+
+
+def get_df_business(**dc_values) -> pd.DataFrame:
+    dc_business = {"business_id": "id", "website": "https://example.com", "description": "Specialties: pizza",
+                   "street_address": "1 rue", "images": [], "categories": [], "hours": []}
+    return pd.DataFrame([{**dc_business, **dc_values}])
+
+
+def test_post_processing_flattens_lists_like_the_joined_strings():
+    df = post_processing_data(get_df_business(categories=["Bar ", " L&#x27;Café\xa0"],
+                                              hours=[["Mardi", " Fermé"], ["Mercredi", "11h30 - 14h30 "]]),
+                              {}, bool_flatten_lists=True)
+    assert df.loc[0, "categories"] == "Bar ,  L'Café"
+    assert df.loc[0, "hours"] == "Mardi :  Fermé, Mercredi : 11h30 - 14h30"
+    assert df.loc[0, "website"] == "example.com"
+    assert df.loc[0, "description"] == "pizza"
+
+
+def test_post_processing_keeps_lists_with_the_same_flattened_output():
+    df_lists = post_processing_data(get_df_business(categories=[" Bar ", "Café "]), {}, bool_flatten_lists=False)
+    df_flattened = post_processing_data(get_df_business(categories=[" Bar ", "Café "]), {}, bool_flatten_lists=True)
+    assert df_lists.loc[0, "categories"] == [" Bar ", "Café "]
+    assert flatten_list_columns(df_lists).loc[0, "categories"] == df_flattened.loc[0, "categories"] == "Bar , Café"
+    assert df_lists.loc[0, "content_hash"] == df_flattened.loc[0, "content_hash"]
+
+
+def test_count_content_changes_of_the_refreshed_businesses():
+    df = pd.DataFrame({"url": ["u1", "u2", "u3"], "content_hash": ["h1", "new", "h3"]})
+    assert count_content_changes(df, {"u1": "h1", "u2": "h2"}) == (1, 1)
+    assert count_content_changes(df, {}) == (0, 0)
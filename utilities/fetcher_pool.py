@@ -0,0 +1,324 @@
+import asyncio
+from contextlib import AsyncExitStack, asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator
+
+from camoufox.async_api import AsyncCamoufox
+from playwright.async_api import async_playwright
+from scrapling import StealthyFetcher, PlayWrightFetcher
+from scrapling.engines import CamoufoxEngine, PlaywrightEngine
+from scrapling.engines.constants import DEFAULT_STEALTH_FLAGS
+from scrapling.engines.toolbelt import (Response, StatusText, async_intercept_route, generate_convincing_referer,
+                                        generate_headers, js_bypass_path)
+
+from utilities.logging_utils import LoggerManager
+
+o_logger = LoggerManager.get_logger(__name__)
+
+# Private hooks of the scrapling engines used by the pool, checked against scrapling 0.2.99 (pinned in requirements.txt)
+# Without one of them, the fetcher falls back to scrapling's own fetch, which starts a browser per request
+DC_PRIVATE_HOOKS = {
+    "StealthyFetcher": ((StealthyFetcher, "_generate_parser_arguments"), (CamoufoxEngine, "_get_camoufox_options"),
+                        (CamoufoxEngine, "_async_process_response_history")),
+    "PlayWrightFetcher": ((PlayWrightFetcher, "_generate_parser_arguments"),
+                          (PlaywrightEngine, "_async_process_response_history")),
+}
+DC_STOCK_FETCHERS = {"StealthyFetcher": StealthyFetcher, "PlayWrightFetcher": PlayWrightFetcher}
+# Same bypass scripts (and order) as the ones injected by scrapling's PlaywrightEngine in stealth mode
+PLAYWRIGHT_STEALTH_SCRIPTS = ('webdriver_fully.js', 'window_chrome.js', 'navigator_plugins.js', 'pdf_viewer.js',
+                              'notification_permission.js', 'screen_props.js', 'playwright_fingerprint.js')
+
+
+@dataclass
+class ContextSlot:
+    """
+    ContextSlot class to hold a browser context leased from the pool and the number of pages it has served, the context
+    is None when it could not be replaced and is created again by the next lease
+    """
+    s_fetcher_name: str
+    o_context: Any | None
+    int_pages_served: int = 0
+    bool_failed: bool = False
+
+
+@dataclass
+class FetcherPool:
+    """
+    FetcherPool class to keep the browsers of the browser-based fetchers alive for the whole run.
+    Each browser is started once with `int_pool_size` contexts that are leased to the requests, a context is recycled
+    after `int_max_pages_per_context` pages or after a failure.
+    A page is fetched like scrapling's `async_fetch` of the engine (extra headers, final navigation response, page
+    action, wait selector, wait, redirect history), except that the browser is always launched locally: the `cdp_url`
+    and `nstbrowser_mode` options of PlayWrightFetcher are not supported by the pool.
+    """
+    int_pool_size: int = 1
+    int_max_pages_per_context: int = 50
+    dc_engines: dict[str, CamoufoxEngine | PlaywrightEngine] = field(default_factory=dict, init=False)
+    dc_browsers: dict[str, Any] = field(default_factory=dict, init=False)
+    dc_slots: dict[str, asyncio.Queue[ContextSlot]] = field(default_factory=dict, init=False)
+    set_stock_fetchers: set[str] = field(default_factory=set, init=False)
+    o_exit_stack: AsyncExitStack = field(default_factory=AsyncExitStack, init=False)
+    o_lock: asyncio.Lock = field(default_factory=asyncio.Lock, init=False)
+
+    BROWSER_FETCHERS = {"StealthyFetcher", "PlayWrightFetcher"}
+
+    def configure(self, int_pool_size: int, int_max_pages_per_context: int) -> None:
+        """
+        Configure the pool before its first use
+        :param int_pool_size: int - number of browser contexts started per browser
+        :param int_max_pages_per_context: int - number of pages served by a context before it is recycled
+        :return: None
+        """
+        self.int_pool_size = max(1, int_pool_size)
+        self.int_max_pages_per_context = max(1, int_max_pages_per_context)
+
+    async def fetch(self, s_fetcher_name: str, s_url: str, dc_params: dict[str, Any]) -> Response:
+        """
+        Fetch an URL with a browser context leased from the pool
+        :param s_fetcher_name: str - name of the fetcher in `FETCHERS`
+        :param s_url: str - URL to fetch
+        :param dc_params: dict[str, Any] - parameters of the fetcher in `FETCHERS`
+        :return: Response
+        """
+        await self._start(s_fetcher_name, dc_params)
+        if s_fetcher_name in self.set_stock_fetchers:
+            return await DC_STOCK_FETCHERS[s_fetcher_name]().async_fetch(s_url, **dc_params)
+        async with self.lease(s_fetcher_name) as o_slot:
+            o_response = await self._fetch_with_slot(o_slot, s_url)
+            o_slot.int_pages_served += 1
+            if o_response.status != 200:
+                o_slot.bool_failed = True
+            return o_response
+
+    @asynccontextmanager
+    async def lease(self, s_fetcher_name: str) -> AsyncIterator[ContextSlot]:
+        """
+        Lease a browser context of an already started browser, waiting until one is available
+        :param s_fetcher_name: str - name of the fetcher in `FETCHERS`
+        :return: AsyncIterator[ContextSlot]
+        """
+        o_queue_slots = self.dc_slots[s_fetcher_name]
+        o_slot = await o_queue_slots.get()
+        try:
+            if o_slot.o_context is None:
+                o_slot = await self._new_slot(s_fetcher_name)
+            yield o_slot
+        except Exception:
+            o_slot.bool_failed = True
+            raise
+        finally:
+            if self.dc_slots.get(s_fetcher_name) is not o_queue_slots:
+                # The pool was closed during the lease
+                await self._close_context(o_slot)
+            else:
+                if o_slot.o_context is not None and (o_slot.bool_failed
+                                                     or o_slot.int_pages_served >= self.int_max_pages_per_context):
+                    o_slot = await self._recycle(o_slot)
+                o_queue_slots.put_nowait(o_slot)
+
+    async def close(self) -> None:
+        """
+        Close every browser context and browser started by the pool
+        :return: None
+        """
+        async with self.o_lock:
+            if not self.dc_browsers:
+                return
+            for s_fetcher_name, o_queue_slots in self.dc_slots.items():
+                while not o_queue_slots.empty():
+                    await self._close_context(o_queue_slots.get_nowait())
+            await self.o_exit_stack.aclose()
+            o_logger.info(f"Fetcher pool closed ({', '.join(self.dc_browsers)})")
+            self.dc_engines.clear()
+            self.dc_browsers.clear()
+            self.dc_slots.clear()
+            self.o_exit_stack = AsyncExitStack()
+
+    async def _start(self, s_fetcher_name: str, dc_params: dict[str, Any]) -> None:
+        """
+        Start the browser of a fetcher and its contexts, only on the first call for this fetcher
+        :param s_fetcher_name: str - name of the fetcher in `FETCHERS`
+        :param dc_params: dict[str, Any] - parameters of the fetcher in `FETCHERS`
+        :return: None
+        """
+        if s_fetcher_name in self.dc_browsers or s_fetcher_name in self.set_stock_fetchers:
+            return
+        async with self.o_lock:
+            if s_fetcher_name in self.dc_browsers or s_fetcher_name in self.set_stock_fetchers:
+                return
+            l_missing_hooks = get_missing_private_hooks(s_fetcher_name)
+            if l_missing_hooks:
+                o_logger.warning(f"{', '.join(l_missing_hooks)} not found in this version of scrapling, "
+                                 f"{s_fetcher_name} falls back to a new browser per request")
+                self.set_stock_fetchers.add(s_fetcher_name)
+                return
+            if s_fetcher_name == "StealthyFetcher":
+                o_engine = CamoufoxEngine(**dc_params, adaptor_arguments=StealthyFetcher._generate_parser_arguments())
+                o_browser = await self.o_exit_stack.enter_async_context(
+                    AsyncCamoufox(**o_engine._get_camoufox_options()))
+            elif s_fetcher_name == "PlayWrightFetcher":
+                o_engine = PlaywrightEngine(**dc_params, adaptor_arguments=PlayWrightFetcher._generate_parser_arguments())
+                o_playwright = await self.o_exit_stack.enter_async_context(async_playwright())
+                dc_launch_kwargs = {'headless': o_engine.headless,
+                                    'channel': 'chrome' if o_engine.real_chrome else 'chromium'}
+                if o_engine.stealth:
+                    dc_launch_kwargs.update({'args': DEFAULT_STEALTH_FLAGS, 'chromium_sandbox': True})
+                o_browser = await o_playwright.chromium.launch(**dc_launch_kwargs)
+                self.o_exit_stack.push_async_callback(o_browser.close)
+            else:
+                raise ValueError(f"{s_fetcher_name} is not a browser fetcher")
+
+            self.dc_engines[s_fetcher_name] = o_engine
+            self.dc_browsers[s_fetcher_name] = o_browser
+            self.dc_slots[s_fetcher_name] = asyncio.Queue()
+            for _ in range(self.int_pool_size):
+                self.dc_slots[s_fetcher_name].put_nowait(await self._new_slot(s_fetcher_name))
+            o_logger.info(f"{s_fetcher_name} browser started with {self.int_pool_size} context(s)")
+
+    async def _new_slot(self, s_fetcher_name: str) -> ContextSlot:
+        """
+        Create a new browser context on the browser of a fetcher
+        :param s_fetcher_name: str - name of the fetcher in `FETCHERS`
+        :return: ContextSlot
+        """
+        o_engine = self.dc_engines[s_fetcher_name]
+        o_browser = self.dc_browsers[s_fetcher_name]
+        if isinstance(o_engine, PlaywrightEngine):
+            dc_context_kwargs = {
+                'proxy': o_engine.proxy,
+                'locale': o_engine.locale,
+                'color_scheme': 'dark',
+                'device_scale_factor': 2,
+                'extra_http_headers': o_engine.extra_headers or {},
+                'user_agent': o_engine.useragent or generate_headers(browser_mode=True).get('User-Agent'),
+            }
+            if o_engine.stealth:
+                dc_context_kwargs.update({
+                    'is_mobile': False,
+                    'has_touch': False,
+                    'service_workers': 'allow',
+                    'ignore_https_errors': True,
+                    'screen': {'width': 1920, 'height': 1080},
+                    'viewport': {'width': 1920, 'height': 1080},
+                    'permissions': ['geolocation', 'notifications'],
+                })
+            o_context = await o_browser.new_context(**dc_context_kwargs)
+            if o_engine.stealth:
+                for s_script in PLAYWRIGHT_STEALTH_SCRIPTS:
+                    await o_context.add_init_script(path=js_bypass_path(s_script))
+        else:
+            o_context = await o_browser.new_context()
+        return ContextSlot(s_fetcher_name, o_context)
+
+    async def _recycle(self, o_slot: ContextSlot) -> ContextSlot:
+        """
+        Replace a used or failed browser context by a fresh one
+        :param o_slot: ContextSlot
+        :return: ContextSlot - the new slot, or a slot without context if it can't be replaced, the context being
+        created again by its next lease
+        """
+        o_logger.info(f"Recycling {o_slot.s_fetcher_name} context after {o_slot.int_pages_served} page(s)"
+                      f"{' and a failure' if o_slot.bool_failed else ''}")
+        await self._close_context(o_slot)
+        try:
+            return await self._new_slot(o_slot.s_fetcher_name)
+        except Exception as o_exception:
+            o_logger.error(f"Failed to create a new {o_slot.s_fetcher_name} context: {o_exception}")
+            return ContextSlot(o_slot.s_fetcher_name, None)
+
+    @staticmethod
+    async def _close_context(o_slot: ContextSlot) -> None:
+        """
+        Close the browser context of a slot, ignoring errors of an already closed browser
+        :param o_slot: ContextSlot
+        :return: None
+        """
+        if o_slot.o_context is None:
+            return
+        try:
+            await o_slot.o_context.close()
+        except Exception as o_exception:
+            o_logger.warning(f"Failed to close {o_slot.s_fetcher_name} context: {o_exception}")
+
+    async def _fetch_with_slot(self, o_slot: ContextSlot, s_url: str) -> Response:
+        """
+        Open a page in the leased context, navigate to the URL and build a scrapling Response from it, the same way as
+        the `async_fetch` of the engine: the status is the one of the last navigation response (e.g. after a JavaScript
+        redirection), the headers are the ones of the first response
+        :param o_slot: ContextSlot
+        :param s_url: str - URL to fetch
+        :return: Response
+        """
+        o_engine = self.dc_engines[o_slot.s_fetcher_name]
+        o_final_response = None
+
+        async def _handle_response(o_finished_response) -> None:
+            nonlocal o_final_response
+            if (o_finished_response.request.resource_type == "document"
+                    and o_finished_response.request.is_navigation_request()):
+                o_final_response = o_finished_response
+
+        o_page = await o_slot.o_context.new_page()
+        try:
+            o_page.set_default_navigation_timeout(o_engine.timeout)
+            o_page.set_default_timeout(o_engine.timeout)
+            o_page.on("response", _handle_response)
+            if o_engine.disable_resources:
+                await o_page.route("**/*", async_intercept_route)
+            if o_engine.extra_headers:
+                await o_page.set_extra_http_headers(o_engine.extra_headers)
+
+            s_referer = generate_convincing_referer(s_url) if o_engine.google_search else None
+            o_first_response = await o_page.goto(s_url, referer=s_referer)
+            await o_page.wait_for_load_state(state="domcontentloaded")
+            if o_engine.network_idle:
+                await o_page.wait_for_load_state('networkidle')
+            if o_engine.page_action is not None:
+                try:
+                    o_page = await o_engine.page_action(o_page)
+                except Exception as o_exception:
+                    o_logger.error(f"Error executing the page action: {o_exception}")
+            if o_engine.wait_selector and isinstance(o_engine.wait_selector, str):
+                try:
+                    await o_page.locator(o_engine.wait_selector).first.wait_for(state=o_engine.wait_selector_state)
+                    # Wait again after the selector, helpful with protections like Cloudflare
+                    await o_page.wait_for_load_state(state="load")
+                    await o_page.wait_for_load_state(state="domcontentloaded")
+                    if o_engine.network_idle:
+                        await o_page.wait_for_load_state('networkidle')
+                except Exception as o_exception:
+                    o_logger.error(f"Error waiting for selector {o_engine.wait_selector}: {o_exception}")
+            await o_page.wait_for_timeout(o_engine.wait)
+
+            o_final_response = o_final_response or o_first_response
+            if not o_final_response:
+                raise ValueError("Failed to get a response from the page")
+            s_page_content = await o_page.content()
+            return Response(
+                url=o_page.url,
+                text=s_page_content,
+                body=s_page_content.encode('utf-8'),
+                status=o_final_response.status,
+                reason=o_final_response.status_text or StatusText.get(o_final_response.status),
+                encoding=o_final_response.headers.get('content-type', '') or 'utf-8',
+                cookies={dc_cookie['name']: dc_cookie['value'] for dc_cookie in await o_slot.o_context.cookies()},
+                headers=await o_first_response.all_headers(),
+                request_headers=await o_first_response.request.all_headers(),
+                history=await o_engine._async_process_response_history(o_first_response),
+                **o_engine.adaptor_arguments
+            )
+        finally:
+            await o_page.close()
+
+
+def get_missing_private_hooks(s_fetcher_name: str) -> list[str]:
+    """
+    Get the private hooks of scrapling used by the pool for a fetcher that are missing in the installed version
+    :param s_fetcher_name: str - name of the fetcher in `FETCHERS`
+    :return: list[str] - e.g. ["CamoufoxEngine._get_camoufox_options"], empty if the pool can be used
+    """
+    return [f"{o_class.__name__}.{s_attribute}" for o_class, s_attribute in DC_PRIVATE_HOOKS[s_fetcher_name]
+            if not callable(getattr(o_class, s_attribute, None))]
+
+
+FETCHER_POOL = FetcherPool()
@@ -0,0 +1,148 @@
+import json
+import os
+import random
+from collections import deque
+from dataclasses import dataclass, field
+from urllib.parse import urlparse
+
+from utilities.logging_utils import LoggerManager
+
+o_logger = LoggerManager.get_logger(__name__)
+
+
+def get_url_kind(s_url: str) -> str:
+    """
+    Get the kind of Yelp page an URL points to, used to keep separate statistics per kind of page
+    :param s_url: str
+    :return: str - "search", "biz", "biz_photos" or "other"
+    """
+    s_path = urlparse(s_url).path
+    if s_path.startswith("/biz_photos/"):
+        return "biz_photos"
+    if s_path.startswith("/biz/"):
+        return "biz"
+    if s_path.startswith("/search"):
+        return "search"
+    return "other"
+
+
+@dataclass
+class FetcherStats:
+    """
+    FetcherStats class to store the outcomes and latencies of a fetcher for a kind of URL
+    """
+    int_attempts: int = 0
+    int_successes: int = 0
+    f_total_latency: float = 0.0
+    dq_recent_outcomes: deque[bool] = field(default_factory=lambda: deque(maxlen=20))
+
+    @property
+    def f_success_rate(self) -> float:
+        return self.int_successes / self.int_attempts if self.int_attempts else 0.0
+
+    @property
+    def f_recent_success_rate(self) -> float:
+        return sum(self.dq_recent_outcomes) / len(self.dq_recent_outcomes) if self.dq_recent_outcomes else 0.0
+
+    @property
+    def f_mean_latency(self) -> float:
+        return self.f_total_latency / self.int_attempts if self.int_attempts else 0.0
+
+    def to_dict(self) -> dict[str, float | int]:
+        return {
+            "attempts": self.int_attempts,
+            "successes": self.int_successes,
+            "success_rate": round(self.f_success_rate, 3),
+            "recent_success_rate": round(self.f_recent_success_rate, 3),
+            "mean_latency_s": round(self.f_mean_latency, 3),
+        }
+
+
+@dataclass
+class FetcherSelector:
+    """
+    FetcherSelector class to choose in which order the fetchers are tried for an URL.
+    The cheapest fetcher that has been working lately for this kind of URL is tried first, the other ones are only
+    used to escalate on failure. Fetchers failing lately are tried last, except for a few exploration requests that
+    keep the cost order so that a recovered fetcher can be promoted again.
+    """
+    l_fetchers_by_cost: list[str]
+    int_min_recent_samples: int = 3
+    f_min_recent_success_rate: float = 0.5
+    f_exploration_rate: float = 0.1
+    dc_stats: dict[tuple[str, str], FetcherStats] = field(default_factory=dict, init=False)
+
+    def order_fetchers(self, s_url: str) -> list[str]:
+        """
+        Get the fetchers to try for an URL, in the order they should be tried
+        :param s_url: str
+        :return: list[str]
+        """
+        if random.random() < self.f_exploration_rate:
+            return list(self.l_fetchers_by_cost)
+        return self._order_working_first(get_url_kind(s_url))
+
+    def get_selected_fetcher(self, s_url: str) -> str:
+        """
+        Get the fetcher chosen for an URL outside of the exploration requests: the cheapest one working lately, the
+        other fetchers are only tried to escalate or to explore
+        :param s_url: str
+        :return: str
+        """
+        return self._order_working_first(get_url_kind(s_url))[0]
+
+    def record(self, s_url: str, s_fetcher_name: str, bool_success: bool, f_latency: float) -> None:
+        """
+        Record the outcome of an attempt
+        :param s_url: str
+        :param s_fetcher_name: str
+        :param bool_success: bool
+        :param f_latency: float - duration of the attempt in seconds
+        :return: None
+        """
+        o_stats = self.dc_stats.setdefault((get_url_kind(s_url), s_fetcher_name), FetcherStats())
+        o_stats.int_attempts += 1
+        o_stats.int_successes += int(bool_success)
+        o_stats.f_total_latency += f_latency
+        o_stats.dq_recent_outcomes.append(bool_success)
+
+    def dump_stats(self, s_output_path: str) -> None:
+        """
+        Log the statistics per kind of URL and fetcher and save them to a JSON file
+        :param s_output_path: str
+        :return: None
+        """
+        if not self.dc_stats:
+            return
+        dc_dump: dict[str, dict[str, dict]] = {}
+        for (s_url_kind, s_fetcher_name), o_stats in sorted(self.dc_stats.items()):
+            dc_dump.setdefault(s_url_kind, {})[s_fetcher_name] = o_stats.to_dict()
+            o_logger.info(f"[{s_url_kind}] {s_fetcher_name}: {o_stats.int_successes}/{o_stats.int_attempts} "
+                          f"successful, mean latency {o_stats.f_mean_latency:.2f}s")
+        os.makedirs(os.path.dirname(s_output_path) or ".", exist_ok=True)
+        with open(s_output_path, "w") as o_file:
+            json.dump(dc_dump, o_file, indent=2)
+        o_logger.info(f"Fetcher statistics saved to {s_output_path}")
+
+    def _order_working_first(self, s_url_kind: str) -> list[str]:
+        """
+        Get the fetchers working lately for a kind of URL by cost, then the failing ones by cost
+        :param s_url_kind: str
+        :return: list[str]
+        """
+        l_working = [s_name for s_name in self.l_fetchers_by_cost if self._is_working(s_url_kind, s_name)]
+        l_failing = [s_name for s_name in self.l_fetchers_by_cost if s_name not in l_working]
+        return l_working + l_failing
+
+    def _is_working(self, s_url_kind: str, s_fetcher_name: str) -> bool:
+        """
+        Check if a fetcher has been working lately for a kind of URL, a fetcher without enough samples is considered
+        as working so that it gets tried
+        :param s_url_kind: str
+        :param s_fetcher_name: str
+        :return: bool
+        """
+        o_stats = self.dc_stats.get((s_url_kind, s_fetcher_name))
+        if o_stats is None or len(o_stats.dq_recent_outcomes) < self.int_min_recent_samples:
+            return True
+        return o_stats.f_recent_success_rate >= self.f_min_recent_success_rate
@@ -1,13 +1,17 @@
 import argparse
-import json
+import itertools
 import logging
 import os
 import traceback
 from datetime import date
-
-from scrapling.engines.toolbelt import Response
+from typing import TYPE_CHECKING
 
 from utilities.config_loader import ConfigLoader
+from utilities.json_utils import decode_embedded_json
+from utilities.metrics import METRICS
+
+if TYPE_CHECKING:  # scrapling's engines load the browser automation libraries
+    from scrapling.engines.toolbelt import Response
 
 o_logger = logging.getLogger(__name__)
 
@@ -16,30 +20,135 @@ def parse_arguments():
     obj_argparse = argparse.ArgumentParser(description='Yelp scraper')
     obj_argparse.add_argument('--no-database', action='store_true', help='Do not use the database')
     obj_argparse.add_argument('--no-csv', action='store_true', help='Do not save data to csv')
+    obj_argparse.add_argument('--parquet', action='store_true',
+                              help='Also save the data to a partitioned Parquet dataset, with native list columns')
+    obj_argparse.add_argument('--parquet-dir', default='outputs/parquet',
+                              help='Directory of the Parquet dataset (default: outputs/parquet)')
+    obj_argparse.add_argument('--parquet-row-group-size', type=int, default=10_000,
+                              help='Maximum number of rows per row group of the Parquet files, a row group is also '
+                                   'written after --flush-interval seconds (default: 10000)')
+    obj_argparse.add_argument('--dedup-in-memory', action='store_true',
+                              help='Load every url of the table to skip the businesses already in the database, '
+                                   'instead of an anti-join done by the database')
+    obj_argparse.add_argument('--refresh', action='store_true',
+                              help='Crawl again the businesses of the database whose search page elements changed or '
+                                   'that are older than --refresh-after days, besides the new ones')
+    obj_argparse.add_argument('--refresh-after', type=float, default=7.0,
+                              help='Number of days after which a business is crawled again by --refresh (default: 7)')
+    obj_argparse.add_argument('--batch-size', type=int, default=20,
+                              help='Number of rows written at once to the CSV file and the database (default: 20)')
+    obj_argparse.add_argument('--flush-interval', type=float, default=60.0,
+                              help='Maximum number of seconds rows wait before being written, even if the batch is not '
+                                   'full (default: 60)')
+    obj_argparse.add_argument('--parallel-jobs', type=int, default=2,
+                              help='Number of searches of a batch job crawled at the same time (default: 2)')
+    obj_argparse.add_argument('--resume', action='store_true',
+                              help='Save the progress of the searches in a crawl frontier and resume the interrupted '
+                                   'ones from it, without crawling again the search pages and the links already done')
+    obj_argparse.add_argument('--frontier-path', default='outputs/frontier.db',
+                              help='SQLite file of the crawl frontier (default: outputs/frontier.db)')
+    obj_argparse.add_argument('--queue-role', choices=['producer', 'worker'], default=None,
+                              help='Crawl through a work queue: the producer enqueues the business links of the '
+                                   'searches, the workers (possibly on other hosts) process them')
+    obj_argparse.add_argument('--queue-url', default='sqlite:///outputs/queue.db',
+                              help='Work queue: a SQLAlchemy URL, or "database" for a table of the database of '
+                                   'setup_database.json shared by several hosts (default: sqlite:///outputs/queue.db)')
+    obj_argparse.add_argument('--worker-id', default=None,
+                              help='Id of the queue worker (default: <hostname>-<pid>)')
+    obj_argparse.add_argument('--lease-timeout', type=float, default=600.0,
+                              help='Seconds after which a link leased by a worker is considered abandoned and leased '
+                                   'again (default: 600)')
+    obj_argparse.add_argument('--max-attempts', type=int, default=3,
+                              help='Number of attempts of a link of the work queue before it is failed (default: 3)')
+    obj_argparse.add_argument('--metrics-file', default=None,
+                              help='Prometheus text file the metrics of the run are written to every '
+                                   '--metrics-interval seconds, e.g. for the textfile collector of node_exporter')
+    obj_argparse.add_argument('--metrics-interval', type=float, default=15.0,
+                              help='Number of seconds between two writes of the metrics file (default: 15)')
+    obj_argparse.add_argument('--concurrency', type=int, default=1,
+                              help='Number of business pages crawled concurrently (default: 1)')
+    obj_argparse.add_argument('--max-requests', type=int, default=None,
+                              help='Global limit of requests in flight, shared by the search, business and photo '
+                                   'gallery pages (default: the concurrency, at least 4)')
+    obj_argparse.add_argument('--max-images', type=int, default=None,
+                              help='Maximum number of images extracted per business (default: all of them)')
+    obj_argparse.add_argument('--pool-size', type=int, default=None,
+                              help='Number of browser contexts kept open per browser fetcher (default: concurrency)')
+    obj_argparse.add_argument('--max-pages-per-context', type=int, default=50,
+                              help='Number of pages served by a browser context before it is recycled (default: 50)')
+    obj_argparse.add_argument('--rate-limit', type=float, default=1.0,
+                              help='Initial number of requests per second per host (default: 1.0)')
+    obj_argparse.add_argument('--burst', type=float, default=3.0,
+                              help='Number of requests per host that can be sent at once after an idle time (default: 3)')
+    obj_argparse.add_argument('--max-rate-limit', type=float, default=5.0,
+                              help='Maximum number of requests per second per host (default: 5.0)')
+    obj_argparse.add_argument('--no-cache', action='store_true', help='Do not read nor write the on-disk response cache')
+    obj_argparse.add_argument('--replay', action='store_true',
+                              help='Serve every page from the response cache only, without any network request')
+    obj_argparse.add_argument('--cache-dir', default='cache', help='Directory of the response cache (default: cache)')
+    obj_argparse.add_argument('--cache-max-size', type=int, default=1024,
+                              help='Maximum size of the response cache in MB (default: 1024)')
     obj_parser = obj_argparse.parse_args()
     if obj_parser.no_database:
         o_logger.info('The <no-database> flag is set.')
     if obj_parser.no_csv:
         o_logger.info('The <no-csv> flag is set.')
+    if obj_parser.refresh:
+        o_logger.info('The <refresh> flag is set.')
+    if obj_parser.resume:
+        o_logger.info('The <resume> flag is set.')
+    if obj_parser.replay:
+        o_logger.info('The <replay> flag is set.')
+    elif obj_parser.no_cache:
+        o_logger.info('The <no-cache> flag is set.')
+    if obj_parser.concurrency > 1:
+        o_logger.info(f'The <concurrency> flag is set to {obj_parser.concurrency}.')
     return obj_parser
 
 
-def extract_json_data_from_html(response: Response, s_css_class: str) -> dict | None:
+def extract_json_data_from_html(response: 'Response', s_css_class: str, script_list: list | None = None) -> dict | None:
     """
     Extract JSON data from the HTML
     :param response: Response
     :param s_css_class: str
-    :return: dict | None
+    :param script_list: list | None - JSON script tags already collected from the response, searched if None
+    :return: dict | None - IndexedJson with its keys indexed by typename
     """
-    script_list = response.find_all("script", {"type": "application/json"})
+    if script_list is None:
+        with METRICS.time_stage("dom_parsing"):
+            script_list = response.find_all("script", {"type": "application/json"})
     json_data = {}
     for script in script_list:
-        if script.html_content.find(f'{s_css_class}') != -1:
-            json_data = json.loads(script.text.replace("<!--", "").replace("-->", "").replace("&quot;", '"').strip())
+        # Only the attributes are searched, serializing the whole script tag would copy its (large) JSON content
+        s_script_attributes = " ".join(f'{s_name}="{s_value}"' for s_name, s_value in script.attrib.items())
+        if s_script_attributes.find(f'{s_css_class}') != -1:
+            json_data = decode_embedded_json(script.text)
             break
     return json_data
 
 
+def get_search_jobs(dc_yelp_config: dict) -> list[dict[str, str]]:
+    """
+    Get the search parameters of each job of the run. The jobs are the `jobs` list of the configuration if it is set,
+    completed with the `params` shared by all of them, otherwise the cross product of the `params` values, a value
+    being either a string or a list of strings (e.g. several `find_desc` and `find_loc`)
+    :param dc_yelp_config: dict - `Yelp` section of the yelp_config.json file
+    :return: list[dict[str, str]]
+    """
+    dc_params = dc_yelp_config["params"]
+    if dc_yelp_config.get("jobs"):
+        dc_shared_params = {s_key: s_value for s_key, s_value in dc_params.items() if not isinstance(s_value, list)}
+        l_jobs = [{**dc_shared_params, **dc_job} for dc_job in dc_yelp_config["jobs"]]
+    else:
+        l_values = [s_value if isinstance(s_value, list) else [s_value] for s_value in dc_params.values()]
+        l_jobs = [dict(zip(dc_params.keys(), t_values)) for t_values in itertools.product(*l_values)]
+    # The same search twice would write twice to the same table and file
+    dc_jobs = {}
+    for dc_job in l_jobs:
+        dc_jobs.setdefault(tuple(sorted((s_key, str(s_value).lower()) for s_key, s_value in dc_job.items())), dc_job)
+    return list(dc_jobs.values())
+
+
 def bind_database_engine_type(dc_setup_database: dict) -> str | None:
     """
     Bind the database engine type to the SQLAlchemy engine
@@ -50,6 +159,8 @@ def bind_database_engine_type(dc_setup_database: dict) -> str | None:
         return 'mysql+pymysql'
     elif dc_setup_database['engine'] == 'postgresql':
         return 'postgresql+psycopg2'
+    elif dc_setup_database['engine'] == 'sqlite':
+        return 'sqlite'
 
 
 def get_database_credentials(s_path) -> dict:
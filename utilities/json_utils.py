@@ -0,0 +1,74 @@
+import json
+from typing import Any
+
+from utilities.metrics import METRICS
+
+try:  # Optional faster decoder, the standard library is used when it is not installed
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def loads_json(s_json: str) -> Any:
+    """
+    Decode a JSON string with orjson if it is installed, with the json module otherwise or if orjson rejects it
+    (e.g. NaN values or integers above 64 bits)
+    :param s_json: str
+    :return: Any
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(s_json)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(s_json)
+
+
+@METRICS.time_stage("json_decoding")
+def decode_embedded_json(s_script_text: str) -> Any:
+    """
+    Decode the JSON embedded in a script tag of a Yelp page, wrapped in an HTML comment and with HTML-escaped quotes,
+    stripping the comment markers at the ends instead of searching the whole text for them
+    :param s_script_text: str
+    :return: Any - IndexedJson if the JSON is an object
+    """
+    s_json = str(s_script_text).strip()  # plain str, scrapling's TextHandler is slower and rejected by orjson
+    if s_json.startswith("<!--"):
+        s_json = s_json[4:]
+    if s_json.endswith("-->"):
+        s_json = s_json[:-3]
+    if "&quot;" in s_json:
+        s_json = s_json.replace("&quot;", '"')
+    o_data = loads_json(s_json.strip())
+    return IndexedJson(o_data) if isinstance(o_data, dict) else o_data
+
+
+class IndexedJson(dict):
+    """
+    IndexedJson class to hold decoded JSON data with an index of its keys by typename, built once at decoding.
+    Apollo state keys are of the form `Typename:id` (e.g. `Business:abc`, `BusinessPhoto:xyz`).
+    """
+
+    def __init__(self, dc_data: dict | None = None):
+        super().__init__(dc_data or {})
+        self.dc_keys_by_typename: dict[str, list[str]] = {}
+        for s_key in self.keys():
+            s_typename, s_separator, _ = s_key.partition(':')
+            if s_separator:
+                self.dc_keys_by_typename.setdefault(s_typename, []).append(s_key)
+
+    def has_typename(self, s_typename: str) -> bool:
+        """
+        Check if at least one key of the data has this typename
+        :param s_typename: str
+        :return: bool
+        """
+        return s_typename in self.dc_keys_by_typename
+
+    def get_keys_by_typename(self, s_typename: str) -> list[str]:
+        """
+        Get the keys of the data with this typename
+        :param s_typename: str
+        :return: list[str]
+        """
+        return self.dc_keys_by_typename.get(s_typename, [])
@@ -0,0 +1,236 @@
+import asyncio
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Iterator
+
+from utilities.logging_utils import LoggerManager
+
+o_logger = LoggerManager.get_logger(__name__)
+
+# Upper bounds in seconds of the buckets of the latency histograms, the last bucket has no upper bound
+T_LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                     10.0, 30.0, 60.0)
+S_METRIC_PREFIX = "yelp_scraper_"
+
+
+@dataclass
+class Histogram:
+    """
+    Histogram class to count observations in fixed buckets, like a Prometheus histogram, so that a long run keeps a
+    constant memory whatever its number of observations
+    """
+    t_bounds: tuple[float, ...] = T_LATENCY_BUCKETS
+    l_bucket_counts: list[int] = field(init=False)
+    int_count: int = 0
+    f_sum: float = 0.0
+    f_max: float = 0.0
+
+    def __post_init__(self) -> None:
+        self.l_bucket_counts = [0] * (len(self.t_bounds) + 1)
+
+    def observe(self, f_value: float) -> None:
+        self.l_bucket_counts[bisect.bisect_left(self.t_bounds, f_value)] += 1
+        self.int_count += 1
+        self.f_sum += f_value
+        self.f_max = max(self.f_max, f_value)
+
+    def get_quantile(self, f_quantile: float) -> float:
+        """
+        Estimate a quantile by linear interpolation within the bucket it falls in
+        :param f_quantile: float - between 0 and 1
+        :return: float
+        """
+        if not self.int_count:
+            return 0.0
+        f_rank = f_quantile * self.int_count
+        int_cumulative_count = 0
+        for int_index, int_bucket_count in enumerate(self.l_bucket_counts):
+            if int_bucket_count and int_cumulative_count + int_bucket_count >= f_rank:
+                if int_index == len(self.t_bounds):
+                    return self.f_max
+                f_lower = self.t_bounds[int_index - 1] if int_index else 0.0
+                f_upper = min(self.t_bounds[int_index], self.f_max)
+                return f_lower + (f_upper - f_lower) * (f_rank - int_cumulative_count) / int_bucket_count
+            int_cumulative_count += int_bucket_count
+        return self.f_max
+
+    def to_dict(self) -> dict[str, float | int]:
+        return {
+            "count": self.int_count,
+            "sum_s": round(self.f_sum, 6),
+            "mean_s": round(self.f_sum / self.int_count, 6) if self.int_count else 0.0,
+            "p50_s": round(self.get_quantile(0.5), 6),
+            "p95_s": round(self.get_quantile(0.95), 6),
+            "max_s": round(self.f_max, 6),
+        }
+
+
+@dataclass
+class MetricsRegistry:
+    """
+    MetricsRegistry class to collect the counters and latency histograms of the run, identified by a name and labels
+    (e.g. the stage, the fetcher, the kind of URL). The metrics can be updated from any thread, the database writer
+    thread included, and are exported as a JSON run summary and as a Prometheus text file.
+    """
+    dc_counters: dict[tuple[str, tuple[tuple[str, str], ...]], float] = field(default_factory=dict)
+    dc_histograms: dict[tuple[str, tuple[tuple[str, str], ...]], Histogram] = field(default_factory=dict)
+    f_started_at: float = field(default_factory=time.time)
+    o_lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def increment(self, s_name: str, f_value: float = 1.0, **dc_labels: str) -> None:
+        """
+        Add a value to a counter
+        :param s_name: str - name of the counter, e.g. rows_written_total
+        :param f_value: float
+        :param dc_labels: str - labels of the counter, e.g. sink="csv"
+        :return: None
+        """
+        t_key = (s_name, tuple(sorted(dc_labels.items())))
+        with self.o_lock:
+            self.dc_counters[t_key] = self.dc_counters.get(t_key, 0.0) + f_value
+
+    def observe(self, s_name: str, f_value: float, **dc_labels: str) -> None:
+        """
+        Add an observation to a histogram
+        :param s_name: str - name of the histogram, e.g. fetch_duration_seconds
+        :param f_value: float - duration in seconds
+        :param dc_labels: str - labels of the histogram, e.g. fetcher="AsyncFetcher"
+        :return: None
+        """
+        t_key = (s_name, tuple(sorted(dc_labels.items())))
+        with self.o_lock:
+            o_histogram = self.dc_histograms.get(t_key)
+            if o_histogram is None:
+                o_histogram = self.dc_histograms[t_key] = Histogram()
+            o_histogram.observe(f_value)
+
+    @contextmanager
+    def time_stage(self, s_stage: str) -> Iterator[None]:
+        """
+        Time a stage of the processing (e.g. dom_parsing, post_processing) in the stage_duration_seconds histogram
+        :param s_stage: str
+        :return: Iterator[None]
+        """
+        f_start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("stage_duration_seconds", time.perf_counter() - f_start_time, stage=s_stage)
+
+    def get_summary(self) -> dict:
+        """
+        Get the summary of the run: its duration, the counters and the statistics of the histograms, per name then
+        per labels
+        :return: dict
+        """
+        f_now = time.time()
+        dc_summary = {
+            "started_at": datetime.fromtimestamp(self.f_started_at).isoformat(timespec="seconds"),
+            "ended_at": datetime.fromtimestamp(f_now).isoformat(timespec="seconds"),
+            "duration_s": round(f_now - self.f_started_at, 3),
+            "counters": {},
+            "histograms": {},
+        }
+        with self.o_lock:
+            for (s_name, t_labels), f_value in sorted(self.dc_counters.items()):
+                dc_summary["counters"].setdefault(s_name, []).append({**dict(t_labels), "value": f_value})
+            for (s_name, t_labels), o_histogram in sorted(self.dc_histograms.items()):
+                dc_summary["histograms"].setdefault(s_name, []).append({**dict(t_labels), **o_histogram.to_dict()})
+        return dc_summary
+
+    def dump_summary(self, s_output_path: str) -> None:
+        """
+        Log the time spent per stage and save the summary of the run to a JSON file
+        :param s_output_path: str
+        :return: None
+        """
+        dc_summary = self.get_summary()
+        for dc_stage in dc_summary["histograms"].get("stage_duration_seconds", []):
+            o_logger.info(f"[{dc_stage['stage']}] {dc_stage['count']} time(s), {dc_stage['sum_s']:.2f}s in total, "
+                          f"p95 {dc_stage['p95_s'] * 1000:.1f}ms")
+        os.makedirs(os.path.dirname(s_output_path) or ".", exist_ok=True)
+        with open(s_output_path, "w") as o_file:
+            json.dump(dc_summary, o_file, indent=2)
+        o_logger.info(f"Run summary saved to {s_output_path}")
+
+    def to_prometheus(self) -> str:
+        """
+        Get the metrics in the Prometheus text exposition format
+        :return: str
+        """
+        l_lines = []
+        with self.o_lock:
+            s_previous_name = None
+            for (s_name, t_labels), f_value in sorted(self.dc_counters.items()):
+                if s_name != s_previous_name:
+                    l_lines.append(f"# TYPE {S_METRIC_PREFIX}{s_name} counter")
+                    s_previous_name = s_name
+                l_lines.append(f"{S_METRIC_PREFIX}{s_name}{format_labels(t_labels)} {f_value:.15g}")
+            for (s_name, t_labels), o_histogram in sorted(self.dc_histograms.items()):
+                if s_name != s_previous_name:
+                    l_lines.append(f"# TYPE {S_METRIC_PREFIX}{s_name} histogram")
+                    s_previous_name = s_name
+                int_cumulative_count = 0
+                for f_bound, int_bucket_count in zip((*o_histogram.t_bounds, "+Inf"), o_histogram.l_bucket_counts):
+                    int_cumulative_count += int_bucket_count
+                    l_lines.append(f"{S_METRIC_PREFIX}{s_name}_bucket{format_labels((*t_labels, ('le', str(f_bound))))} "
+                                   f"{int_cumulative_count}")
+                l_lines.append(f"{S_METRIC_PREFIX}{s_name}_sum{format_labels(t_labels)} {o_histogram.f_sum:.15g}")
+                l_lines.append(f"{S_METRIC_PREFIX}{s_name}_count{format_labels(t_labels)} {o_histogram.int_count}")
+        return "\n".join(l_lines) + "\n"
+
+    def write_prometheus(self, s_output_path: str) -> None:
+        """
+        Write the metrics to a Prometheus text file, replaced at once so that a scraper never reads a partial file
+        :param s_output_path: str
+        :return: None
+        """
+        os.makedirs(os.path.dirname(s_output_path) or ".", exist_ok=True)
+        s_temporary_path = f"{s_output_path}.tmp"
+        with open(s_temporary_path, "w") as o_file:
+            o_file.write(self.to_prometheus())
+        os.replace(s_temporary_path, s_output_path)
+
+    async def write_prometheus_periodically(self, s_output_path: str, f_interval: float) -> None:
+        """
+        Write the Prometheus text file every `f_interval` seconds until cancelled
+        :param s_output_path: str
+        :param f_interval: float
+        :return: None
+        """
+        while True:
+            await asyncio.sleep(f_interval)
+            try:
+                await asyncio.to_thread(self.write_prometheus, s_output_path)
+            except OSError as o_exception:
+                o_logger.warning(f"Failed to write the metrics to {s_output_path}: {o_exception}")
+
+
+def format_labels(t_labels: tuple[tuple[str, str], ...]) -> str:
+    """
+    Format labels for the Prometheus text format, e.g. {fetcher="AsyncFetcher",url_kind="biz"}
+    :param t_labels: tuple[tuple[str, str], ...]
+    :return: str - empty without labels
+    """
+    if not t_labels:
+        return ""
+    s_labels = ",".join(f'{s_key}="{escape_label_value(str(s_value))}"' for s_key, s_value in t_labels)
+    return f"{{{s_labels}}}"
+
+
+def escape_label_value(s_value: str) -> str:
+    """
+    Escape the backslashes, double quotes and line feeds of a label value for the Prometheus text format
+    :param s_value: str
+    :return: str
+    """
+    return s_value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+METRICS = MetricsRegistry()
@@ -0,0 +1,145 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from urllib.parse import urlparse
+
+from utilities.logging_utils import LoggerManager
+
+o_logger = LoggerManager.get_logger(__name__)
+
+# Status codes meaning that the website wants us to slow down or has blocked the request
+THROTTLING_STATUSES = {403, 429, 503}
+
+
+@dataclass
+class TokenBucket:
+    """
+    TokenBucket class to let requests through at `f_rate` requests per second on average, with bursts of up to
+    `f_burst` requests. The rate is adapted AIMD style: it increases by `f_additive_increase` after each successful
+    request and is multiplied by `f_multiplicative_decrease` when the website throttles us.
+    """
+    f_rate: float
+    f_burst: float
+    f_min_rate: float
+    f_max_rate: float
+    f_additive_increase: float = 0.05
+    f_multiplicative_decrease: float = 0.5
+    f_decrease_cooldown: float = 5.0
+    f_tokens: float = field(init=False)
+    f_last_refill: float = field(default_factory=time.monotonic, init=False)
+    f_last_decrease: float = field(default=0.0, init=False)
+    o_lock: asyncio.Lock = field(default_factory=asyncio.Lock, init=False)
+
+    def __post_init__(self) -> None:
+        self.f_tokens = self.f_burst
+
+    async def acquire(self) -> float:
+        """
+        Wait until a token is available and consume it, waiting requests are served in arrival order
+        :return: float - time waited in seconds
+        """
+        f_start_time = time.monotonic()
+        async with self.o_lock:
+            while True:
+                self._refill()
+                if self.f_tokens >= 1:
+                    self.f_tokens -= 1
+                    return time.monotonic() - f_start_time
+                await asyncio.sleep((1 - self.f_tokens) / self.f_rate)
+
+    def on_success(self) -> None:
+        """
+        Additive increase of the rate after a successful request
+        :return: None
+        """
+        self.f_rate = min(self.f_max_rate, self.f_rate + self.f_additive_increase)
+
+    def on_throttled(self) -> None:
+        """
+        Multiplicative decrease of the rate when the website throttles us, at most once per cooldown period so that
+        concurrent requests failing together only count once
+        :return: None
+        """
+        f_now = time.monotonic()
+        if f_now - self.f_last_decrease < self.f_decrease_cooldown:
+            return
+        self._refill()
+        self.f_rate = max(self.f_min_rate, self.f_rate * self.f_multiplicative_decrease)
+        self.f_tokens = min(self.f_tokens, 0.0)
+        self.f_last_decrease = f_now
+
+    def _refill(self) -> None:
+        f_now = time.monotonic()
+        self.f_tokens = min(self.f_burst, self.f_tokens + (f_now - self.f_last_refill) * self.f_rate)
+        self.f_last_refill = f_now
+
+
+@dataclass
+class HostRateLimiter:
+    """
+    HostRateLimiter class to share one token bucket per host between all the requests of the run
+    """
+    f_rate: float = 1.0
+    f_burst: float = 3.0
+    f_min_rate: float = 0.1
+    f_max_rate: float = 5.0
+    dc_buckets: dict[str, TokenBucket] = field(default_factory=dict, init=False)
+
+    def configure(self, f_rate: float, f_burst: float, f_max_rate: float) -> None:
+        """
+        Configure the limiter before its first use
+        :param f_rate: float - initial number of requests per second per host
+        :param f_burst: float - number of requests that can be sent at once after an idle period
+        :param f_max_rate: float - maximum number of requests per second per host
+        :return: None
+        """
+        self.f_rate = f_rate
+        self.f_burst = max(1.0, f_burst)
+        self.f_max_rate = max(f_rate, f_max_rate)
+        self.f_min_rate = min(self.f_min_rate, f_rate)
+
+    async def acquire(self, s_url: str) -> float:
+        """
+        Wait until the host of the URL can be requested
+        :param s_url: str
+        :return: float - time waited in seconds
+        """
+        return await self._get_bucket(s_url).acquire()
+
+    def on_response(self, s_url: str, int_status: int | None, bool_throttle: bool = True) -> None:
+        """
+        Adapt the rate of the host of the URL to the status of its response. A request that failed without a response
+        (timeout, connection error) slows the host down too, a blocked request often ends that way
+        :param s_url: str
+        :param int_status: int | None - None if the request failed without a response
+        :param bool_throttle: bool - whether a failure slows the host down, False for the requests of a fetcher that
+        is only tried to explore or to escalate, since its failures don't mean the chosen fetcher is throttled
+        :return: None
+        """
+        if int_status in THROTTLING_STATUSES or int_status is None:
+            if bool_throttle:
+                self.on_blocked(s_url, f"status {int_status}")
+        elif int_status == 200:
+            self._get_bucket(s_url).on_success()
+
+    def on_blocked(self, s_url: str, s_reason: str) -> None:
+        """
+        Slow the host of the URL down after a throttled or blocked request, e.g. a bot check page served with a 200
+        status that the extractors could not parse
+        :param s_url: str
+        :param s_reason: str - for logging
+        :return: None
+        """
+        o_bucket = self._get_bucket(s_url)
+        o_bucket.on_throttled()
+        o_logger.warning(f"Throttled ({s_reason}) by {urlparse(s_url).netloc}, "
+                         f"rate lowered to {o_bucket.f_rate:.2f} request(s)/s")
+
+    def _get_bucket(self, s_url: str) -> TokenBucket:
+        s_host = urlparse(s_url).netloc
+        if s_host not in self.dc_buckets:
+            self.dc_buckets[s_host] = TokenBucket(self.f_rate, self.f_burst, self.f_min_rate, self.f_max_rate)
+        return self.dc_buckets[s_host]
+
+
+RATE_LIMITER = HostRateLimiter()
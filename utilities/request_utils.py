@@ -1,11 +1,17 @@
 import asyncio
 import random
+import time
 import warnings
 
 import scrapling
 from scrapling import StealthyFetcher, PlayWrightFetcher, AsyncFetcher
 
+from utilities.fetcher_pool import FETCHER_POOL
+from utilities.fetcher_selector import FetcherSelector, get_url_kind
 from utilities.logging_utils import LoggerManager
+from utilities.metrics import METRICS
+from utilities.rate_limiter import RATE_LIMITER
+from utilities.response_cache import RESPONSE_CACHE
 
 o_logger = LoggerManager.get_logger(__name__)
 
@@ -31,48 +37,158 @@ FETCHERS = {
                      })
 }
 
+# Fetchers from the cheapest to the heaviest, the selector escalates in this order
+FETCHER_SELECTOR = FetcherSelector(l_fetchers_by_cost=["AsyncFetcher", "PlayWrightFetcher", "StealthyFetcher"])
 
-async def make_request_with_retries(s_url: str, max_retries: int = 3) -> scrapling.Adaptor | None:
+# Maximum number of seconds waited between two rounds of retries of an URL
+F_MAX_RETRY_BACKOFF = 20.0
+
+# Default global limit of requests in flight, so that the search and gallery pages fetched concurrently are not
+# serialized by a single business worker
+INT_DEFAULT_MAX_REQUESTS = 4
+
+# Global limit of requests in flight, shared by business pages, search pages and gallery pages
+o_request_semaphore = asyncio.Semaphore(INT_DEFAULT_MAX_REQUESTS)
+
+
+def set_max_concurrent_requests(int_max_concurrent_requests: int) -> None:
+    """
+    Set the global limit of requests in flight, must be called before the first request
+    :param int_max_concurrent_requests: int
+    :return: None
+    """
+    global o_request_semaphore
+    o_request_semaphore = asyncio.Semaphore(max(1, int_max_concurrent_requests))
+
+
+async def make_request_with_retries(s_url: str, max_retries: int = 3, bool_bypass_cache: bool = False,
+                                    bool_cache_response: bool = True) -> scrapling.Adaptor | None:
     """
     Attempt a request using multiple fetchers with retries in case of failure.
+    Fetchers are tried in the order given by `FETCHER_SELECTOR` for this kind of URL, and every attempt waits for the
+    host-scoped `RATE_LIMITER` instead of sleeping a fixed random delay. Between two rounds of retries, the URL also
+    waits an exponential backoff, since a failure without a throttling status doesn't always slow the host down.
+    Responses are served from and saved to the on-disk `RESPONSE_CACHE`, in replay mode nothing is fetched.
     :param s_url: URL to fetch
     :param max_retries: Number of total retries before giving up
+    :param bool_bypass_cache: Fetch the URL even if it is cached, e.g. to get a fresh copy of a page whose data could
+    not be extracted
+    :param bool_cache_response: Save the response to the cache, the callers that check the content of the page first
+    save it themselves once its data has been extracted
     :return: scrapling.Adaptor | None - Response of the request
     """
+    s_url_kind = get_url_kind(s_url)
+    cached_page = None if bool_bypass_cache else RESPONSE_CACHE.get(s_url)
+    if cached_page is not None:
+        METRICS.increment("cache_hits_total", url_kind=s_url_kind)
+        return cached_page
+    if RESPONSE_CACHE.bool_replay:
+        o_logger.error(f"Replay mode: no cached response for {s_url}")
+        return None
+
     for attempt in range(max_retries):  # 🔹 Retry the entire process up to max_retries times
-        for fetcher_name, (fetcher_class, fetch_method, params) in FETCHERS.items():
-            fetcher_instance = fetcher_class()
-            fetch_fn = getattr(fetcher_instance, fetch_method)
+        if attempt:
+            METRICS.increment("request_retries_total", url_kind=s_url_kind)
+            f_backoff = get_retry_backoff(attempt)
+            o_logger.warning(f"Retrying {s_url} in {f_backoff:.2f} seconds...")
+            await asyncio.sleep(f_backoff)
+            METRICS.increment("retry_backoff_seconds_total", f_backoff, url_kind=s_url_kind)
+        s_selected_fetcher = FETCHER_SELECTOR.get_selected_fetcher(s_url)
+        for fetcher_name in FETCHER_SELECTOR.order_fetchers(s_url):
+            async with o_request_semaphore:
+                page = await _attempt_request(s_url, fetcher_name, attempt,
+                                              bool_throttle=fetcher_name == s_selected_fetcher)
+            if page is not None:
+                if bool_cache_response:
+                    RESPONSE_CACHE.put(s_url, page)
+                return page
+            o_logger.warning(f"{fetcher_name} failed, switching to next fetcher.")
 
-            # Wait before first attempt (randomized backoff)
-            first_backoff = random.uniform(1, 5)
-            o_logger.info(
-                f"Sleeping for {first_backoff:.2f} seconds before attempt {attempt + 1} with {fetcher_name}...")
-            await asyncio.sleep(first_backoff)
+        o_logger.warning(f"Attempt {attempt + 1} failed for {s_url}. Retrying entire process...")
 
-            with warnings.catch_warnings(record=True) as w:
-                warnings.simplefilter("always", RuntimeWarning)
+    o_logger.error(f"All {max_retries} attempts failed for {s_url}")
+    METRICS.increment("requests_failed_total", url_kind=s_url_kind)
+    return None
 
-                try:
-                    page = await fetch_fn(s_url, **params)
 
-                    if page and hasattr(page, "status") and page.status == 200:
-                        o_logger.info(f"Request successful ({page.status}) [{fetcher_name}]")
-                        return page
+async def _attempt_request(s_url: str, fetcher_name: str, attempt: int,
+                           bool_throttle: bool = True) -> scrapling.Adaptor | None:
+    """
+    Attempt a request with a single fetcher once the rate limiter lets it through
+    :param s_url: URL to fetch
+    :param fetcher_name: Name of the fetcher in `FETCHERS`
+    :param attempt: Number of the current attempt, for logging
+    :param bool_throttle: Whether a failure slows the host down, only for the fetcher chosen by `FETCHER_SELECTOR`
+    :return: scrapling.Adaptor | None - Response of the request if successful
+    """
+    fetcher_class, fetch_method, params = FETCHERS[fetcher_name]
+    s_url_kind = get_url_kind(s_url)
+    f_waited = await RATE_LIMITER.acquire(s_url)
+    METRICS.increment("rate_limit_wait_seconds_total", f_waited, url_kind=s_url_kind)
+    o_logger.info(f"Waited {f_waited:.2f} seconds for the rate limiter before attempt {attempt + 1} "
+                  f"with {fetcher_name}...")
 
-                except Exception as e:
-                    o_logger.warning(f"Attempt {attempt + 1}: {fetcher_name} failed with error: {e}")
+    with warnings.catch_warnings(record=True) as w:
+        warnings.simplefilter("always", RuntimeWarning)
 
-                for warning in w:
-                    if issubclass(warning.category, RuntimeWarning):
-                        o_logger.warning(f"RuntimeWarning: {warning.message}")
+        page = None
+        f_start_time = time.perf_counter()
+        try:
+            if fetcher_name in FETCHER_POOL.BROWSER_FETCHERS:
+                # Browser fetchers reuse a long-lived browser context instead of starting a browser
+                page = await FETCHER_POOL.fetch(fetcher_name, s_url, params)
+            else:
+                fetch_fn = getattr(fetcher_class(), fetch_method)
+                page = await fetch_fn(s_url, **params)
+        except Exception as e:
+            o_logger.warning(f"Attempt {attempt + 1}: {fetcher_name} failed with error: {e}")
 
-            o_logger.warning(f"{fetcher_name} failed, switching to next fetcher.")
+        int_status = page.status if page is not None and hasattr(page, "status") else None
+        RATE_LIMITER.on_response(s_url, int_status, bool_throttle)
+        bool_success = bool(page and int_status == 200)
+        f_latency = time.perf_counter() - f_start_time
+        FETCHER_SELECTOR.record(s_url, fetcher_name, bool_success, f_latency)
+        METRICS.observe("fetch_duration_seconds", f_latency, fetcher=fetcher_name, url_kind=s_url_kind,
+                        outcome="success" if bool_success else "failure")
+        if page is not None:
+            METRICS.increment("downloaded_bytes_total", get_content_length(page), fetcher=fetcher_name,
+                              url_kind=s_url_kind)
 
-        # Exponential backoff before retrying entire process
-        backoff_time = min(2 ** attempt + random.uniform(1, 3), 20)
-        o_logger.warning(f"Attempt {attempt + 1} failed. Retrying entire process in {backoff_time:.2f} seconds...")
-        await asyncio.sleep(backoff_time)
+        for warning in w:
+            if issubclass(warning.category, RuntimeWarning):
+                o_logger.warning(f"RuntimeWarning: {warning.message}")
 
-    o_logger.error(f"All {max_retries} attempts failed for {s_url}")
+    if bool_success:
+        o_logger.info(f"Request successful ({page.status}) [{fetcher_name}]")
+        return page
     return None
+
+
+def get_retry_backoff(attempt: int) -> float:
+    """
+    Get the exponential backoff with jitter waited before a round of retries of an URL
+    :param attempt: Number of the round of retries, from 1
+    :return: float - seconds
+    """
+    return min(2 ** (attempt - 1) + random.uniform(1, 3), F_MAX_RETRY_BACKOFF)
+
+
+def get_content_length(page: scrapling.Adaptor) -> int:
+    """
+    Get the number of bytes downloaded for a response from its Content-Length header. Without the header (chunked or
+    HTTP/2 responses, browser fetchers), it is the size of the body, encoded only when the response gives it as text
+    :param page: scrapling.Adaptor
+    :return: int
+    """
+    for s_header, s_value in (getattr(page, "headers", None) or {}).items():
+        if s_header.lower() == "content-length":
+            try:
+                return int(s_value)
+            except ValueError:
+                break
+    body = getattr(page, "body", None)
+    if isinstance(body, bytes):
+        return len(body)
+    if isinstance(body, str):
+        return len(body.encode(getattr(page, "encoding", None) or "utf-8", errors="replace"))
+    return 0
@@ -0,0 +1,178 @@
+import gzip
+import hashlib
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+import scrapling
+from scrapling.engines.toolbelt import Response
+
+from utilities.fetcher_selector import get_url_kind
+from utilities.logging_utils import LoggerManager
+
+o_logger = LoggerManager.get_logger(__name__)
+
+# Time to live of the cached responses per kind of URL, in seconds
+DC_CACHE_TTL = {
+    "search": 6 * 3600,
+    "biz": 24 * 3600,
+    "biz_photos": 7 * 24 * 3600,
+    "other": 3600,
+}
+
+
+def normalize_url(s_url: str) -> str:
+    """
+    Normalize an URL so that equivalent URLs share the same cache entry: lowercase scheme and host, sorted query
+    parameters with a consistent encoding and no fragment
+    :param s_url: str
+    :return: str
+    """
+    o_split = urlsplit(s_url.strip())
+    s_query = urlencode(sorted(parse_qsl(o_split.query, keep_blank_values=True)))
+    return urlunsplit((o_split.scheme.lower(), o_split.netloc.lower(), o_split.path or "/", s_query, ""))
+
+
+@dataclass
+class ResponseCache:
+    """
+    ResponseCache class to store the successful responses on disk, gzip-compressed and addressed by the hash of their
+    normalized URL. Entries expire after the TTL of their kind of URL, and the least recently used entries are evicted
+    once the cache is bigger than `int_max_size_bytes`. In replay mode, entries never expire and nothing is fetched.
+    """
+    s_cache_dir: str = "cache"
+    int_max_size_bytes: int = 1024 * 1024 * 1024
+    bool_enabled: bool = True
+    bool_replay: bool = False
+    int_size_bytes: int | None = field(default=None, init=False)
+
+    def configure(self, s_cache_dir: str, int_max_size_mb: int, bool_enabled: bool, bool_replay: bool) -> None:
+        """
+        Configure the cache before its first use
+        :param s_cache_dir: str - directory of the cache
+        :param int_max_size_mb: int - maximum size of the cache in megabytes
+        :param bool_enabled: bool - read and write the cache
+        :param bool_replay: bool - serve only from the cache, without any network request
+        :return: None
+        """
+        self.s_cache_dir = s_cache_dir
+        self.int_max_size_bytes = int_max_size_mb * 1024 * 1024
+        self.bool_enabled = bool_enabled or bool_replay
+        self.bool_replay = bool_replay
+        self.int_size_bytes = None
+
+    def get(self, s_url: str) -> Response | None:
+        """
+        Get the cached response of an URL if it exists and has not expired
+        :param s_url: str
+        :return: Response | None
+        """
+        if not self.bool_enabled:
+            return None
+        o_path = self._get_path(s_url)
+        try:
+            f_age = time.time() - o_path.stat().st_mtime
+            if not self.bool_replay and f_age > DC_CACHE_TTL[get_url_kind(s_url)]:
+                return None
+            with gzip.open(o_path, "rt", encoding="utf-8") as o_file:
+                dc_entry = json.load(o_file)
+        except FileNotFoundError:
+            return None
+        except Exception as o_exception:
+            o_logger.warning(f"Failed to read the cache entry of {s_url}: {o_exception}")
+            return None
+        os.utime(o_path, (time.time(), o_path.stat().st_mtime))  # access time is used for the eviction
+        o_logger.info(f"Cache hit for {s_url} ({f_age:.0f}s old)")
+        return Response(url=dc_entry["url"], text=dc_entry["text"], body=dc_entry["text"].encode("utf-8"),
+                        status=dc_entry["status"], reason=dc_entry["reason"], cookies={},
+                        headers=dc_entry["headers"], request_headers={})
+
+    def put(self, s_url: str, o_response: scrapling.Adaptor, bool_keep_fresh_entry: bool = False) -> None:
+        """
+        Store a successful response in the cache and evict old entries if the cache is too big
+        :param s_url: str - requested URL, the final URL after redirects is stored in the entry
+        :param o_response: scrapling.Adaptor
+        :param bool_keep_fresh_entry: bool - keep the entry of the URL if it has not expired, e.g. when the response was
+        served from it, so that its age is not reset
+        :return: None
+        """
+        if not self.bool_enabled or self.bool_replay:
+            return
+        o_path = self._get_path(s_url)
+        if bool_keep_fresh_entry and self._is_fresh(s_url, o_path):
+            return
+        dc_entry = {
+            "url": o_response.url,
+            "status": o_response.status,
+            "reason": getattr(o_response, "reason", "OK"),
+            "headers": dict(getattr(o_response, "headers", {}) or {}),
+            "text": o_response.html_content,
+        }
+        try:
+            o_path.parent.mkdir(parents=True, exist_ok=True)
+            int_previous_size = o_path.stat().st_size if o_path.exists() else 0
+            s_temporary_path = f"{o_path}.tmp"
+            with gzip.open(s_temporary_path, "wt", encoding="utf-8", compresslevel=6) as o_file:
+                json.dump(dc_entry, o_file)
+            os.replace(s_temporary_path, o_path)
+            self._add_size(o_path.stat().st_size - int_previous_size)
+        except Exception as o_exception:
+            o_logger.warning(f"Failed to write the cache entry of {s_url}: {o_exception}")
+
+    def evict(self, s_url: str) -> None:
+        """
+        Remove the entry of an URL, e.g. a page served with a 200 status whose data could not be extracted
+        :param s_url: str
+        :return: None
+        """
+        if not self.bool_enabled or self.bool_replay:
+            return
+        o_path = self._get_path(s_url)
+        try:
+            int_size = o_path.stat().st_size
+            o_path.unlink()
+        except FileNotFoundError:
+            return
+        if self.int_size_bytes is not None:
+            self.int_size_bytes -= int_size
+        o_logger.info(f"Cache entry of {s_url} evicted")
+
+    def _is_fresh(self, s_url: str, o_path: Path) -> bool:
+        try:
+            return time.time() - o_path.stat().st_mtime <= DC_CACHE_TTL[get_url_kind(s_url)]
+        except FileNotFoundError:
+            return False
+
+    def _get_path(self, s_url: str) -> Path:
+        s_key = hashlib.sha256(normalize_url(s_url).encode("utf-8")).hexdigest()
+        return Path(self.s_cache_dir) / s_key[:2] / f"{s_key}.json.gz"
+
+    def _add_size(self, int_size_bytes: int) -> None:
+        """
+        Keep track of the size of the cache, computed once from the disk, and evict the least recently used entries
+        until it is back under 90% of the maximum size
+        :param int_size_bytes: int - size added to the cache
+        :return: None
+        """
+        if self.int_size_bytes is None:
+            self.int_size_bytes = sum(o_path.stat().st_size for o_path in Path(self.s_cache_dir).glob("*/*.json.gz"))
+        else:
+            self.int_size_bytes += int_size_bytes
+        if self.int_size_bytes <= self.int_max_size_bytes:
+            return
+        l_entries = sorted(((o_path.stat().st_atime, o_path.stat().st_size, o_path)
+                            for o_path in Path(self.s_cache_dir).glob("*/*.json.gz")), key=lambda t: t[0])
+        int_nb_evicted = 0
+        for _, int_size, o_path in l_entries:
+            if self.int_size_bytes <= self.int_max_size_bytes * 0.9:
+                break
+            o_path.unlink(missing_ok=True)
+            self.int_size_bytes -= int_size
+            int_nb_evicted += 1
+        o_logger.info(f"{int_nb_evicted} cache entries evicted, cache size {self.int_size_bytes / 1024 / 1024:.1f} MB")
+
+
+RESPONSE_CACHE = ResponseCache()